@@ -11,6 +11,7 @@ from io import BytesIO
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
+from utils.data_processing import contar_lineas, margen_medio
 
 
 # ============================================
@@ -41,17 +42,19 @@ def prepare_category_stats(df, group_col):
     Returns:
         DataFrame: Estadísticas agregadas
     """
-    stats = df.groupby(group_col).agg({
+    stats = df.groupby(group_col, observed=True).agg({
         'precio_total': 'sum',
         'utilidad': 'sum',
-        'margen_porcentual': 'mean',
         'cantidad_total': 'sum'
-    }).round(2)
+    })
+    # Promedio por línea de ticket (también con tickets agregados)
+    stats.insert(2, 'margen_porcentual', margen_medio(df, group_col))
+    stats = stats.round(2)
     
     stats['participacion'] = (stats['precio_total'] / stats['precio_total'].sum() * 100).round(1)
     
     if group_col == 'sucursal':
-        stats['tickets'] = df.groupby(group_col).size()
+        stats['tickets'] = contar_lineas(df, group_col)
     
     return stats
 
@@ -234,7 +237,7 @@ def prepare_abc_data(df):
     Returns:
         tuple: (productos_abc, abc_counts, abc_ventas)
     """
-    productos_abc = df.groupby(['idarticulo', 'descripcion']).agg({
+    productos_abc = df.groupby(['idarticulo', 'descripcion'], observed=True).agg({
         'precio_total': 'sum',
         'utilidad': 'sum'
     }).sort_values('precio_total', ascending=False)
@@ -549,19 +552,19 @@ def show_advanced_analysis(df, metrics,
         
         with col1:
             if 'sucursal' in df.columns:
-                df_margenes_suc = df.groupby('sucursal')['margen_porcentual'].mean()
+                df_margenes_suc = margen_medio(df, 'sucursal')
                 st.markdown(generar_insight_margen_func(df_margenes_suc, "Sucursal"), 
                           unsafe_allow_html=True)
         
         with col2:
             if 'familia' in df.columns:
-                df_margenes_flia = df.groupby('familia')['margen_porcentual'].mean()
+                df_margenes_flia = margen_medio(df, 'familia')
                 st.markdown(generar_insight_margen_func(df_margenes_flia, "Familia"), 
                           unsafe_allow_html=True)
         
         with col3:
             if 'subfamilia' in df.columns:
-                df_margenes_subflia = df.groupby('subfamilia')['margen_porcentual'].mean()
+                df_margenes_subflia = margen_medio(df, 'subfamilia')
                 st.markdown(generar_insight_margen_func(df_margenes_subflia, "Subfamilia"), 
                           unsafe_allow_html=True)
     
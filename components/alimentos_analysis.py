@@ -17,6 +17,7 @@ import time
 from utils.ranking_proveedores import crear_excel_ranking, generar_nombre_archivo
 from components.global_dashboard_cache import process_ranking_detallado_alimentos
 from utils.telegram_notifier import send_telegram_alert
+from utils.linaje import datos_de, combinar
 
 def calcular_metricas_ieu(df):
     """
@@ -531,6 +532,11 @@ def show_alimentos_analysis(df_proveedores, df_ventas, df_presupuesto, df_famili
     }
     emoji = emojis_familia.get(familia_seleccionada.lower(), '📦')
 
+    # ConjuntoDatos (utils.linaje) o DataFrames: el ranking cacheado recibe los
+    # conjuntos (cache por linaje), los filtros de abajo los DataFrames
+    conjunto_proveedores, conjunto_familias = df_proveedores, df_familias
+    df_proveedores, df_familias = datos_de(df_proveedores), datos_de(df_familias)
+
     subfamilias_familia = df_familias[
             df_familias['familia'].str.strip().str.lower() == familia_seleccionada.lower()  # ← DINÁMICO!
         ]['subfamilia'].dropna().unique().tolist()
@@ -582,10 +588,11 @@ def show_alimentos_analysis(df_proveedores, df_ventas, df_presupuesto, df_famili
     inicio_detallado = time.time()
     
     ranking_detallado_familia = process_ranking_detallado_alimentos(
-        df_para_familia,
+        combinar('articulos_de_familia', df_para_familia, conjunto_proveedores, conjunto_familias,
+                 parametros=(familia_seleccionada.lower(), subfamilias_familia_seleccionadas)),
         df_ventas,
         df_presupuesto,
-        df_familias
+        conjunto_familias
     )
     
     tiempo_detallado = time.time() - inicio_detallado
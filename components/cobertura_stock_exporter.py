@@ -508,6 +508,9 @@ from google.cloud import bigquery
 from io import BytesIO
 from datetime import datetime
 import time
+from utils.bigquery_connection import get_bigquery_client
+from utils.esquemas import aplicar_esquema, ESQUEMA_STOCK
+from utils.vuelo_unico import vuelo_unico
 
 class CoberturaStockExporter:
     
@@ -536,26 +539,9 @@ class CoberturaStockExporter:
             # Detectar si estamos en la nube (archivo no existe)
             is_cloud = not os.path.exists(self.credentials_path)
             
-            if is_cloud:
-                # En la nube: usar secrets de Streamlit (IGUAL que tus otras consultas)
-                import streamlit as st
-                from google.oauth2 import service_account
-                
-                credentials = service_account.Credentials.from_service_account_info(
-                    st.secrets["gcp_service_account"]
-                )
-                self.client = bigquery.Client(
-                    credentials=credentials,
-                    project=self.project_id
-                )
-                print(f"✅ Conectado a BigQuery (Streamlit Cloud)")
-            else:
-                # En local: usar archivo JSON (IGUAL que tus otras consultas)
-                self.client = bigquery.Client.from_service_account_json(
-                    self.credentials_path, 
-                    project=self.project_id
-                )
-                print(f"✅ Conectado a BigQuery (Local)")
+            # Cliente compartido: se reutiliza entre exportaciones y reruns
+            self.client = get_bigquery_client(self.credentials_path, self.project_id)
+            print(f"✅ Conectado a BigQuery ({'Streamlit Cloud' if is_cloud else 'Local'})")
             
             return True
             
@@ -591,7 +577,7 @@ class CoberturaStockExporter:
         """
         
         try:
-            df_stock = self.client.query(query).to_dataframe()
+            df_stock = aplicar_esquema(self.client.query(query).to_dataframe(), ESQUEMA_STOCK)
             tiempo = time.time() - inicio
             
             print(f"✅ Stock obtenido: {len(df_stock):,} registros en {tiempo:.2f}s")
@@ -1012,4 +998,20 @@ def obtener_metricas_cobertura(df_ventas, fecha_inicio, fecha_fin, credentials_p
         dict con métricas
     """
     exporter = CoberturaStockExporter(credentials_path, project_id)
-    return exporter.obtener_metricas(df_ventas, fecha_inicio, fecha_fin)
\ No newline at end of file
+    return exporter.obtener_metricas(df_ventas, fecha_inicio, fecha_fin)
+
+@vuelo_unico('cargar_stock_actual')
+def cargar_stock_actual(credentials_path=None, project_id=None):
+    """
+    Stock actual por artículo (conectar + obtener_stock_bigquery en una sola
+    llamada, para poder lanzarla en paralelo con las demás consultas).
+    No se cachea (el stock cambia durante el día), pero las sesiones que lo
+    piden al mismo tiempo comparten una sola consulta.
+
+    Returns:
+        DataFrame de stock o None si no se pudo conectar o consultar
+    """
+    exporter = CoberturaStockExporter(credentials_path, project_id)
+    if not exporter.conectar_bigquery():
+        return None
+    return exporter.obtener_stock_bigquery()
@@ -8,6 +8,7 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
+from utils.data_processing import contar_lineas
 
 
 # ============================================
@@ -116,7 +117,7 @@ def generate_insights(df, metrics):
         ))
     
     # 2. Análisis de productos
-    top_producto = df.groupby('descripcion')['precio_total'].sum().nlargest(1)
+    top_producto = df.groupby('descripcion', observed=True)['precio_total'].sum().nlargest(1)
     if len(top_producto) > 0:
         producto_name = top_producto.index[0]
         producto_ventas = top_producto.iloc[0]
@@ -127,7 +128,7 @@ def generate_insights(df, metrics):
         ))
     
     # 3. Análisis temporal
-    if len(df) > 7:  # Suficientes días para análisis
+    if contar_lineas(df) > 7:  # Suficientes días para análisis
         ventas_por_dia = df.groupby('fecha')['precio_total'].sum()
         tendencia_dias = 7
         if len(ventas_por_dia) >= tendencia_dias:
@@ -361,7 +362,7 @@ def render_top_products_chart(df):
         df (DataFrame): DataFrame con los datos de tickets
     """
     top_productos = (
-        df.groupby('descripcion', as_index=False)['precio_total']
+        df.groupby('descripcion', as_index=False, observed=True)['precio_total']
         .sum()
         .sort_values('precio_total', ascending=False)
         .head(5)
@@ -8,6 +8,7 @@ import plotly.express as px
 from babel.dates import format_date
 from babel import Locale
 from generar_excel import generar_excel
+from utils.data_processing import margen_medio
 from re import sub
 
 locale = Locale.parse('es_AR')
@@ -200,7 +201,7 @@ def _show_family_analysis(df, metrics):
     with col1:
         if 'familia' in df.columns and df['familia'].notna().any():
             familias_list = sorted(df['familia'].dropna().unique())
-            familias_ventas = df.groupby('familia')['precio_total'].sum().sort_values(ascending=False)
+            familias_ventas = df.groupby('familia', observed=True)['precio_total'].sum().sort_values(ascending=False)
             familia_principal = familias_ventas.index[0] if len(familias_ventas) > 0 else "N/A"
             
             st.markdown(f"""
@@ -218,7 +219,7 @@ def _show_family_analysis(df, metrics):
     with col2:
         if 'subfamilia' in df.columns and df['subfamilia'].notna().any():
             subfamilias_list = sorted(df['subfamilia'].dropna().unique())
-            subfamilias_ventas = df.groupby('subfamilia')['precio_total'].sum().sort_values(ascending=False)
+            subfamilias_ventas = df.groupby('subfamilia', observed=True)['precio_total'].sum().sort_values(ascending=False)
             subfamilia_principal = subfamilias_ventas.index[0] if len(subfamilias_ventas) > 0 else "N/A"
             
             st.markdown(f"""
@@ -240,7 +241,7 @@ def _show_temporal_synthesis(df, metrics):
     
     # Análisis mensual
     df['mes_año'] = pd.to_datetime(df['fecha']).dt.to_period('M').astype(str)
-    mensual = df.groupby('mes_año')['precio_total'].sum()
+    mensual = df.groupby('mes_año', observed=True)['precio_total'].sum()
     mes_top = mensual.idxmax() if len(mensual) > 0 else "N/A"
     ventas_mes_top = mensual.max() if len(mensual) > 0 else 0
     
@@ -255,7 +256,7 @@ def _show_temporal_synthesis(df, metrics):
     else:
         df['dia_semana_es'] = pd.to_datetime(df['fecha']).dt.day_name().map(dia_mapping)
     
-    semanal = df.groupby('dia_semana_es')['precio_total'].sum()
+    semanal = df.groupby('dia_semana_es', observed=True)['precio_total'].sum()
     dia_top = semanal.idxmax() if len(semanal) > 0 else "N/A"
     
     # Tendencia general
@@ -299,7 +300,7 @@ def _show_abc_synthesis(df, metrics):
     """Síntesis Análisis ABC"""
     st.markdown("### 🎯 Síntesis Análisis ABC")
     
-    productos_abc = df.groupby(['idarticulo', 'descripcion']).agg({
+    productos_abc = df.groupby(['idarticulo', 'descripcion'], observed=True).agg({
         'precio_total': 'sum',
         'utilidad': 'sum'
     }).sort_values('precio_total', ascending=False)
@@ -359,11 +360,12 @@ def _show_geographical_synthesis(df, metrics):
     """Análisis por Sucursal"""
     st.markdown("### 🏪 Síntesis Geográfica")
     
-    sucursal_stats = df.groupby('sucursal').agg({
+    sucursal_stats = df.groupby('sucursal', observed=True).agg({
         'precio_total': 'sum',
-        'utilidad': 'sum',
-        'margen_porcentual': 'mean'
-    }).round(2)
+        'utilidad': 'sum'
+    })
+    sucursal_stats['margen_porcentual'] = margen_medio(df, 'sucursal')
+    sucursal_stats = sucursal_stats.round(2)
     
     sucursal_top = sucursal_stats['precio_total'].idxmax()
     sucursal_top_ventas = sucursal_stats['precio_total'].max()
@@ -429,7 +431,7 @@ def _show_strategic_recommendations(df, metrics):
         recomendaciones.append(("🔴 CRÍTICO", f"Optimizar márgenes: {metrics['margen_promedio']:.1f}% está por debajo del mínimo recomendado (20%)"))
     
     # Concentración
-    productos_abc = df.groupby(['idarticulo', 'descripcion']).agg({'precio_total': 'sum'}).sort_values('precio_total', ascending=False)
+    productos_abc = df.groupby(['idarticulo', 'descripcion'], observed=True).agg({'precio_total': 'sum'}).sort_values('precio_total', ascending=False)
     productos_abc['participacion_acum'] = (productos_abc['precio_total'].cumsum() / productos_abc['precio_total'].sum() * 100)
     productos_abc['categoria_abc'] = productos_abc['participacion_acum'].apply(lambda x: 'A' if x <= 80 else 'B' if x <= 95 else 'C')
     abc_ventas = productos_abc.groupby('categoria_abc')['precio_total'].sum()
@@ -445,7 +447,7 @@ def _show_strategic_recommendations(df, metrics):
         recomendaciones.append(("🟢 BUENO", "Rendimiento general satisfactorio. Mantener estrategia actual"))
     
     # Producto estrella
-    top_producto = df.groupby('descripcion')['precio_total'].sum().nlargest(1)
+    top_producto = df.groupby('descripcion', observed=True)['precio_total'].sum().nlargest(1)
     if len(top_producto) > 0:
         producto_estrella = top_producto.index[0]
         participacion_estrella = (top_producto.iloc[0] / metrics['total_ventas']) * 100
@@ -463,18 +465,18 @@ def _show_executive_table(df, proveedor, metrics, periodo_analisado):
     subfamilias_completas = ", ".join(sorted(df['subfamilia'].dropna().unique())) if 'subfamilia' in df.columns else "N/A"
     
     # Calcular ABC
-    productos_abc = df.groupby(['idarticulo', 'descripcion']).agg({'precio_total': 'sum'}).sort_values('precio_total', ascending=False)
+    productos_abc = df.groupby(['idarticulo', 'descripcion'], observed=True).agg({'precio_total': 'sum'}).sort_values('precio_total', ascending=False)
     productos_abc['participacion_acum'] = (productos_abc['precio_total'].cumsum() / productos_abc['precio_total'].sum() * 100)
     productos_abc['categoria_abc'] = productos_abc['participacion_acum'].apply(lambda x: 'A' if x <= 80 else 'B' if x <= 95 else 'C')
     abc_counts = productos_abc['categoria_abc'].value_counts().sort_index()
     
     # Producto estrella
-    top_producto = df.groupby('descripcion')['precio_total'].sum().nlargest(1)
+    top_producto = df.groupby('descripcion', observed=True)['precio_total'].sum().nlargest(1)
     producto_estrella = top_producto.index[0] if len(top_producto) > 0 else "N/A"
     
     # Tendencia
     df['mes_año'] = pd.to_datetime(df['fecha']).dt.to_period('M').astype(str)
-    mensual = df.groupby('mes_año')['precio_total'].sum()
+    mensual = df.groupby('mes_año', observed=True)['precio_total'].sum()
     if len(mensual) >= 3:
         valores = mensual.values
         tendencia_coef = np.polyfit(range(len(valores)), valores, 1)[0]
@@ -523,11 +525,15 @@ def _show_data_preview(df, proveedor, periodo_analisado):
     """Vista Previa de Datos y Descarga"""
     st.markdown("### Vista Previa de Datos")
     
-    data = df[[
+    columnas = [
         'fecha_fmt', 'idarticulo', 'descripcion', 
         'precio_total', 'costo_total', 'utilidad', 
         'margen_porcentual', 'cantidad_total'
-    ]].copy()
+    ]
+    # Tickets agregados: una fila por fecha × artículo × sucursal
+    if 'num_lineas' in df.columns:
+        columnas += ['sucursal', 'num_lineas']
+    data = df[columnas].copy()
     
     # Generar Excel
     archivo_excel = generar_excel(data, sheet_name="Datos Proveedor")
@@ -551,7 +557,8 @@ def _show_data_preview(df, proveedor, periodo_analisado):
             "costo_total": st.column_config.NumberColumn("Costo Total", format="$%.0f"),
             "utilidad": st.column_config.NumberColumn("Utilidad", format="$%.0f"),
             "margen_porcentual": st.column_config.NumberColumn("Margen %", format="%.1f%%"),
-            "cantidad_total": st.column_config.NumberColumn("Cantidad", format="%.0f")
+            "cantidad_total": st.column_config.NumberColumn("Cantidad", format="%.0f"),
+            "num_lineas": st.column_config.NumberColumn("Líneas", format="%d")
         }
     )
     
@@ -12,18 +12,78 @@ from utils.ranking_proveedores import crear_excel_ranking, generar_nombre_archiv
 from utils.proveedor_exporter import generar_reporte_proveedor, obtener_ids_originales
 from utils.crear_excel_ranking_flia_subflia import crear_excel_ranking_flias_subflias  # ← NUEVA FUNCIÓN
 from components.cobertura_stock_exporter import generar_reporte_cobertura, obtener_metricas_cobertura  # ← CAMBIAR ESTO
-from components.global_dashboard_cache import (get_ventas_data, get_presupuesto_data, get_familias_data, process_ranking_data)
-from utils.process_ranking_data_flias_subflias import process_ranking_data_flias_subflias  # ← NUEVO MÓDULO
+from components.global_dashboard_cache import (get_ventas_data, get_presupuesto_data, get_familias_con_version, ranking_de_cubo)
+from utils.process_ranking_data_flias_subflias import ranking_flias_subflias_de_cubo
+from utils.cubo_ranking import obtener_cubo_ranking
+from utils.linaje import ConjuntoDatos, combinar
 from components.ranking_export_section import show_ranking_section
 from components.cobertura_section import show_cobertura_section
 from components.proveedor_report_section import show_proveedor_report_section
-from components.cobertura_stock_exporter import CoberturaStockExporter
+from components.cobertura_stock_exporter import CoberturaStockExporter, cargar_stock_actual
 from components.global_dashboard_cache import get_ventas_agregadas_stock  # ← NUEVA FUNCIÓN
 from components.analisis_stock_rentables_simple import main_analisis_stock_simple  
 from components.tab1_ranking_ventas import main_tab1_ranking_ventas  # ← NUEVO MÓDULO TAB1  
 # Busca la sección de imports de components y agrega:
 from components.tab_prediccion_presupuesto import render_tab_prediccion_presupuesto
 from components.ranking_proveedores_analisis import main_ranking_proveedores_analisis
+from utils.version_datos import obtener_version_datos
+from utils.consultas_paralelas import obtener_planificador
+from utils.metadatos import obtener_fecha_datos
+
+PERIODO_OPCIONES = {
+    "Últimos 30 días": 30,
+    "Últimos 60 días": 60,
+    "Últimos 90 días": 90,
+    "Últimos 120 días": 120,
+
+    "Año 2024": ("2024-01-01", "2024-12-31"),
+    "Año 2025": ("2025-01-01", "2025-12-31"),
+    "Año 2026": ("2026-01-01", "2026-12-31"),
+
+    "Enero 2025": ("2025-01-01", "2025-01-31"),
+    "Febrero 2025": ("2025-02-01", "2025-02-28"),
+    "Marzo 2025": ("2025-03-01", "2025-03-31"),
+    "Abril 2025": ("2025-04-01", "2025-04-30"),
+    "Mayo 2025": ("2025-05-01", "2025-05-31"),
+    "Junio 2025": ("2025-06-01", "2025-06-30"),
+    "Julio 2025": ("2025-07-01", "2025-07-31"),
+    "Agosto 2025": ("2025-08-01", "2025-08-31"),
+    "Septiembre 2025": ("2025-09-01", "2025-09-30"),
+    "Octubre 2025": ("2025-10-01", "2025-10-31"),
+    "Noviembre 2025": ("2025-11-01", "2025-11-30"),
+    "Diciembre 2025": ("2025-12-01", "2025-12-31"),
+
+    "Enero 2026": ("2026-01-01", "2026-01-31"),
+    "Febrero 2026": ("2026-02-01", "2026-02-28"),
+    "Marzo 2026": ("2026-03-01", "2026-03-31"),
+    "Abril 2026": ("2026-04-01", "2026-04-30"),
+    "Mayo 2026": ("2026-05-01", "2026-05-31"),
+    "Junio 2026": ("2026-06-01", "2026-06-30"),
+    "Julio 2026": ("2026-07-01", "2026-07-31"),
+    "Agosto 2026": ("2026-08-01", "2026-08-31"),
+    "Septiembre 2026": ("2026-09-01", "2026-09-30"),
+    "Octubre 2026": ("2026-10-01", "2026-10-31"),
+    "Noviembre 2026": ("2026-11-01", "2026-11-30"),
+    "Diciembre 2026": ("2026-12-01", "2026-12-31"),
+    "Personalizado": None,
+}
+
+
+def rango_periodo(periodo, fecha_maxima, personalizado=None):
+    """
+    (fecha_desde, fecha_hasta, dias_periodo) de una opción de PERIODO_OPCIONES.
+    "Personalizado" usa `personalizado` = (desde, hasta) o los últimos 30 días.
+    """
+    valor_periodo = PERIODO_OPCIONES[periodo]
+    if valor_periodo is None:
+        fecha_desde, fecha_hasta = personalizado or (fecha_maxima - timedelta(days=30), fecha_maxima)
+        return fecha_desde, fecha_hasta, (fecha_hasta - fecha_desde).days
+    if isinstance(valor_periodo, tuple):
+        fecha_desde = datetime.strptime(valor_periodo[0], "%Y-%m-%d").date()
+        fecha_hasta = datetime.strptime(valor_periodo[1], "%Y-%m-%d").date()
+        return fecha_desde, fecha_hasta, (fecha_hasta - fecha_desde).days + 1
+    return fecha_maxima - timedelta(days=valor_periodo), fecha_maxima, valor_periodo
+
 
 def format_millones(valor):
         if valor >= 1_000_000:
@@ -37,7 +97,8 @@ def format_millones(valor):
 def format_miles(valor: int) -> str:
         return f"{valor:,}".replace(",", ".")
 
-def show_global_dashboard(df_proveedores, query_function, credentials_path, project_id, bigquery_table):
+def show_global_dashboard(df_proveedores, query_function, credentials_path, project_id, bigquery_table,
+                          catalogo=None):
 
     st.markdown("""
             <style>
@@ -56,13 +117,44 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
     print("="*80)
     inicio_total = time.time()
 
-    df_presupuesto = get_presupuesto_data(credentials_path, project_id)
-    
-    if 'ultima_fecha' in df_presupuesto.columns:
-        fecha_maxima_disponible = pd.to_datetime(df_presupuesto['ultima_fecha']).iloc[0].date()
-    else:
-        # Fallback: usar fecha actual menos 1 día
-        fecha_maxima_disponible = datetime.now().date() - timedelta(days=1)
+    # Versión de los datos (ultima_fecha): las funciones cacheadas la reciben y
+    # se invalidan cuando entra una carga nueva
+    version_datos = obtener_version_datos(credentials_path, project_id)
+
+    # ═══════════════════════════════════════════════════════════════════════════
+    # LANZAR CONSULTAS INDEPENDIENTES EN PARALELO
+    # ═══════════════════════════════════════════════════════════════════════════
+    # Ninguna depende del resultado de otra: cada sección espera solo la suya.
+    # Las ventas del período se lanzan con el período del rerun anterior
+    # (session_state); si el selector lo cambia, se relanzan con las fechas nuevas.
+    planificador = obtener_planificador()
+
+    # Última fecha cargada: metadatos cacheados (no espera al presupuesto completo)
+    fecha_maxima_disponible = obtener_fecha_datos(credentials_path, project_id)
+
+    def lanzar_ventas(fecha_desde, fecha_hasta):
+        return planificador.lanzar(
+            'ventas del período', get_ventas_data, credentials_path, project_id, bigquery_table,
+            str(fecha_desde), str(fecha_hasta), version_datos=version_datos)
+
+    periodo_previo = st.session_state.get('selector_periodo_ventas', next(iter(PERIODO_OPCIONES)))
+    fechas_lanzadas = rango_periodo(
+        periodo_previo, fecha_maxima_disponible,
+        personalizado=(st.session_state['periodo_desde'], st.session_state['periodo_hasta'])
+        if 'periodo_desde' in st.session_state and 'periodo_hasta' in st.session_state else None,
+    )[:2]
+    futuro_ventas = lanzar_ventas(*fechas_lanzadas)
+
+    año_stock = st.session_state.get('selector_año_stock', pd.Timestamp.now().year - 1)
+    futuro_presupuesto = planificador.lanzar(
+        'presupuesto', get_presupuesto_data, credentials_path, project_id, version_datos=version_datos)
+    futuro_familias = planificador.lanzar(
+        'familias', get_familias_con_version, credentials_path, project_id, bigquery_table, version_datos=version_datos)
+    futuro_ventas_agregadas = planificador.lanzar(
+        f'ventas agregadas {año_stock}', get_ventas_agregadas_stock,
+        credentials_path=credentials_path, project_id=project_id, bigquery_table=bigquery_table,
+        año=año_stock, version_datos=version_datos)
+    futuro_stock = planificador.lanzar('stock', cargar_stock_actual, credentials_path, project_id)
     
     print(f"   ✅ Última fecha con datos: {fecha_maxima_disponible.strftime('%d/%m/%Y')}")
 
@@ -100,43 +192,6 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
                 unsafe_allow_html=True
             )
 
-            periodo_opciones = {
-                "Últimos 30 días": 30,
-                "Últimos 60 días": 60,
-                "Últimos 90 días": 90,
-                "Últimos 120 días": 120,
-
-                "Año 2024": ("2024-01-01", "2024-12-31"),
-                "Año 2025": ("2025-01-01", "2025-12-31"),
-                "Año 2026": ("2026-01-01", "2026-12-31"),
-
-                "Enero 2025": ("2025-01-01", "2025-01-31"),
-                "Febrero 2025": ("2025-02-01", "2025-02-28"),
-                "Marzo 2025": ("2025-03-01", "2025-03-31"),
-                "Abril 2025": ("2025-04-01", "2025-04-30"),
-                "Mayo 2025": ("2025-05-01", "2025-05-31"),
-                "Junio 2025": ("2025-06-01", "2025-06-30"),
-                "Julio 2025": ("2025-07-01", "2025-07-31"),
-                "Agosto 2025": ("2025-08-01", "2025-08-31"),
-                "Septiembre 2025": ("2025-09-01", "2025-09-30"),
-                "Octubre 2025": ("2025-10-01", "2025-10-31"),
-                "Noviembre 2025": ("2025-11-01", "2025-11-30"),
-                "Diciembre 2025": ("2025-12-01", "2025-12-31"),
-
-                "Enero 2026": ("2026-01-01", "2026-01-31"),
-                "Febrero 2026": ("2026-02-01", "2026-02-28"),
-                "Marzo 2026": ("2026-03-01", "2026-03-31"),
-                "Abril 2026": ("2026-04-01", "2026-04-30"),
-                "Mayo 2026": ("2026-05-01", "2026-05-31"),
-                "Junio 2026": ("2026-06-01", "2026-06-30"),
-                "Julio 2026": ("2026-07-01", "2026-07-31"),
-                "Agosto 2026": ("2026-08-01", "2026-08-31"),
-                "Septiembre 2026": ("2026-09-01", "2026-09-30"),
-                "Octubre 2026": ("2026-10-01", "2026-10-31"),
-                "Noviembre 2026": ("2026-11-01", "2026-11-30"),
-                "Diciembre 2026": ("2026-12-01", "2026-12-31"),
-                "Personalizado": None,
-            }
 
             # periodo_opciones = {
             #     "Últimos 30 días": 30,
@@ -175,8 +230,9 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
 
             periodo_seleccionado = st.selectbox(
                 "📅 Período de análisis de ventas:",
-                options=list(periodo_opciones.keys()),
+                options=list(PERIODO_OPCIONES.keys()),
                 index=0,
+                key='selector_periodo_ventas'
             )
     # with col2:
         if periodo_seleccionado == "Personalizado":
@@ -184,11 +240,13 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
             fecha_desde = col_a.date_input(
                 "Desde:",
                 value=fecha_maxima_disponible - timedelta(days=30),
+                key='periodo_desde'
             )
             fecha_hasta = col_b.date_input(
                 "Hasta:",
                 value=fecha_maxima_disponible,
-                max_value=fecha_maxima_disponible
+                max_value=fecha_maxima_disponible,
+                key='periodo_hasta'
             )
 
             if fecha_desde > fecha_hasta:
@@ -198,27 +256,31 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
             dias_periodo = (fecha_hasta - fecha_desde).days
 
         else:
-            valor_periodo = periodo_opciones[periodo_seleccionado]
-
-            if isinstance(valor_periodo, tuple):
-                from datetime import datetime
-                fecha_desde = datetime.strptime(valor_periodo[0], "%Y-%m-%d").date()
-                fecha_hasta = datetime.strptime(valor_periodo[1], "%Y-%m-%d").date()
-                dias_periodo = (fecha_hasta - fecha_desde).days + 1
-            else:
-                dias_periodo = valor_periodo
-                fecha_hasta = fecha_maxima_disponible
-                fecha_desde = fecha_maxima_disponible - timedelta(days=dias_periodo)
+            fecha_desde, fecha_hasta, dias_periodo = rango_periodo(periodo_seleccionado, fecha_maxima_disponible)
 
-        # === CARGAR DATOS PRIMERO (para tener df_ventas disponible) ===
+        # === VENTAS DEL PERÍODO (lanzadas al inicio si el período no cambió) ===
         print(f"\n🔄 Cargando datos para filtros...")
-        df_ventas = get_ventas_data(
-            credentials_path, 
-            project_id, 
-            bigquery_table,
-            str(fecha_desde),
-            str(fecha_hasta)
-        )
+        if (fecha_desde, fecha_hasta) != fechas_lanzadas:
+            futuro_ventas = lanzar_ventas(fecha_desde, fecha_hasta)
+
+        df_presupuesto = planificador.esperar(futuro_presupuesto)
+        # print(f"   ✅ df_presupuesto: ", df_presupuesto.columns.tolist())
+        # Las familias vienen con su propia versión (watermark del maestro, ver
+        # version_familias): con ella se cachea todo lo derivado de ellas
+        version_fam, df_familias = planificador.esperar(futuro_familias)
+
+        # Agregar familia/subfamilia a df_proveedores (el índice del catálogo
+        # guarda el merge por versión de familias: no se rehace en cada rerun)
+        if catalogo is not None:
+            df_prov_con_familias = catalogo.con_familias(df_familias, version_fam)
+        else:
+            df_prov_con_familias = df_proveedores.merge(
+                df_familias[['idarticulo', 'familia', 'subfamilia']],
+                on='idarticulo',
+                how='left'
+            )
+
+        df_ventas = planificador.esperar(futuro_ventas)
 
         print('DF_VENTAS  -- '*50)
         print('DF_VENTAS  -- '*50)
@@ -226,16 +288,6 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
         print('DF_VENTAS:',df_ventas.head())
         print('DF_VENTAS  -- '*50)
         print('DF_VENTAS  -- '*50)
-        df_presupuesto = get_presupuesto_data(credentials_path, project_id)
-        # print(f"   ✅ df_presupuesto: ", df_presupuesto.columns.tolist())
-        df_familias = get_familias_data(credentials_path, project_id, bigquery_table)
-
-        # Agregar familia/subfamilia a df_proveedores
-        df_prov_con_familias = df_proveedores.merge(
-            df_familias[['idarticulo', 'familia', 'subfamilia']],
-            on='idarticulo',
-            how='left'
-        )
 
         # ⭐ FILTRAR SOLO ARTÍCULOS CON VENTAS EN EL PERÍODO
         articulos_con_ventas = df_ventas['idarticulo'].unique()
@@ -245,6 +297,18 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
 
         print(f"   ✅ Artículos con ventas en período: {len(df_prov_con_familias):,}")
 
+        # Linaje de los datos del período (utils.linaje): las funciones
+        # cacheadas se indexan por estas claves en lugar de hashear DataFrames
+        if catalogo is not None:
+            proveedores = ConjuntoDatos.origen(df_proveedores, 'catalogo', catalogo.version)
+            ventas = ConjuntoDatos.origen(df_ventas, 'ventas', bigquery_table, str(fecha_desde),
+                                          str(fecha_hasta), version_datos=version_datos)
+            presupuesto = ConjuntoDatos.origen(df_presupuesto, 'presupuesto', version_datos=version_datos)
+            familias = ConjuntoDatos.origen(df_familias, 'familias', bigquery_table, version_datos=version_fam)
+        else:
+            proveedores, ventas, presupuesto, familias = df_proveedores, df_ventas, df_presupuesto, df_familias
+        prov_con_familias = combinar('con_familias_con_ventas', df_prov_con_familias, proveedores, familias, ventas)
+
         # === FILTROS DE FAMILIA Y SUBFAMILIA ===
 
         # with col_fam1:
@@ -473,18 +537,16 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
     print(f"{'='*80}")
     inicio_ranking = time.time()
     
-    ranking = process_ranking_data(
-        df_proveedores_filtrado, 
-        df_ventas_filtrado,       # ← FILTRADO
-        df_presupuesto_filtrado,  # ← FILTRADO
-        df_familias
-    )
-    
-    ranking_flia_subflia = process_ranking_data_flias_subflias(
-        df_proveedores_filtrado, 
-        df_ventas_filtrado,       # ← FILTRADO
-        df_presupuesto_filtrado,  # ← FILTRADO
-        df_familias
+    # Cubo del período SIN filtros de familia (una vez por linaje: período y
+    # versión); cada cambio en los multiselect solo enmascara sus celdas y re-suma
+    cubo_periodo = obtener_cubo_ranking(prov_con_familias, ventas, presupuesto, familias)
+
+    cubo_filtrado = cubo_periodo.filtrar(familias_seleccionadas, subfamilias_seleccionadas)
+    ranking = ranking_de_cubo(cubo_filtrado)
+    ranking_flia_subflia = combinar(
+        'ranking_flias_subflias', ranking_flias_subflias_de_cubo(cubo_filtrado),
+        prov_con_familias, ventas, presupuesto, familias,
+        parametros=(familias_seleccionadas, subfamilias_seleccionadas)
     )
     
     tiempo_ranking = time.time() - inicio_ranking
@@ -789,11 +851,11 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
         
         # ✅ EXPORTACIÓN DE REPORTES EXCEL
         show_ranking_section(
-            df_prov_con_familias=df_prov_con_familias,
-            df_proveedores=df_proveedores,
-            df_ventas=df_ventas,
-            df_presupuesto=df_presupuesto,
-            df_familias=df_familias,
+            df_prov_con_familias=prov_con_familias,
+            df_proveedores=proveedores,
+            df_ventas=ventas,
+            df_presupuesto=presupuesto,
+            df_familias=familias,
             ranking=ranking,
             fecha_desde=fecha_desde,
             fecha_hasta=fecha_hasta,
@@ -918,14 +980,18 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
             print(f"   • Año seleccionado: {año_seleccionado}")
             print(f"   • Tabla: {bigquery_table}")
            
-            # 1. Cargar VENTAS AGREGADAS desde BigQuery (~7 segundos)
-            df_ventas_agregadas = get_ventas_agregadas_stock(
-                credentials_path=credentials_path,
-                project_id=project_id,
-                bigquery_table=bigquery_table,
-                año=año_seleccionado  
-                # año=año_actual
-            )
+            # 1. VENTAS AGREGADAS (lanzadas al inicio si el año no cambió)
+            if año_seleccionado == año_stock:
+                df_ventas_agregadas = planificador.esperar(futuro_ventas_agregadas)
+            else:
+                df_ventas_agregadas = get_ventas_agregadas_stock(
+                    credentials_path=credentials_path,
+                    project_id=project_id,
+                    bigquery_table=bigquery_table,
+                    año=año_seleccionado,
+                    # año=año_actual
+                    version_datos=version_datos
+                )
             
             if df_ventas_agregadas is None or len(df_ventas_agregadas) == 0:
                 st.error("❌ No se pudieron cargar datos de ventas desde BigQuery")
@@ -934,18 +1000,8 @@ def show_global_dashboard(df_proveedores, query_function, credentials_path, proj
             
             print(f"   ✅ Ventas agregadas: {len(df_ventas_agregadas):,} artículos")
             
-            # 2. Cargar STOCK ACTUAL desde BigQuery (~2 segundos)
-            exporter = CoberturaStockExporter(
-                credentials_path=credentials_path,
-                project_id=project_id
-            )
-            
-            if not exporter.conectar_bigquery():
-                st.error("❌ No se pudo conectar a BigQuery para cargar stock")
-                print(f"{'='*80}\n")
-                st.stop()
-            
-            df_stock = exporter.obtener_stock_bigquery()
+            # 2. STOCK ACTUAL (lanzado al inicio)
+            df_stock = planificador.esperar(futuro_stock)
             
             if df_stock is None or len(df_stock) == 0:
                 st.error("❌ No se pudieron cargar datos de stock desde BigQuery")
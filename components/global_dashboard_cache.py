@@ -5,12 +5,37 @@ from google.cloud import bigquery
 import time
 import os
 import numpy as np
-
-
-@st.cache_data(ttl=3600, show_spinner=True)
-def get_ventas_data(credentials_path, project_id, bigquery_table, fecha_desde, fecha_hasta):
+from utils.query_engine import get_query_engine
+from utils.rollup_ventas import rollup_cubre, ventas_por_articulo
+from utils.pivote_trimestral import obtener_ventas_año
+from utils.indice_prefijos import obtener_indice_prefijos
+from utils.cache_rangos import obtener_cache_rangos
+from utils.version_datos import fecha_de_version, obtener_version_datos
+from utils.cache_disco import cache_en_disco
+from utils.maestro_articulos import obtener_maestro_articulos, version_maestro_articulos
+from utils.presupuesto import obtener_presupuesto
+from utils.esquemas import aplicar_esquema, ESQUEMA_VENTAS
+from utils.cubo_ranking import obtener_cubo_ranking
+from utils.linaje import HASH_LINAJE
+
+# Períodos de hasta ~5 semanas van por el cache por día (utils.cache_rangos);
+# los más largos se agregan por artículo en el warehouse
+DIAS_MAX_CACHE_DIARIO = 35
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Las funciones que consultan el warehouse reciben `version_datos`
+# (utils.version_datos.obtener_version_datos): la entrada de cache vive hasta
+# que entra una carga nueva, no un TTL fijo. max_entries acota la memoria.
+# Las más pesadas tienen además un segundo nivel en disco (utils.cache_disco)
+# para que un deploy o un worker nuevo no arranquen en frío.
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+@st.cache_data(max_entries=32, show_spinner=True)
+def get_ventas_data(credentials_path, project_id, bigquery_table, fecha_desde, fecha_hasta,
+                    version_datos=None):
     """
-    Obtiene datos de ventas de BigQuery (CACHEADO)
+    Obtiene datos de ventas de BigQuery (CACHEADO hasta que cambie version_datos)
     """
     print(f"\n{'='*80}")
     print(f"🔄 EJECUTANDO QUERY DE VENTAS")
@@ -21,21 +46,64 @@ def get_ventas_data(credentials_path, project_id, bigquery_table, fecha_desde, f
     from google.cloud import bigquery
     
     inicio = time.time()
-    client = bigquery.Client.from_service_account_json(credentials_path)
     
-    query = f"""
-    SELECT 
-        idarticulo,
-        MAX(descripcion) as descripcion,
-        SUM(precio_total) as venta_total,
-        SUM(costo_total) as costo_total,
-        SUM(cantidad_total) as cantidad_vendida
-    FROM `{project_id}.{bigquery_table}`
-    WHERE DATE(fecha_comprobante) BETWEEN '{fecha_desde}' AND '{fecha_hasta}'
-    GROUP BY idarticulo
-    """
+    indice = obtener_indice_prefijos() if rollup_cubre(fecha_desde, fecha_hasta) else None
     
-    df = client.query(query).to_dataframe()
+    if indice is not None and indice.cubre(fecha_desde, fecha_hasta):
+        # Sumas prefijas artículo × día: una resta por período
+        print(f"   🧾 Fuente: índice de sumas prefijas")
+        df = indice.totales(fecha_desde, fecha_hasta)
+    elif rollup_cubre(fecha_desde, fecha_hasta):
+        # Rollup diario local: suma de filas (fecha, artículo, sucursal)
+        print(f"   🧮 Fuente: rollup diario")
+        df = ventas_por_articulo(fecha_desde, fecha_hasta)
+    else:
+        engine = get_query_engine(credentials_path)
+        
+        columnas_ventas = """
+                MAX(descripcion) as descripcion,
+                SUM(precio_total) as venta_total,
+                SUM(costo_total) as costo_total,
+                SUM(cantidad_total) as cantidad_vendida"""
+        
+        def _fetch_rango(desde, hasta):
+            query = f"""
+            SELECT 
+                DATE(fecha_comprobante) as fecha,
+                idarticulo,{columnas_ventas}
+            FROM `{project_id}.{bigquery_table}`
+            WHERE DATE(fecha_comprobante) BETWEEN '{desde}' AND '{hasta}'
+            GROUP BY 1, 2
+            """
+            return engine.query(query)
+        
+        dias = (pd.to_datetime(fecha_hasta) - pd.to_datetime(fecha_desde)).days + 1
+        if dias <= DIAS_MAX_CACHE_DIARIO:
+            # Cache por día (artículo × día): al ampliar el período solo se
+            # consultan los días que faltan y se re-agrega en memoria
+            df_diario = obtener_cache_rangos().obtener(
+                ('ventas_diarias', engine.nombre, project_id, bigquery_table),
+                fecha_desde, fecha_hasta, _fetch_rango, columna_fecha='fecha',
+                hasta_cacheable=fecha_de_version(version_datos)
+            )
+            df = df_diario.groupby('idarticulo', sort=False).agg(
+                descripcion=('descripcion', 'max'),
+                venta_total=('venta_total', 'sum'),
+                costo_total=('costo_total', 'sum'),
+                cantidad_vendida=('cantidad_vendida', 'sum'),
+            ).reset_index()
+        else:
+            # Rango largo: una fila por artículo × día serían cientos de veces
+            # más filas (y vaciarían el cache por rangos) → un solo GROUP BY
+            print(f"   📅 {dias} días: GROUP BY idarticulo directo (sin cache por día)")
+            df = engine.query(f"""
+            SELECT 
+                idarticulo,{columnas_ventas}
+            FROM `{project_id}.{bigquery_table}`
+            WHERE DATE(fecha_comprobante) BETWEEN '{fecha_desde}' AND '{fecha_hasta}'
+            GROUP BY idarticulo
+            """)
+    df = aplicar_esquema(df, ESQUEMA_VENTAS)
     tiempo = time.time() - inicio
     
     print(f"\n✅ Query ventas ejecutada exitosamente")
@@ -46,42 +114,33 @@ def get_ventas_data(credentials_path, project_id, bigquery_table, fecha_desde, f
     
     return df
 
-@st.cache_data(ttl=3600, show_spinner=True)  # ✅ Cache 1 hora, con spinner
-def get_presupuesto_data(credentials_path, project_id):
+def get_presupuesto_data(credentials_path, project_id, version_datos=None):
     """
-    Obtiene datos de presupuesto (CACHEADO)
+    Tabla de presupuesto de `version_datos`.
+
+    La tabla vive una sola vez en memoria (utils.presupuesto, con cache en
+    disco y cargada una vez por versión): se devuelve compartida, SIN copiar.
+    Los que la usan filtran/mergean (copias); no modificarla en el lugar.
     """
-    print(f"\n{'='*80}")
-    print(f"🔄 EJECUTANDO QUERY DE PRESUPUESTO")
-    print(f"{'='*80}")
-    
-    import time
-    from utils import query_resultados_idarticulo
-    
-    inicio = time.time()
-    df = query_resultados_idarticulo(
-        credentials_path=credentials_path,
-        project_id=project_id,
-        dataset='presupuesto',
-        table='result_final_alert_all'
-    )
-    tiempo = time.time() - inicio
-    
-    print(f"\n✅ Query presupuesto ejecutada exitosamente")
-    print(f"   ├─ Registros: {len(df):,}")
-    print(f"   └─ Tiempo: {tiempo:.2f}s")
-    
-    return df
+    try:
+        return obtener_presupuesto(credentials_path, project_id, version_datos).compartido()
+    except Exception as e:
+        st.error(f"❌ Error al consultar BigQuery: {e}")
+        return pd.DataFrame()
 
-@st.cache_data(ttl=3600)
-def get_familias_data(credentials_path, project_id, bigquery_table):
+@st.cache_data(max_entries=4)
+@cache_en_disco('get_familias_data')
+def get_familias_data(credentials_path, project_id, bigquery_table, version_datos=None):
     """
-    Obtener familias y subfamilias de artículos desde la tabla de ventas.
+    Obtener familias y subfamilias de artículos desde el maestro de artículos
+    (utils.maestro_articulos): una fila por artículo con su clasificación actual.
+    Si el maestro no está disponible, DISTINCT sobre la tabla de ventas.
     
     Args:
         credentials_path (str): Ruta a las credenciales de GCP
         project_id (str): ID del proyecto de BigQuery
         bigquery_table (str): Nombre completo de la tabla (proyecto.dataset.tabla)
+        version_datos (str): Versión de version_familias() (solo para la clave de cache)
     
     Returns:
         pd.DataFrame: DataFrame con idarticulo, familia, subfamilia
@@ -104,15 +163,22 @@ def get_familias_data(credentials_path, project_id, bigquery_table):
     """
     
     try:
-        print(f"   📊 Tabla fuente: {bigquery_table}")
-        print(f"   🔍 Query: Obteniendo familias únicas...")
-        
-        client = bigquery.Client.from_service_account_json(
-            credentials_path,
-            project=project_id
-        )
-        
-        df = client.query(query).to_dataframe()
+        try:
+            maestro = obtener_maestro_articulos(credentials_path, project_id, bigquery_table, version_datos)
+            print(f"   📇 Fuente: maestro de artículos")
+            df = (
+                maestro.loc[maestro['familia'].notna(), ['idarticulo', 'familia', 'subfamilia']]
+                .sort_values('idarticulo')
+                .reset_index(drop=True)
+            )
+        except Exception as e:
+            print(f"   ⚠️  Maestro de artículos no disponible ({e})")
+            print(f"   📊 Tabla fuente: {bigquery_table}")
+            print(f"   🔍 Query: Obteniendo familias únicas...")
+            
+            engine = get_query_engine(credentials_path, project_id)
+            
+            df = engine.query(query)
         
         tiempo = time.time() - inicio
         
@@ -129,6 +195,28 @@ def get_familias_data(credentials_path, project_id, bigquery_table):
         print("="*60 + "\n")
         return pd.DataFrame(columns=['idarticulo', 'familia', 'subfamilia'])
 
+def version_familias(credentials_path, project_id, bigquery_table, version_datos=None):
+    """
+    Versión con la que se cachean las familias: el watermark del maestro de
+    artículos, no `version_datos`. Mientras el maestro se actualiza en segundo
+    plano se sirve el snapshot anterior; guardarlo bajo la versión nueva (en
+    memoria, en disco y en IndiceCatalogo.con_familias) lo dejaría fijo hasta
+    la próxima carga. Sin maestro: `version_datos` (fuente DISTINCT).
+    """
+    try:
+        return version_maestro_articulos(credentials_path, project_id, bigquery_table, version_datos) or version_datos
+    except Exception as e:
+        print(f"   ⚠️  Maestro de artículos no disponible ({e})")
+        return version_datos
+
+def get_familias_con_version(credentials_path, project_id, bigquery_table, version_datos=None):
+    """
+    (version_familias, get_familias_data) en una sola llamada, para lanzarla
+    en paralelo: la carga inicial del maestro no bloquea el rerun.
+    """
+    version = version_familias(credentials_path, project_id, bigquery_table, version_datos)
+    return version, get_familias_data(credentials_path, project_id, bigquery_table, version_datos=version)
+
 # ============================================================================
 # CORRECCIÓN EN process_ranking_data
 # ============================================================================
@@ -206,7 +294,7 @@ import streamlit as st
 
 ## FUERA DE USO, TOMADA DEL MODULE: 
 ## C:\CUCHER_STREAMLIT\CUCHER_STREAMLIT\components\process_ranking_data_flias_subflias.py
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False)
 def process_ranking_data_flias_subflias_00(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking de proveedores desglosado por
@@ -351,7 +439,7 @@ def process_ranking_data_flias_subflias_00(df_proveedores, df_ventas, df_presupu
 
     return ranking
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False)
 def process_ranking_data_flias_subflias00(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking de proveedores desglosado por
@@ -489,102 +577,29 @@ def process_ranking_data_flias_subflias00(df_proveedores, df_ventas, df_presupue
 # ============================================================================
 # ============================================================================
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=HASH_LINAJE)
 def process_ranking_data(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking (CACHEADO)
+
+    Vista por proveedor del cubo de ranking (utils.cubo_ranking): el merge y
+    el agrupamiento se comparten con el ranking por familia/subfamilia.
+    Acepta DataFrames o ConjuntoDatos (cache por linaje, utils.linaje).
     """
     print(f"\n🔧 PROCESANDO RANKING (sin caché)")
-    import time
-    inicio = time.time()
-
-    # === VERIFICAR QUE df_familias TENGA LAS COLUMNAS ===
-    print(f"   🔍 Verificando df_familias...")
-    print(f"      Columnas en df_familias: {list(df_familias.columns)}")
-    print(f"      Registros en df_familias: {len(df_familias):,}")
-
-    # === LIMPIAR COLUMNAS DUPLICADAS EN df_proveedores ===
-    columnas_a_eliminar = []
-    if 'familia' in df_proveedores.columns:
-        columnas_a_eliminar.append('familia')
-    if 'subfamilia' in df_proveedores.columns:
-        columnas_a_eliminar.append('subfamilia')
-    
-    if columnas_a_eliminar:
-        print(f"   🧹 Eliminando columnas duplicadas de df_proveedores: {columnas_a_eliminar}")
-        df_proveedores = df_proveedores.drop(columns=columnas_a_eliminar)
+    cubo = obtener_cubo_ranking(df_proveedores, df_ventas, df_presupuesto, df_familias)
+    return ranking_de_cubo(cubo)
 
-    # === AGREGAR FAMILIA/SUBFAMILIA desde df_familias ===
-    print(f"   🔗 Agregando familia/subfamilia...")
-    
-    # Verificar qué columnas están disponibles
-    columnas_merge = ['idarticulo']
-    if 'familia' in df_familias.columns:
-        columnas_merge.append('familia')
-    if 'subfamilia' in df_familias.columns:
-        columnas_merge.append('subfamilia')
 
-    print(f"      Columnas a mergear: {columnas_merge}")
-
-    # Hacer merge solo con las columnas que existen
-    df_proveedores_completo = df_proveedores.merge(
-        df_familias[columnas_merge],
-        on='idarticulo',
-        how='left'
-    )
-
-    print(f"   ✅ Artículos con info: {len(df_proveedores_completo):,}")
-    print(f"      Columnas después del merge: {list(df_proveedores_completo.columns)}")
-
-    # Prints condicionales
-    if 'familia' in df_proveedores_completo.columns:
-        print(f"   🏷️  Familias: {df_proveedores_completo['familia'].nunique()}")
-    else:
-        print(f"   ⚠️  Columna 'familia' no encontrada después del merge")
-
-    if 'subfamilia' in df_proveedores_completo.columns:
-        print(f"   📂 Subfamilias: {df_proveedores_completo['subfamilia'].nunique()}")
-    else:
-        print(f"   ⚠️  Columna 'subfamilia' no encontrada después del merge")
-
-    # === MERGE PRINCIPAL ===
-    # Preparar columnas para el merge (solo las que existen)
-    columnas_para_merge = ['idarticulo', 'proveedor', 'idproveedor']
-    if 'familia' in df_proveedores_completo.columns:
-        columnas_para_merge.append('familia')
-    if 'subfamilia' in df_proveedores_completo.columns:
-        columnas_para_merge.append('subfamilia')
-
-    df_merge = df_proveedores_completo[columnas_para_merge].merge(
-        df_ventas,
-        on='idarticulo',
-        how='left'
-    ).merge(
-        df_presupuesto[['idarticulo', 'PRESUPUESTO', 'exceso_STK', 'costo_exceso_STK', 'STK_TOTAL']],
-        on='idarticulo',
-        how='left'
-    )
-
-    # Fillna
-    df_merge['venta_total'] = df_merge['venta_total'].fillna(0)
-    df_merge['costo_total'] = df_merge['costo_total'].fillna(0)
-    df_merge['cantidad_vendida'] = df_merge['cantidad_vendida'].fillna(0)
-    df_merge['PRESUPUESTO'] = df_merge['PRESUPUESTO'].fillna(0)
-    df_merge['exceso_STK'] = df_merge['exceso_STK'].fillna(0)
-    df_merge['costo_exceso_STK'] = df_merge['costo_exceso_STK'].fillna(0)
-    df_merge['STK_TOTAL'] = df_merge['STK_TOTAL'].fillna(0)
+def ranking_de_cubo(cubo):
+    """
+    Ranking por proveedor a partir de un cubo (completo o ya filtrado por
+    familia/subfamilia): suma las celdas y recalcula las participaciones.
+    """
+    import time
+    inicio = time.time()
 
-    # Agregación
-    ranking = df_merge.groupby(['proveedor', 'idproveedor']).agg({
-        'venta_total': 'sum',
-        'costo_total': 'sum',
-        'cantidad_vendida': 'sum',
-        'idarticulo': 'count',
-        'PRESUPUESTO': 'sum',
-        'exceso_STK': lambda x: (x > 0).sum(),
-        'costo_exceso_STK': 'sum',
-        'STK_TOTAL': lambda x: (x == 0).sum()
-    }).reset_index()
+    ranking = cubo.por_proveedor()
 
     # ✅ RENOMBRAR COLUMNAS (necesario para global_dashboard.py)
     ranking.columns = [
@@ -608,7 +623,7 @@ def process_ranking_data(df_proveedores, df_ventas, df_presupuesto, df_familias)
 
     return ranking
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False)
 def process_ranking_data00(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking (CACHEADO)
@@ -725,7 +740,8 @@ def process_ranking_data00(df_proveedores, df_ventas, df_presupuesto, df_familia
 """
 
 @st.cache_data(ttl=3600)
-def get_ventas_agregadas_filtradas(credentials_path, project_id, bigquery_table, año, margen_min=0.25, dias_min=270):
+def get_ventas_agregadas_filtradas(credentials_path, project_id, bigquery_table, año, margen_min=0.25, dias_min=270,
+                                   version_datos=None):
     """
     ⚠️ FUNCIÓN ANTIGUA - Reemplazada por get_ventas_agregadas_stock()
     
@@ -747,103 +763,16 @@ def get_ventas_agregadas_filtradas(credentials_path, project_id, bigquery_table,
     inicio = time.time()
     
     # ═══════════════════════════════════════════════════════════════════════════
-    # CONECTAR A BIGQUERY (detectar ambiente)
-    # ═══════════════════════════════════════════════════════════════════════════
-    
-    is_cloud = not os.path.exists(credentials_path) if credentials_path else True
-    
-    if is_cloud:
-        from google.oauth2 import service_account
-        credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"]
-        )
-        client = bigquery.Client(credentials=credentials, project=project_id)
-        print(f"   🌐 Ambiente: Streamlit Cloud")
-    else:
-        client = bigquery.Client.from_service_account_json(credentials_path, project=project_id)
-        print(f"   💻 Ambiente: Local")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # QUERY AGREGADA (con PARSE_DATE para convertir STRING a DATE)
-    # ═══════════════════════════════════════════════════════════════════════════
-    
-    query = f"""
-    WITH ventas_agregadas AS (
-      SELECT 
-        idarticulo,
-        idartalfa,
-        MAX(descripcion) as descripcion,
-        MAX(familia) as familia,
-        MAX(subfamilia) as subfamilia,
-        
-        -- ═══ MÉTRICAS ANUALES ═══
-        SUM(cantidad_total) as cantidad_total_anual,
-        SUM(precio_total) as precio_total_anual,
-        SUM(costo_total) as costo_total_anual,
-        
-        -- ═══ Q1: ENERO-MARZO ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 1 THEN cantidad_total ELSE 0 END) as cantidad_q1,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 1 THEN precio_total ELSE 0 END) as venta_q1,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 1 THEN costo_total ELSE 0 END) as costo_q1,
-        
-        -- ═══ Q2: ABRIL-JUNIO ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 2 THEN cantidad_total ELSE 0 END) as cantidad_q2,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 2 THEN precio_total ELSE 0 END) as venta_q2,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 2 THEN costo_total ELSE 0 END) as costo_q2,
-        
-        -- ═══ Q3: JULIO-SEPTIEMBRE ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 3 THEN cantidad_total ELSE 0 END) as cantidad_q3,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 3 THEN precio_total ELSE 0 END) as venta_q3,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 3 THEN costo_total ELSE 0 END) as costo_q3,
-        
-        -- ═══ Q4: OCTUBRE-DICIEMBRE ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 4 THEN cantidad_total ELSE 0 END) as cantidad_q4,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 4 THEN precio_total ELSE 0 END) as venta_q4,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 4 THEN costo_total ELSE 0 END) as costo_q4,
-        
-        -- ═══ FECHAS Y ACTIVIDAD ═══
-        MIN(PARSE_DATE('%Y-%m-%d', fecha_comprobante)) as fecha_primera_venta,
-        MAX(PARSE_DATE('%Y-%m-%d', fecha_comprobante)) as fecha_ultima_venta,
-        COUNT(DISTINCT PARSE_DATE('%Y-%m-%d', fecha_comprobante)) as dias_con_ventas
-        
-      FROM `{project_id}.{bigquery_table}`
-      WHERE EXTRACT(YEAR FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = {año}
-      GROUP BY idarticulo, idartalfa
-    ),
-    
-    ventas_con_metricas AS (
-      SELECT 
-        *,
-        -- Calcular días activo
-        DATE_DIFF(fecha_ultima_venta, fecha_primera_venta, DAY) + 1 as dias_activo,
-        
-        -- Calcular margen anual
-        SAFE_DIVIDE(precio_total_anual - costo_total_anual, precio_total_anual) as margen_anual,
-        
-        -- Calcular utilidad anual
-        precio_total_anual - costo_total_anual as utilidad_anual,
-        
-        -- Calcular velocidad de venta diaria
-        SAFE_DIVIDE(cantidad_total_anual, 
-          DATE_DIFF(fecha_ultima_venta, fecha_primera_venta, DAY) + 1
-        ) as velocidad_venta_diaria
-        
-      FROM ventas_agregadas
-    )
-    
-    SELECT *
-    FROM ventas_con_metricas
-    WHERE margen_anual >= {margen_min}
-      AND dias_activo >= {dias_min}
-    ORDER BY utilidad_anual DESC
-    """
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # EJECUTAR QUERY
+    # PIVOTE ANUAL MATERIALIZADO + FILTROS EN PANDAS
     # ═══════════════════════════════════════════════════════════════════════════
     
     try:
-        df = client.query(query).to_dataframe()
+        # Con la versión el pivote se lee sin consultar la última fecha en cada llamada
+        if version_datos is None:
+            version_datos = obtener_version_datos(credentials_path, project_id)
+        df = obtener_ventas_año(credentials_path, project_id, bigquery_table, año,
+                                version_datos=version_datos, normalizar=False)
+        df = df[(df['margen_anual'] >= margen_min) & (df['dias_activo'] >= dias_min)].reset_index(drop=True)
         tiempo = time.time() - inicio
         
         print(f"   ✅ Datos cargados: {len(df):,} artículos")
@@ -867,8 +796,8 @@ def get_ventas_agregadas_filtradas(credentials_path, project_id, bigquery_table,
 ═══════════════════════════════════════════════════════════════════════════════
 """
 
-@st.cache_data(ttl=3600)
-def get_ventas_agregadas_stock(credentials_path, project_id, bigquery_table, año):
+@st.cache_data(max_entries=8)
+def get_ventas_agregadas_stock(credentials_path, project_id, bigquery_table, año, version_datos=None):
     """
     Obtiene ventas agregadas por artículo con datos por trimestre
     SIN FILTROS - Trae todos los artículos para permitir filtrado dinámico
@@ -879,6 +808,7 @@ def get_ventas_agregadas_stock(credentials_path, project_id, bigquery_table, añ
         project_id: ID del proyecto de GCP
         bigquery_table: Nombre de la tabla (formato: dataset.tabla)
         año: Año a analizar (ej: 2024)
+        version_datos: Token de utils.version_datos (solo para la clave de cache)
     
     Returns:
         DataFrame con columnas:
@@ -903,103 +833,15 @@ def get_ventas_agregadas_stock(credentials_path, project_id, bigquery_table, añ
     inicio = time.time()
     
     # ═══════════════════════════════════════════════════════════════════════════
-    # CONECTAR A BIGQUERY (detectar ambiente)
-    # ═══════════════════════════════════════════════════════════════════════════
-    
-    is_cloud = not os.path.exists(credentials_path) if credentials_path else True
-    
-    if is_cloud:
-        from google.oauth2 import service_account
-        credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"]
-        )
-        client = bigquery.Client(credentials=credentials, project=project_id)
-        print(f"   🌐 Ambiente: Streamlit Cloud")
-    else:
-        client = bigquery.Client.from_service_account_json(credentials_path, project=project_id)
-        print(f"   💻 Ambiente: Local")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # QUERY AGREGADA CON NORMALIZACIÓN EN BIGQUERY
-    # ✅ TRIM() + UPPER() aplicado directamente en la query
-    # ═══════════════════════════════════════════════════════════════════════════
-    
-    query = f"""
-    WITH ventas_agregadas AS (
-      SELECT 
-        idarticulo,
-        idartalfa,
-        MAX(descripcion) as descripcion,
-        -- ✅ NORMALIZACIÓN: TRIM + UPPER
-        UPPER(TRIM(MAX(familia))) as familia,
-        UPPER(TRIM(MAX(subfamilia))) as subfamilia,
-        
-        -- ═══ MÉTRICAS ANUALES ═══
-        SUM(cantidad_total) as cantidad_total_anual,
-        SUM(precio_total) as precio_total_anual,
-        SUM(costo_total) as costo_total_anual,
-        
-        -- ═══ Q1: ENERO-MARZO ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 1 THEN cantidad_total ELSE 0 END) as cantidad_q1,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 1 THEN precio_total ELSE 0 END) as venta_q1,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 1 THEN costo_total ELSE 0 END) as costo_q1,
-        
-        -- ═══ Q2: ABRIL-JUNIO ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 2 THEN cantidad_total ELSE 0 END) as cantidad_q2,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 2 THEN precio_total ELSE 0 END) as venta_q2,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 2 THEN costo_total ELSE 0 END) as costo_q2,
-        
-        -- ═══ Q3: JULIO-SEPTIEMBRE ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 3 THEN cantidad_total ELSE 0 END) as cantidad_q3,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 3 THEN precio_total ELSE 0 END) as venta_q3,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 3 THEN costo_total ELSE 0 END) as costo_q3,
-        
-        -- ═══ Q4: OCTUBRE-DICIEMBRE ═══
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 4 THEN cantidad_total ELSE 0 END) as cantidad_q4,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 4 THEN precio_total ELSE 0 END) as venta_q4,
-        SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = 4 THEN costo_total ELSE 0 END) as costo_q4,
-        
-        -- ═══ FECHAS Y ACTIVIDAD ═══
-        MIN(PARSE_DATE('%Y-%m-%d', fecha_comprobante)) as fecha_primera_venta,
-        MAX(PARSE_DATE('%Y-%m-%d', fecha_comprobante)) as fecha_ultima_venta,
-        COUNT(DISTINCT PARSE_DATE('%Y-%m-%d', fecha_comprobante)) as dias_con_ventas
-        
-      FROM `{project_id}.{bigquery_table}`
-      WHERE EXTRACT(YEAR FROM PARSE_DATE('%Y-%m-%d', fecha_comprobante)) = {año}
-      GROUP BY idarticulo, idartalfa
-    ),
-    
-    ventas_con_metricas AS (
-      SELECT 
-        *,
-        -- Calcular días activo
-        DATE_DIFF(fecha_ultima_venta, fecha_primera_venta, DAY) + 1 as dias_activo,
-        
-        -- Calcular margen anual
-        SAFE_DIVIDE(precio_total_anual - costo_total_anual, precio_total_anual) as margen_anual,
-        
-        -- Calcular utilidad anual
-        precio_total_anual - costo_total_anual as utilidad_anual,
-        
-        -- Calcular velocidad de venta diaria
-        SAFE_DIVIDE(cantidad_total_anual, 
-          DATE_DIFF(fecha_ultima_venta, fecha_primera_venta, DAY) + 1
-        ) as velocidad_venta_diaria
-        
-      FROM ventas_agregadas
-    )
-    
-    SELECT *
-    FROM ventas_con_metricas
-    ORDER BY utilidad_anual DESC
-    """
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # EJECUTAR QUERY
+    # PIVOTE ANUAL MATERIALIZADO (utils.pivote_trimestral)
+    # Año cerrado: se lee el archivo congelado. Año en curso: se recalcula solo
+    # el trimestre abierto (rollup diario o GROUP BY trimestre)
     # ═══════════════════════════════════════════════════════════════════════════
     
     try:
-        df = client.query(query).to_dataframe()
+        df = obtener_ventas_año(credentials_path, project_id, bigquery_table, año,
+                                version_datos=version_datos)
+        df = aplicar_esquema(df, ESQUEMA_VENTAS)
         tiempo = time.time() - inicio
         
         print(f"   ✅ Datos cargados: {len(df):,} artículos")
@@ -1031,7 +873,7 @@ def get_ventas_agregadas_stock(credentials_path, project_id, bigquery_table, añ
 # CORRECCIÓN EN process_ranking_detallado_alimentos
 # ============================================================================
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False)
 def process_ranking_detallado_alimentos00(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking DETALLADO por artículo (solo familia 'Alimentos')
@@ -1224,105 +1066,34 @@ def process_ranking_detallado_alimentos00(df_proveedores, df_ventas, df_presupue
     
     return df_final
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=HASH_LINAJE)
 def process_ranking_detallado_alimentos(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking DETALLADO por artículo (cualquier familia)
+
+    Acepta DataFrames o ConjuntoDatos (cache por linaje, utils.linaje).
     """
     print(f"\n🔧 PROCESANDO RANKING DETALLADO (sin caché)")
     import time
     inicio = time.time()
     
-    # === LIMPIAR COLUMNAS DUPLICADAS EN df_proveedores ===
-    columnas_a_eliminar = []
-    if 'familia' in df_proveedores.columns:
-        columnas_a_eliminar.append('familia')
-    if 'subfamilia' in df_proveedores.columns:
-        columnas_a_eliminar.append('subfamilia')
-    if 'descripcion' in df_proveedores.columns:
-        columnas_a_eliminar.append('descripcion')
-    
-    if columnas_a_eliminar:
-        print(f"   🧹 Eliminando columnas duplicadas de df_proveedores: {columnas_a_eliminar}")
-        df_proveedores = df_proveedores.drop(columns=columnas_a_eliminar)
-    
-    # === VERIFICAR COLUMNAS EN DATAFRAMES ===
-    print(f"   🔍 Verificando columnas disponibles...")
-    print(f"      df_familias: {list(df_familias.columns)}")
-    print(f"      df_ventas: {list(df_ventas.columns)}")
-    print(f"      df_presupuesto: {list(df_presupuesto.columns)}")
-    
-    # === AGREGAR FAMILIA/SUBFAMILIA desde df_familias ===
-    columnas_merge = ['idarticulo']
-    if 'familia' in df_familias.columns:
-        columnas_merge.append('familia')
-    if 'subfamilia' in df_familias.columns:
-        columnas_merge.append('subfamilia')
-    
-    df_proveedores_completo = df_proveedores.merge(
-        df_familias[columnas_merge],
-        on='idarticulo',
-        how='left'
-    )
-    
-    # === NOTA: EL FILTRADO POR FAMILIA YA SE HIZO ANTES ===
+    # === CUBO DE RANKING (catálogo ⋈ familias ⋈ ventas ⋈ presupuesto) ===
     # df_proveedores ya viene filtrado por la familia seleccionada
-    # NO necesitamos filtrar internamente aquí
-    
-    print(f"   📊 Artículos a procesar: {len(df_proveedores_completo):,}")
-    
-    if len(df_proveedores_completo) == 0:
+    cubo = obtener_cubo_ranking(df_proveedores, df_ventas, df_presupuesto, df_familias)
+
+    print(f"   📊 Artículos a procesar: {len(cubo.articulos):,}")
+
+    if len(cubo.articulos) == 0:
         print(f"   ⚠️ NO SE ENCONTRARON ARTÍCULOS")
         return pd.DataFrame()
-    
-    # === MERGE COMPLETO (DETALLE POR ARTÍCULO) ===
-    columnas_para_merge = ['idarticulo', 'proveedor', 'idproveedor', 'familia']
-    if 'subfamilia' in df_proveedores_completo.columns:
-        columnas_para_merge.append('subfamilia')
-    
-    # MERGE CON df_ventas (incluye descripcion si está presente)
-    df_detalle = df_proveedores_completo[columnas_para_merge].merge(
-        df_ventas,
-        on='idarticulo',
-        how='inner'
-    )
-    
-    # MERGE CON df_presupuesto (evitar duplicar descripcion si ya existe)
-    columnas_presupuesto = ['idarticulo', 'PRESUPUESTO', 'exceso_STK', 'costo_exceso_STK', 'STK_TOTAL']
-    
-    # Si descripcion no vino de df_ventas pero está en df_presupuesto, incluirla
-    # if 'descripcion' not in df_detalle.columns and 'descripcion' in df_presupuesto.columns:
-    #     columnas_presupuesto.append('descripcion')
-    
-    df_detalle = df_detalle.merge(
-        df_presupuesto[columnas_presupuesto],
-        on='idarticulo',
-        how='left'
-    )
-    
+
+    # === DETALLE POR ARTÍCULO: solo los que tienen ventas (merge inner) ===
+    df_detalle = cubo.articulos_con_ventas()
+
     print(f"   📋 Columnas después de merges: {list(df_detalle.columns)}")
-    
-    # Fillna
-    df_detalle['venta_total'] = df_detalle['venta_total'].fillna(0)
-    df_detalle['costo_total'] = df_detalle['costo_total'].fillna(0)
-    df_detalle['cantidad_vendida'] = df_detalle['cantidad_vendida'].fillna(0)
-    df_detalle['PRESUPUESTO'] = df_detalle['PRESUPUESTO'].fillna(0)
-    df_detalle['exceso_STK'] = df_detalle['exceso_STK'].fillna(0)
-    df_detalle['costo_exceso_STK'] = df_detalle['costo_exceso_STK'].fillna(0)
-    df_detalle['STK_TOTAL'] = df_detalle['STK_TOTAL'].fillna(0)
-    
-    # === CALCULAR TOTALES POR PROVEEDOR (AGREGADOS) ===
-    ranking_proveedores = df_detalle.groupby(['proveedor', 'idproveedor']).agg({
-        'venta_total': 'sum',
-        'costo_total': 'sum',
-        'cantidad_vendida': 'sum',
-        'idarticulo': 'count',
-        'PRESUPUESTO': 'sum',
-        'exceso_STK': lambda x: (x > 0).sum(),
-        'costo_exceso_STK': 'sum',
-        'STK_TOTAL': lambda x: (x == 0).sum()
-    }).reset_index()
-    
+
+    # === TOTALES POR PROVEEDOR (celdas con ventas del cubo) ===
+    ranking_proveedores = cubo.por_proveedor(solo_con_ventas=True)
     ranking_proveedores.columns = [
         'Proveedor', 'ID Proveedor', 'Venta Total Proveedor', 'Costo Total Proveedor',
         'Cantidad Vendida Proveedor', 'Artículos Proveedor', 'Presupuesto Proveedor',
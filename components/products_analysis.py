@@ -36,7 +36,7 @@ def prepare_products_data(df):
     else:
         group_cols = ["descripcion"]  # fallback
 
-    productos_stats = df.groupby(group_cols, as_index=False).agg({
+    productos_stats = df.groupby(group_cols, as_index=False, observed=True).agg({
         "precio_total": "sum",
         "costo_total": "sum",
         "cantidad_total": "sum"
@@ -304,7 +304,7 @@ def render_top_products_by_branch(df, orden_por):
 
         # Agrupar por sucursal e idarticulo
         df_top5 = (
-            df.groupby(["sucursal", "idarticulo", "descripcion"])
+            df.groupby(["sucursal", "idarticulo", "descripcion"], observed=True)
             .agg({
                 "precio_total": "sum",
                 "costo_total": "sum",
@@ -327,7 +327,7 @@ def render_top_products_by_branch(df, orden_por):
 
         # Ordenar sucursales por ventas totales
         orden_sucursales = (
-            df.groupby("sucursal")["precio_total"]
+            df.groupby("sucursal", observed=True)["precio_total"]
             .sum()
             .sort_values(ascending=False)
             .index.tolist()
@@ -336,7 +336,7 @@ def render_top_products_by_branch(df, orden_por):
         # Obtener top 5 artículos por sucursal
         df_top5 = df_top5[df_top5[orden_por].notna()]
         df_top5 = df_top5.sort_values(["sucursal", orden_por], ascending=[True, False])
-        df_top5 = df_top5.groupby("sucursal").head(5).copy()
+        df_top5 = df_top5.groupby("sucursal", observed=True).head(5).copy()
 
         # Preparar etiquetas
         df_top5["idarticulo"] = df_top5["idarticulo"].astype(str)
@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 from babel.dates import format_date
 from babel import Locale
-from utils import (setup_credentials, PROVEEDOR_UNIFICADO, NOMBRES_UNIFICADOS, query_bigquery_tickets, query_resultados_idarticulo, load_proveedores_from_sheet, calculate_metrics, generate_insights)
+from utils import (setup_credentials, PROVEEDOR_UNIFICADO, query_bigquery_tickets, query_resultados_idarticulo, calculate_metrics, generate_insights)
 from components.sidebar_filters import show_sidebar_filters
 from components.executive_summary import show_executive_summary as render_executive_summary
 from components.products_analysis import show_products_analysis as render_products_analysis
@@ -15,6 +15,12 @@ from components.executive_summary_detailed import show_executive_summary_best
 from components.budget_analysis import show_presupuesto_estrategico
 from generar_excel import generar_excel
 from custom_css import custom_css
+from utils.version_datos import obtener_version_datos
+from utils.query_engine import normalizar_ids
+from utils.metadatos import obtener_fecha_datos
+from utils.catalogo import obtener_catalogo
+from utils.bigquery_queries import query_bigquery_tickets_agregados
+from utils.config import get_modo_tickets
 
 locale = Locale.parse('es_AR')
 
@@ -27,6 +33,7 @@ class ProveedorDashboard:
     def __init__(self):
         """Inicializar dashboard"""
         self.df_proveedores = None
+        self.catalogo = None
         self.df_tickets = None
         self.config = setup_credentials()
         
@@ -40,26 +47,25 @@ class ProveedorDashboard:
         """Cargar datos de proveedores"""
         if self.df_proveedores is None:
             with st.spinner("Cargando proveedores..."):
-                self.df_proveedores = load_proveedores_from_sheet(
-                    self.config['sheet_id'],
-                    self.config['sheet_name'],
-                    PROVEEDOR_UNIFICADO,
-                    NOMBRES_UNIFICADOS
-                )
+                # Índice compartido: proveedor → artículos sin recorrer el catálogo
+                self.catalogo = obtener_catalogo(self.config['sheet_id'], self.config['sheet_name'])
+                self.df_proveedores = self.catalogo.df
     
     def query_bigquery_data(self, proveedor, fecha_inicio, fecha_fin):
         """Consultar datos de BigQuery para un proveedor"""
-        ids = self.df_proveedores[
-            self.df_proveedores['proveedor'] == proveedor
-        ]['idarticulo'].dropna().astype(int).astype(str).unique()
+        ids = normalizar_ids(self.catalogo.articulos(proveedor))
+        
+        # 'agregado': una fila por fecha × artículo × sucursal calculada en el servidor
+        consulta = query_bigquery_tickets_agregados if get_modo_tickets() == 'agregado' else query_bigquery_tickets
         
-        return query_bigquery_tickets(
+        return consulta(
             self.config['credentials_path'],
             self.config['project_id'],
             self.config['bigquery_table'],
             ids,
             fecha_inicio,
-            fecha_fin
+            fecha_fin,
+            version_datos=obtener_version_datos(self.config['credentials_path'], self.config['project_id'])
         )
     
     def query_presupuesto(self, idproveedor):
@@ -71,6 +77,10 @@ class ProveedorDashboard:
             proveedor_unificado=PROVEEDOR_UNIFICADO
         )
     
+    def fecha_datos(self):
+        """Última fecha cargada (metadatos cacheados)"""
+        return obtener_fecha_datos(self.config['credentials_path'], self.config['project_id'])
+    
     def show_sidebar_filters(self):
         """Wrapper para mostrar filtros del sidebar"""
         self.load_proveedores()
@@ -81,7 +91,9 @@ class ProveedorDashboard:
             self.df_proveedores,
             df_proveedor_ids,
             self.query_bigquery_data,
-            self.query_presupuesto
+            self.query_presupuesto,
+            fecha_datos_function=self.fecha_datos,
+            catalogo=self.catalogo
         )
     
     def show_main_dashboard(self):
@@ -138,7 +150,8 @@ class ProveedorDashboard:
                 query_function=query_resultados_idarticulo,
                 credentials_path=self.config['credentials_path'],
                 project_id=self.config['project_id'],
-                bigquery_table=self.config['bigquery_table']
+                bigquery_table=self.config['bigquery_table'],
+                catalogo=self.catalogo
             )
             return
                
@@ -255,7 +268,8 @@ class ProveedorDashboard:
                 query_function=query_resultados_idarticulo,
                 credentials_path=self.config['credentials_path'],
                 project_id=self.config['project_id'],
-                bigquery_table=self.config['bigquery_table']
+                bigquery_table=self.config['bigquery_table'],
+                catalogo=self.catalogo
             )
             return
                
@@ -17,6 +17,7 @@ from utils.ranking_proveedores import crear_excel_ranking, generar_nombre_archiv
 from components.global_dashboard_cache import process_ranking_data, process_ranking_detallado_alimentos
 from components.alimentos_analysis import show_alimentos_analysis
 from utils.telegram_notifier import send_telegram_alert
+from utils.linaje import datos_de, combinar
 
 def format_millones(valor):
     """Formatea valores grandes en millones o miles"""
@@ -37,10 +38,11 @@ def show_ranking_section(df_prov_con_familias, df_proveedores, df_ventas, df_pre
     Renderiza la sección de exportación de rankings.
     
     Args:
-        df_prov_con_familias (pd.DataFrame): Proveedores con familias
-        df_ventas (pd.DataFrame): Datos de ventas
-        df_presupuesto (pd.DataFrame): Datos de presupuesto
-        df_familias (pd.DataFrame): Catálogo de familias
+        df_prov_con_familias (pd.DataFrame | ConjuntoDatos): Proveedores con familias
+        df_proveedores (pd.DataFrame | ConjuntoDatos): Catálogo de proveedores
+        df_ventas (pd.DataFrame | ConjuntoDatos): Datos de ventas
+        df_presupuesto (pd.DataFrame | ConjuntoDatos): Datos de presupuesto
+        df_familias (pd.DataFrame | ConjuntoDatos): Catálogo de familias
         ranking (pd.DataFrame): Ranking filtrado actual
         fecha_desde (date): Fecha inicio del período
         fecha_hasta (date): Fecha fin del período
@@ -53,6 +55,16 @@ def show_ranking_section(df_prov_con_familias, df_proveedores, df_ventas, df_pre
     print(f"\n{'='*80}")
     print("📊 SECCIÓN: EXPORTACIÓN DE RANKINGS")
     print(f"{'='*80}\n")
+
+    # Los datos pueden llegar como ConjuntoDatos (utils.linaje): las funciones
+    # cacheadas reciben los conjuntos (cache por linaje), el resto los DataFrames
+    conjuntos = {
+        'prov_con_familias': df_prov_con_familias, 'proveedores': df_proveedores,
+        'ventas': df_ventas, 'presupuesto': df_presupuesto, 'familias': df_familias,
+    }
+    df_prov_con_familias, df_proveedores, df_ventas, df_presupuesto, df_familias = (
+        datos_de(c) for c in conjuntos.values()
+    )
     
     container_descarga = st.container(border=True)
 
@@ -71,10 +83,10 @@ def show_ranking_section(df_prov_con_familias, df_proveedores, df_ventas, df_pre
             inicio_completo = time.time()
             
             ranking_completo = process_ranking_data(
-                df_prov_con_familias,  # SIN filtrar por familia/subfamilia
-                df_ventas,             # Ventas del período seleccionado
-                df_presupuesto,        # Presupuesto completo
-                df_familias
+                conjuntos['prov_con_familias'],  # SIN filtrar por familia/subfamilia
+                conjuntos['ventas'],             # Ventas del período seleccionado
+                conjuntos['presupuesto'],        # Presupuesto completo
+                conjuntos['familias']
             )
             
             tiempo_completo = time.time() - inicio_completo
@@ -324,10 +336,12 @@ def show_ranking_section(df_prov_con_familias, df_proveedores, df_ventas, df_pre
         inicio_detallado = time.time()
         
         ranking_detallado_familia = process_ranking_detallado_alimentos(
-            df_para_familia,
-            df_ventas,
-            df_presupuesto,
-            df_familias
+            combinar('articulos_de_familia', df_para_familia,
+                     conjuntos['proveedores'], conjuntos['familias'],
+                     parametros=(familia_seleccionada.lower(), subfamilias_a_usar)),
+            conjuntos['ventas'],
+            conjuntos['presupuesto'],
+            conjuntos['familias']
         )
 
         ##### mostrar proveedores unicos de ranking_detallado_familia  #####
@@ -546,10 +560,10 @@ def show_ranking_section(df_prov_con_familias, df_proveedores, df_ventas, df_pre
 
     # Mostrar análisis detallado para CUALQUIER familia
     show_alimentos_analysis(
-        df_proveedores=df_proveedores,
-        df_ventas=df_ventas,
-        df_presupuesto=df_presupuesto,
-        df_familias=df_familias,
+        df_proveedores=conjuntos['proveedores'],
+        df_ventas=conjuntos['ventas'],
+        df_presupuesto=conjuntos['presupuesto'],
+        df_familias=conjuntos['familias'],
         fecha_desde=fecha_desde,
         fecha_hasta=fecha_hasta,
         subfamilias_preseleccionadas=subfamilias_a_usar,
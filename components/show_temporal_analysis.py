@@ -13,7 +13,7 @@ def show_products_analysis(self, df):
 
         try:
             # === Agrupar por descripción ===
-            productos_stats = df.groupby("descripcion").agg({
+            productos_stats = df.groupby("descripcion", observed=True).agg({
                 "precio_total": "sum",
                 "costo_total": "sum",
                 "cantidad_total": "sum"
@@ -130,7 +130,7 @@ def show_products_analysis(self, df):
                     
                     # Agrupar por sucursal e idarticulo
                     df_top5 = (
-                        df.groupby(["sucursal", "idarticulo", "descripcion"])
+                        df.groupby(["sucursal", "idarticulo", "descripcion"], observed=True)
                         .agg({
                             "precio_total": "sum",
                             "costo_total": "sum",
@@ -153,13 +153,13 @@ def show_products_analysis(self, df):
 
                     # Ordenar sucursales por ventas totales
                     orden_sucursales = (
-                        df.groupby("sucursal")["precio_total"].sum().sort_values(ascending=False).index.tolist()
+                        df.groupby("sucursal", observed=True)["precio_total"].sum().sort_values(ascending=False).index.tolist()
                     )
 
                     # Obtener top 5 artículos por sucursal (en orden deseado)
                     df_top5 = df_top5[df_top5[orden_por].notna()]
                     df_top5 = df_top5.sort_values([ "sucursal", orden_por], ascending=[True, False])
-                    df_top5 = df_top5.groupby("sucursal").head(5).copy()
+                    df_top5 = df_top5.groupby("sucursal", observed=True).head(5).copy()
 
                     # Convertir idarticulo a str para el eje x
                     df_top5["idarticulo"] = df_top5["idarticulo"].astype(str)
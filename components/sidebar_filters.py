@@ -7,12 +7,14 @@ from datetime import datetime, timedelta
 from babel.dates import format_date
 from babel import Locale
 from custom_css import custom_sidebar
+from utils.data_processing import contar_lineas
 
 locale_es = Locale.parse("es")
 
 
 def show_sidebar_filters(df_proveedores, df_proveedor_ids, query_bigquery_function, 
-                        query_presupuesto_function, fecha_inicio_default=30):
+                        query_presupuesto_function, fecha_inicio_default=30,
+                        fecha_datos_function=None, catalogo=None):
     """
     Mostrar filtros en el sidebar y manejar la selección
     
@@ -22,6 +24,10 @@ def show_sidebar_filters(df_proveedores, df_proveedor_ids, query_bigquery_functi
         query_bigquery_function: Función para consultar BigQuery
         query_presupuesto_function: Función para consultar presupuesto
         fecha_inicio_default: Días por defecto para el rango de fechas
+        fecha_datos_function: Función sin argumentos que devuelve la última
+            fecha cargada (metadatos cacheados, sin consultar el presupuesto)
+        catalogo: IndiceCatalogo (utils.catalogo) para buscar proveedores sin
+            recorrer el DataFrame
     
     Returns:
         tuple: (proveedor, fecha_inicio, fecha_fin, df_presu)
@@ -35,7 +41,10 @@ def show_sidebar_filters(df_proveedores, df_proveedor_ids, query_bigquery_functi
             st.session_state['authenticator'].logout(button_name=saliendo, location='sidebar')
 
     # Lista de proveedores
-    proveedores = sorted(df_proveedores['proveedor'].dropna().unique())
+    if catalogo is not None:
+        proveedores = catalogo.proveedores
+    else:
+        proveedores = sorted(df_proveedores['proveedor'].dropna().unique())
     proveedor_actual = st.session_state.get("selected_proveedor")
     
     # Inicializar key si no existe
@@ -57,23 +66,21 @@ def show_sidebar_filters(df_proveedores, df_proveedor_ids, query_bigquery_functi
     
     if proveedor:
         # Obtener ID del proveedor
-        filtro = df_proveedor_ids[df_proveedor_ids['proveedor'] == proveedor]
-        if not filtro.empty:
-            fila = int(filtro['idproveedor'].iloc[0])
-            
-            # Intentar obtener última fecha disponible
-            try:
-                df_presu_temp = query_presupuesto_function(fila)
-                if df_presu_temp is not None and 'ultima_fecha' in df_presu_temp.columns:
-                    # fecha_maxima_disponible = pd.to_datetime(df_presu_temp['ultima_fecha']).max().date()
-                    # DESPUÉS
-                    fecha_max = pd.to_datetime(df_presu_temp['ultima_fecha']).max()
-                    if pd.notna(fecha_max):
-                        fecha_maxima_disponible = fecha_max.date()
-                    print(f"   ✅ Última fecha disponible: {fecha_maxima_disponible.strftime('%d/%m/%Y')}")
-            except Exception as e:
-                print(f"   ⚠️  No se pudo obtener fecha máxima: {e}")
-                # Mantener el valor por defecto
+        if catalogo is not None:
+            fila = catalogo.id_proveedor(proveedor)
+        else:
+            filtro = df_proveedor_ids[df_proveedor_ids['proveedor'] == proveedor]
+            if not filtro.empty:
+                fila = int(filtro['idproveedor'].iloc[0])
+    
+    # Última fecha disponible: metadatos cacheados por versión de datos
+    # (antes: SELECT * del presupuesto en cada rerun solo para leer ultima_fecha)
+    if fecha_datos_function is not None:
+        try:
+            fecha_maxima_disponible = fecha_datos_function()
+        except Exception as e:
+            print(f"   ⚠️  No se pudo obtener fecha máxima: {e}")
+            # Mantener el valor por defecto
 
     # Mostrar última fecha disponible
     fecha_str = fecha_maxima_disponible.strftime('%d/%m/%Y') if pd.notna(fecha_maxima_disponible) else "Sin datos"
@@ -172,8 +179,9 @@ def show_sidebar_filters(df_proveedores, df_proveedor_ids, query_bigquery_functi
         productos_unicos = df_tickets['idarticulo'].nunique() if 'idarticulo' in df_tickets else 0
         familias = df_tickets['familia'].nunique() if 'familia' in df_tickets else 0
         subfamilias = df_tickets['subfamilia'].nunique() if 'subfamilia' in df_tickets else 0
-        dia_top = df_tickets['fecha'].dt.day_name().value_counts().idxmax() if len(df_tickets) > 0 else "N/A"
-        mes_top = df_tickets['fecha'].dt.strftime('%B').value_counts().idxmax() if len(df_tickets) > 0 else "N/A"
+        # Días/meses con más líneas de ticket (también con tickets agregados)
+        dia_top = contar_lineas(df_tickets, df_tickets['fecha'].dt.day_name()).idxmax() if len(df_tickets) > 0 else "N/A"
+        mes_top = contar_lineas(df_tickets, df_tickets['fecha'].dt.strftime('%B')).idxmax() if len(df_tickets) > 0 else "N/A"
         
         st.sidebar.markdown("---")
         st.sidebar.markdown("### 📊 Resumen del Período")
@@ -9,8 +9,11 @@ import io
 import plotly.graph_objects as go
 import time
 from google.cloud import bigquery
+from utils.maestro_articulos import obtener_maestro_articulos
+from utils.version_datos import obtener_version_datos
 from utils.crear_excel_ranking_flia_subflia import crear_excel_ranking_flias_subflias
 from utils.process_resumen_proveedor_familia import process_resumen_proveedor_familia
+from utils.linaje import datos_de, HASH_LINAJE
 
 def format_millones(valor):
     """Formatea valores grandes en millones o miles"""
@@ -336,7 +339,7 @@ def main_tab1_ranking_ventas(
 
     # ✅ df_display queda NUMÉRICO -> Streamlit lo formatea visualmente
     #    y el mismo df sirve para el Excel con valores operables.
-    df_display = ranking_flia_subflia.copy()
+    df_display = datos_de(ranking_flia_subflia).copy()
 
     # === COLUMNAS A MOSTRAR (incluye las 3 nuevas) ===
     columnas_mostrar = [
@@ -398,13 +401,14 @@ def main_tab1_ranking_ventas(
     # ═════════════════════════════════════════════════════════════════════════
     ### BTN DE DESCARGA DE EXCEL:
     # === BOTÓN DE DESCARGA (1 solo click) ===
-    @st.cache_data(ttl=300, show_spinner=False)
+    # Con un ConjuntoDatos la clave de cache es su linaje (no el contenido)
+    @st.cache_data(max_entries=8, show_spinner=False, hash_funcs=HASH_LINAJE)
     def _excel_ranking_flias_bytes(df, fecha_desde, fecha_hasta):
-        buf = crear_excel_ranking_flias_subflias(df, fecha_desde, fecha_hasta)
+        buf = crear_excel_ranking_flias_subflias(datos_de(df).copy(), fecha_desde, fecha_hasta)
         return buf.getvalue() if buf is not None else None
 
     with st.spinner("🔄 Preparando Excel..."):
-        excel_bytes = _excel_ranking_flias_bytes(df_display, fecha_desde, fecha_hasta)
+        excel_bytes = _excel_ranking_flias_bytes(ranking_flia_subflia, fecha_desde, fecha_hasta)
 
     if excel_bytes:
         inicio = fecha_desde.strftime('%d%b%Y')
@@ -539,7 +543,7 @@ def main_tab1_ranking_ventas(
         )
     else:
         print(f"⚠️ 'descripcion' NO está en df_ventas_filtrado")
-        print(f"🔄 Consultando BigQuery para obtener descripciones...")
+        print(f"🔄 Buscando descripciones en el maestro de artículos...")
         
         try:
             inicio_desc = time.time()
@@ -547,51 +551,22 @@ def main_tab1_ranking_ventas(
             # Obtener lista de idarticulos únicos
             ids_para_buscar = df_para_cobertura['idarticulo'].unique().tolist()
             
-            # Limitar a 10,000 IDs por consulta (límite de BigQuery)
-            if len(ids_para_buscar) > 10000:
-                print(f"⚠️ Hay {len(ids_para_buscar):,} artículos. Limitando a 10,000 para la consulta...")
-                ids_para_buscar = ids_para_buscar[:10000]
-            
-            id_str = ','.join(map(str, ids_para_buscar))
-            
-            print(f"   • IDs a consultar: {len(ids_para_buscar):,}")
+            print(f"   • IDs a buscar: {len(ids_para_buscar):,}")
             print(f"   • Tabla: {bigquery_table}")
             
-            # Conectar a BigQuery
-            import os
-            is_cloud = not os.path.exists(credentials_path)
-            
-            if is_cloud:
-                print(f"   • Ambiente: Streamlit Cloud")
-                from google.oauth2 import service_account
-                credentials = service_account.Credentials.from_service_account_info(
-                    st.secrets["gcp_service_account"]
-                )
-                client = bigquery.Client(credentials=credentials, project=project_id)
-            else:
-                print(f"   • Ambiente: Local")
-                client = bigquery.Client.from_service_account_json(credentials_path, project=project_id)
-            
-            # Query para obtener descripciones (más reciente por artículo)
-            query_desc = f"""
-            SELECT idarticulo, descripcion
-            FROM (
-                SELECT idarticulo, descripcion,
-                    ROW_NUMBER() OVER (PARTITION BY idarticulo ORDER BY fecha_comprobante DESC) as rn
-                FROM `{project_id}.{bigquery_table}`
-                WHERE idarticulo IN ({id_str})
-                AND descripcion IS NOT NULL
-                AND descripcion != ''
+            # Descripción de la última línea de ticket por artículo (maestro incremental)
+            maestro = obtener_maestro_articulos(
+                credentials_path, project_id, bigquery_table,
+                obtener_version_datos(credentials_path, project_id)
             )
-            WHERE rn = 1
-            """
-            
-            print(f"\n🔄 Ejecutando query...")
-            df_descripciones = client.query(query_desc).to_dataframe()
+            df_descripciones = maestro.loc[
+                maestro['idarticulo'].isin(ids_para_buscar) & maestro['descripcion'].notna(),
+                ['idarticulo', 'descripcion']
+            ]
             
             tiempo_desc = time.time() - inicio_desc
             
-            print(f"✅ Query completada en {tiempo_desc:.2f}s")
+            print(f"✅ Búsqueda completada en {tiempo_desc:.2f}s")
             print(f"   • Descripciones obtenidas: {len(df_descripciones):,}")
             print(f"   • Muestra:")
             print(df_descripciones.head(5))
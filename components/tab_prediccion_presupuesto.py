@@ -28,6 +28,12 @@ from google.cloud import bigquery
 import plotly.graph_objects as go
 
 from utils.config import ID_LIST_SALTA, SALTA_REFRESCOS_ID, NOMBRES_UNIFICADOS
+from utils.query_engine import get_query_engine, normalizar_ids, arrow_a_pandas
+from utils.tickets_mirror import mirror_cubre, leer_tickets
+from utils.rollup_ventas import rollup_cubre, ventas_diarias
+from utils.version_datos import obtener_version_datos, fecha_de_version
+from utils.presupuesto import obtener_presupuesto
+from utils.pronostico_demanda import pronosticar_demanda, proporciones_regionales
 
 warnings.filterwarnings('ignore')
 
@@ -35,8 +41,9 @@ warnings.filterwarnings('ignore')
 # FUNCIONES DE CARGA DE DATOS DESDE BIGQUERY
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@st.cache_data(ttl=3600, show_spinner="Cargando datos de presupuesto...")
-def cargar_datos_presupuesto_bq(credentials_path, project_id, id_list, tipo_id='idarticuloalfa'):
+@st.cache_data(max_entries=16, show_spinner="Cargando datos de presupuesto...")
+def cargar_datos_presupuesto_bq(credentials_path, project_id, id_list, tipo_id='idarticuloalfa',
+                                version_datos=None):
     """
     Carga datos del presupuesto desde BigQuery filtrados por IDs
     
@@ -45,26 +52,19 @@ def cargar_datos_presupuesto_bq(credentials_path, project_id, id_list, tipo_id='
         project_id: ID del proyecto en BigQuery
         id_list: Lista de IDs a filtrar
         tipo_id: Columna a usar para filtrar ('idarticuloalfa' o 'idarticulo')
+        version_datos: Token de utils.version_datos (solo para la clave de cache)
     """
     try:
-        client = bigquery.Client.from_service_account_json(credentials_path)
-        
-        id_str = ','.join(map(str, id_list))
+        id_list = list(normalizar_ids(id_list))
         
         print(f"DEBUG cargar_datos_presupuesto_bq:")
         print(f"  - tipo_id: {tipo_id}")
         print(f"  - Cantidad de IDs: {len(id_list)}")
         print(f"  - Primeros 3 IDs: {id_list[:3]}")
         
-        query = f"""
-        SELECT *
-        FROM `{project_id}.presupuesto.result_final_alert_all`
-        WHERE {tipo_id} IN ({id_str})
-        """
-        
-        print(f"  - Query: {query[:200]}...")
-        
-        df = client.query(query).to_dataframe()
+        # Porción del presupuesto en memoria (una descarga por versión de datos)
+        df = obtener_presupuesto(credentials_path, project_id, version_datos).articulos(
+            id_list, tipo_id, columnas=COLUMNAS_INFO_PRODUCTOS)
         
         st.success(f"✓ Presupuesto cargado: {len(df):,} registros")
         print(f"  - Registros encontrados: {len(df)}")
@@ -76,8 +76,9 @@ def cargar_datos_presupuesto_bq(credentials_path, project_id, id_list, tipo_id='
         return pd.DataFrame()
 
 
-@st.cache_data(ttl=3600, show_spinner="Cargando tickets históricos...")
-def cargar_datos_tickets_bq(credentials_path, project_id, bigquery_table, id_list, fecha_desde, tipo_id='idarticuloalfa'):
+@st.cache_data(max_entries=16, show_spinner="Cargando tickets históricos...")
+def cargar_datos_tickets_bq(credentials_path, project_id, bigquery_table, id_list, fecha_desde, tipo_id='idarticuloalfa',
+                            version_datos=None):
     """
     Carga datos de tickets desde BigQuery filtrados por IDs y fecha
     
@@ -88,11 +89,13 @@ def cargar_datos_tickets_bq(credentials_path, project_id, bigquery_table, id_lis
         id_list: Lista de IDs a filtrar
         fecha_desde: Fecha inicial para filtrar
         tipo_id: Columna a usar para filtrar ('idarticuloalfa' o 'idarticulo')
+        version_datos: Token de utils.version_datos; los almacenes locales se usan
+            solo si llegan hasta esa fecha (si no, estarían atrasados)
     """
     try:
-        client = bigquery.Client.from_service_account_json(credentials_path)
+        engine = get_query_engine(credentials_path)
         
-        id_str = ','.join(map(str, id_list))
+        id_list = list(normalizar_ids(id_list))
         
         print(f"DEBUG cargar_datos_tickets_bq:")
         print(f"  - tipo_id: {tipo_id}")
@@ -110,15 +113,37 @@ def cargar_datos_tickets_bq(credentials_path, project_id, bigquery_table, id_lis
             sucursal,
             cantidad_total as cantidad
         FROM `{project_id}.{bigquery_table}`
-        WHERE {columna_filtro} IN ({id_str})
+        WHERE {columna_filtro} IN UNNEST(@ids)
         AND DATE(fecha_comprobante) >= '{fecha_desde}'
         ORDER BY fecha_comprobante
         """
         
         print(f"  - Columna filtro: {columna_filtro}")
-        print(f"  - Query: {query[:200]}...")
         
-        df = client.query(query).to_dataframe()
+        hasta_version = fecha_de_version(version_datos)
+        
+        if rollup_cubre(fecha_desde, hasta_version):
+            # Los bloques de 7 días solo necesitan cantidad por día y sucursal
+            print(f"  - Fuente: rollup diario")
+            df = ventas_diarias(
+                fecha_desde,
+                columnas=['fecha', 'idartalfa', 'sucursal', 'cantidad_total'],
+                ids=id_list,
+                columna_id=columna_filtro,
+            ).rename(columns={'fecha': 'fecha_comprobante', 'cantidad_total': 'cantidad'})
+            df = df.sort_values('fecha_comprobante').reset_index(drop=True)
+        elif mirror_cubre(fecha_desde, hasta_version):
+            print(f"  - Fuente: espejo local Parquet")
+            df = leer_tickets(
+                fecha_desde,
+                columnas=['fecha_comprobante', 'idartalfa', 'sucursal', 'cantidad_total'],
+                ids=id_list,
+                columna_id=columna_filtro,
+            ).rename(columns={'cantidad_total': 'cantidad'})
+            df = df.sort_values('fecha_comprobante').reset_index(drop=True)
+        else:
+            print(f"  - Query: {query[:200]}...")
+            df = arrow_a_pandas(engine.query_arrow(query, {'ids': id_list}))
         
         if df.empty:
             st.warning("No se encontraron tickets para los artículos seleccionados")
@@ -213,140 +238,59 @@ def calcular_ventas_por_bloques(df_con_bloques, cantidad_bloques_historico=12):
 # ═══════════════════════════════════════════════════════════════════════════════
 
 def calcular_demanda_potencial_bloques(ventas_totales, n_semanas=1):
-    """Calcula la demanda potencial para N bloques de 7 días"""
-    resultados = []
-    
-    for id_art, grupo in ventas_totales.groupby('idartalfa'):
-        grupo_sorted = grupo.sort_values('bloque_7dias')
-        
-        if len(grupo_sorted) < 2:
-            demanda_base = grupo_sorted['cantidad_bloque'].iloc[0] if len(grupo_sorted) > 0 else 0
-        else:
-            ultimos_bloques = grupo_sorted.head(min(4, len(grupo_sorted)))
-            demanda_base = ultimos_bloques['cantidad_bloque'].mean()
-            
-            if len(grupo_sorted) >= 3:
-                ultimos_3 = grupo_sorted.head(3)['cantidad_bloque'].values
-                promedio_historico = grupo_sorted.tail(-3)['cantidad_bloque'].mean() if len(grupo_sorted) > 3 else demanda_base
-                
-                promedio_reciente = ultimos_3.mean()
-                if promedio_historico > 0:
-                    cambio_pct = (promedio_reciente - promedio_historico) / promedio_historico
-                    
-                    if cambio_pct > 0.15:
-                        demanda_base *= 1.10
-                    elif cambio_pct < -0.15:
-                        demanda_base *= 0.95
-        
-        demanda_n_semanas = demanda_base * n_semanas
-        
-        resultados.append({
-            'idartalfa': id_art,
-            f'demanda_potencial_{n_semanas}_bloque{"s" if n_semanas > 1 else ""}': demanda_n_semanas
-        })
-    
-    return pd.DataFrame(resultados)
+    """Calcula la demanda potencial para N bloques de 7 días (motor vectorizado)"""
+    columna = f'demanda_potencial_{n_semanas}_bloque{"s" if n_semanas > 1 else ""}'
+    return pronosticar_demanda(ventas_totales, horizontes=[(columna, n_semanas)])
 
 
 def calcular_demanda_por_region(ventas_por_region, demanda_total_df, n_semanas=1):
-    """Calcula demanda potencial por región"""
+    """Calcula demanda potencial por región (motor vectorizado)"""
     if n_semanas == 1:
         col_demanda = 'demanda_potencial_proxima_semana'
     else:
         col_demanda = f'demanda_potencial_proximas_{n_semanas}_semanas'
     
-    demanda_dict = demanda_total_df.set_index('idartalfa')[col_demanda].to_dict()
-    
-    resultados = []
-    
-    for id_art, grupo in ventas_por_region.groupby('idartalfa'):
-        ventas_region = {}
-        
-        for region in ['chaco', 'corrientes']:
-            grupo_region = grupo[grupo['region'] == region]
-            
-            if len(grupo_region) == 0:
-                ventas_region[region] = 0
-            else:
-                grupo_sorted = grupo_region.sort_values('bloque_7dias')
-                ultimos_bloques = grupo_sorted.head(min(4, len(grupo_sorted)))
-                ventas_region[region] = ultimos_bloques['cantidad_bloque_region'].mean()
-        
-        total_historico = ventas_region['chaco'] + ventas_region['corrientes']
-        
-        if total_historico > 0:
-            cor_perc_decimal = ventas_region['corrientes'] / total_historico
-            chaco_perc_decimal = ventas_region['chaco'] / total_historico
-        else:
-            cor_perc_decimal = 0.5
-            chaco_perc_decimal = 0.5
-        
-        demanda_total = demanda_dict.get(id_art, 0)
-        
-        resultados.append({
-            'idartalfa': id_art,
-            'chaco_cantidad': demanda_total * chaco_perc_decimal,
-            'corr_cantidad': demanda_total * cor_perc_decimal,
-            'cor_%': cor_perc_decimal * 100,
-            'chaco_perc': chaco_perc_decimal
-        })
-    
-    return pd.DataFrame(resultados)
+    ids = pd.Index(ventas_por_region['idartalfa'].unique()).sort_values()
+    chaco_perc, cor_perc = proporciones_regionales(ventas_por_region, ids)
+    demanda_total = demanda_total_df.set_index('idartalfa')[col_demanda].reindex(ids).fillna(0).to_numpy()
+    
+    return pd.DataFrame({
+        'idartalfa': ids,
+        'chaco_cantidad': demanda_total * chaco_perc,
+        'corr_cantidad': demanda_total * cor_perc,
+        'cor_%': cor_perc * 100,
+        'chaco_perc': chaco_perc
+    })
 
 
 def generar_columnas_demanda(ventas_totales, ventas_por_region):
-    """Genera SIEMPRE las columnas de demanda para 1, 2, 3, 4 semanas"""
-    
-    # SIEMPRE calcular 1 semana
-    df_1_semana = calcular_demanda_potencial_bloques(ventas_totales, n_semanas=1)
-    df_1_semana.rename(columns={'demanda_potencial_1_bloque': 'demanda_potencial_proxima_semana'}, inplace=True)
-    
-    # SIEMPRE calcular 2 semanas
-    df_2_semanas = calcular_demanda_potencial_bloques(ventas_totales, n_semanas=2)
-    df_2_semanas = df_2_semanas[['idartalfa', 'demanda_potencial_2_bloques']]
-    df_2_semanas.rename(columns={'demanda_potencial_2_bloques': 'demanda_potencial_proximas_2_semanas'}, inplace=True)
-    
-    # SIEMPRE calcular 3 semanas
-    df_3_semanas = calcular_demanda_potencial_bloques(ventas_totales, n_semanas=3)
-    df_3_semanas = df_3_semanas[['idartalfa', 'demanda_potencial_3_bloques']]
-    df_3_semanas.rename(columns={'demanda_potencial_3_bloques': 'demanda_potencial_proximas_3_semanas'}, inplace=True)
-    
-    # SIEMPRE calcular 4 semanas
-    df_4_semanas = calcular_demanda_potencial_bloques(ventas_totales, n_semanas=4)
-    df_4_semanas = df_4_semanas[['idartalfa', 'demanda_potencial_4_bloques']]
-    df_4_semanas.rename(columns={'demanda_potencial_4_bloques': 'demanda_potencial_proximas_4_semanas'}, inplace=True)
-    
-    # SIEMPRE calcular 30 días
-    df_30_dias = calcular_demanda_potencial_bloques(ventas_totales, n_semanas=4.3)
-    df_30_dias = df_30_dias[['idartalfa', 'demanda_potencial_4.3_bloques']]
-    df_30_dias.rename(columns={'demanda_potencial_4.3_bloques': 'demanda_potencial_30_dias'}, inplace=True)
-    
-    # Merge todos
-    df_resultado = df_1_semana.merge(df_2_semanas, on='idartalfa', how='left')
-    df_resultado = df_resultado.merge(df_3_semanas, on='idartalfa', how='left')
-    df_resultado = df_resultado.merge(df_4_semanas, on='idartalfa', how='left')
-    df_resultado = df_resultado.merge(df_30_dias, on='idartalfa', how='left')
-    
-    # Calcular distribución por región (usar 4 semanas como referencia)
-    df_distribucion = calcular_demanda_por_region(ventas_por_region, df_resultado, n_semanas=4)
-    df_resultado = df_resultado.merge(df_distribucion, on='idartalfa', how='left')
-    
-    return df_resultado
+    """
+    Genera SIEMPRE las columnas de demanda para 1, 2, 3, 4 semanas y 30 días
+
+    Una sola pasada del motor (utils.pronostico_demanda): matriz artículo ×
+    bloque, demanda base y tendencia vectorizadas, todos los horizontes y el
+    reparto por región (sobre 4 semanas) juntos.
+    """
+    return pronosticar_demanda(ventas_totales, ventas_por_region)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FUNCIONES DE CÁLCULO DE PRESUPUESTO
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Regiones con columnas propias en las ventas por bloque: {region: sufijo}
+REGIONES_BLOQUES = {'chaco': 'chaco', 'corrientes': 'corr'}
+
+# Columnas del presupuesto que usa la pestaña (la porción se pide solo con estas)
+COLUMNAS_INFO_PRODUCTOS = [
+    'idarticuloalfa', 'idarticulo', 'idproveedor', 'proveedor', 'familia', 'subfamilia',
+    'descripcion', 'costo_unit', 'uxb',
+    'stk_corrientes', 'stk_express', 'stk_hiper', 'stk_TIROL', 'stk_central'
+]
+
 def agregar_info_productos(df_demanda, df_presupuesto):
     """Agrega información de productos desde presupuesto"""
-    columnas_necesarias = [
-        'idarticuloalfa', 'idarticulo', 'idproveedor', 'proveedor', 'familia', 'subfamilia',
-        'descripcion', 'costo_unit', 'uxb',
-        'stk_corrientes', 'stk_express', 'stk_hiper', 'stk_TIROL', 'stk_central'
-    ]
-    
-    columnas_existentes = [col for col in columnas_necesarias if col in df_presupuesto.columns]
+    columnas_existentes = [col for col in COLUMNAS_INFO_PRODUCTOS if col in df_presupuesto.columns]
     
     df_info = df_presupuesto[columnas_existentes].copy()
     df_info = df_info.drop_duplicates(subset=['idarticuloalfa'], keep='first')
@@ -381,50 +325,52 @@ def agregar_info_productos(df_demanda, df_presupuesto):
     return df_final
 
 
-def generar_columnas_ventas_bloques(df_con_bloques, df_final, cantidad_bloques=4):
-    """Genera columnas de ventas por bloques"""
+def generar_columnas_ventas_bloques(df_con_bloques, df_final, cantidad_bloques=4, regiones=None):
+    """
+    Genera columnas de ventas por bloques
+
+    Un pivot artículo × (bloque, región) → cantidad unido UNA vez a df_final
+    (antes: un .loc por artículo y por bloque).
+
+    Args:
+        cantidad_bloques: bloques más recientes a mostrar
+        regiones: {region: sufijo de columna} (default REGIONES_BLOQUES)
+    """
     if df_con_bloques.empty:
         return df_final, []
     
+    if regiones is None:
+        regiones = REGIONES_BLOQUES
+    
     df_con_bloques['idartalfa'] = df_con_bloques['idartalfa'].astype(int)
     df_final['idartalfa'] = df_final['idartalfa'].astype(int)
     
     bloques_unicos = sorted(df_con_bloques['bloque_7dias'].unique())[:cantidad_bloques]
     bloques_ordenados = list(reversed(bloques_unicos))
+    df_bloques = df_con_bloques[df_con_bloques['bloque_7dias'].isin(bloques_unicos)]
     
-    nombres_bloques = []
-    for bloque in bloques_ordenados:
-        df_bloque = df_con_bloques[df_con_bloques['bloque_7dias'] == bloque]
-        fecha_min = df_bloque['fecha'].min()
-        fecha_max = df_bloque['fecha'].max()
-        nombre = f"sem_{fecha_min.strftime('%d%b')}_{fecha_max.strftime('%d%b')}".lower()
-        nombres_bloques.append(nombre)
-    
-    for nombre in nombres_bloques:
-        df_final[nombre] = 0
-        df_final[f"{nombre}_chaco"] = 0
-        df_final[f"{nombre}_corr"] = 0
-    
-    for idx, bloque in enumerate(bloques_ordenados):
-        nombre = nombres_bloques[idx]
-        df_bloque = df_con_bloques[df_con_bloques['bloque_7dias'] == bloque].copy()
-        
-        # Totales
-        ventas_total = df_bloque.groupby('idartalfa')['cantidad'].sum().to_dict()
-        for idartalfa, cantidad in ventas_total.items():
-            df_final.loc[df_final['idartalfa'] == idartalfa, nombre] = int(cantidad)
-        
-        # Chaco
-        df_chaco = df_bloque[df_bloque['region'] == 'chaco']
-        ventas_chaco = df_chaco.groupby('idartalfa')['cantidad'].sum().to_dict()
-        for idartalfa, cantidad in ventas_chaco.items():
-            df_final.loc[df_final['idartalfa'] == idartalfa, f"{nombre}_chaco"] = int(cantidad)
-        
-        # Corrientes
-        df_corr = df_bloque[df_bloque['region'] == 'corrientes']
-        ventas_corr = df_corr.groupby('idartalfa')['cantidad'].sum().to_dict()
-        for idartalfa, cantidad in ventas_corr.items():
-            df_final.loc[df_final['idartalfa'] == idartalfa, f"{nombre}_corr"] = int(cantidad)
+    # Nombre de cada bloque según su rango de fechas
+    rangos = df_bloques.groupby('bloque_7dias')['fecha'].agg(['min', 'max'])
+    nombres_bloques = [
+        f"sem_{rangos.at[bloque, 'min'].strftime('%d%b')}_{rangos.at[bloque, 'max'].strftime('%d%b')}".lower()
+        for bloque in bloques_ordenados
+    ]
+    
+    # Pivot: total del bloque (todas las sucursales) y una columna por región
+    totales = df_bloques.groupby(['idartalfa', 'bloque_7dias'])['cantidad'].sum().unstack()
+    por_region = df_bloques[df_bloques['region'].isin(list(regiones))].pivot_table(
+        index='idartalfa', columns=['bloque_7dias', 'region'], values='cantidad', aggfunc='sum'
+    )
+    
+    pivote = pd.DataFrame(index=totales.index)
+    for bloque, nombre in zip(bloques_ordenados, nombres_bloques):
+        pivote[nombre] = totales[bloque]
+        for region, sufijo in regiones.items():
+            pivote[f"{nombre}_{sufijo}"] = por_region.get((bloque, region), 0)
+    
+    # Mismo valor que int(cantidad) por artículo; 0 si no vendió en el bloque
+    valores = pivote.reindex(df_final['idartalfa']).fillna(0)
+    df_final[list(pivote.columns)] = np.trunc(valores.to_numpy()).astype('int64')
     
     # ═══════════════════════════════════════════════════════════════════════
     # GENERAR COLUMNA TOTAL (suma de todas las semanas)
@@ -773,9 +719,10 @@ def render_tab_prediccion_presupuesto(df_proveedores, config):
         st.info(f"📊 Proveedor virtual: {len(ids_articulos)} artículos agrupados")
         print(f"DEBUG: Tipo ID = {tipo_id}, Primeros 3 IDs: {ids_articulos[:3]}")
     else:
-        ids_articulos = df_proveedores[
+        # Conjunto ordenado: el cache de las cargas no depende del orden de las filas
+        ids_articulos = list(normalizar_ids(df_proveedores[
             df_proveedores['idproveedor'] == id_proveedor_seleccionado
-        ]['idarticulo'].unique().tolist()
+        ]['idarticulo'].dropna().unique()))
         tipo_id = 'idarticulo'
         
         if len(ids_articulos) == 0:
@@ -793,12 +740,15 @@ def render_tab_prediccion_presupuesto(df_proveedores, config):
         
         with st.spinner("Procesando datos..."):
             
+            version_datos = obtener_version_datos(config['credentials_path'], config['project_id'])
+            
             # Cargar datos de presupuesto
             df_presupuesto = cargar_datos_presupuesto_bq(
                 config['credentials_path'],
                 config['project_id'],
                 ids_articulos,
-                tipo_id
+                tipo_id,
+                version_datos=version_datos
             )
             
             if df_presupuesto.empty:
@@ -814,7 +764,8 @@ def render_tab_prediccion_presupuesto(df_proveedores, config):
                 config['bigquery_table'],
                 ids_articulos,
                 fecha_desde,
-                tipo_id
+                tipo_id,
+                version_datos=version_datos
             )
             
             if df_tickets.empty:
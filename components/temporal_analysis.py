@@ -8,6 +8,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import io
+from utils.data_processing import contar_lineas, margen_medio
 
 
 # ============================================
@@ -41,14 +42,16 @@ def prepare_monthly_data(df):
     Returns:
         DataFrame: Datos mensuales agregados
     """
-    mensual = df.groupby('mes_año').agg({
+    mensual = df.groupby('mes_año', observed=True).agg({
         'precio_total': 'sum',
         'utilidad': 'sum',
-        'cantidad_total': 'sum',
-        'margen_porcentual': 'mean'
-    }).round(2)
+        'cantidad_total': 'sum'
+    })
+    # Promedio por línea de ticket (también con tickets agregados)
+    mensual['margen_porcentual'] = margen_medio(df, 'mes_año')
+    mensual = mensual.round(2)
     
-    mensual['tickets'] = df.groupby('mes_año').size()
+    mensual['tickets'] = contar_lineas(df, 'mes_año')
     mensual = mensual.reset_index()
     
     return mensual
@@ -68,11 +71,12 @@ def prepare_weekly_data(df):
     df['dia_semana_es'] = df['dia_semana'].map(DIA_MAPPING)
     
     # Agregar por día
-    semanal = df.groupby('dia_semana_es').agg({
+    semanal = df.groupby('dia_semana_es', observed=True).agg({
         'precio_total': 'sum',
-        'utilidad': 'sum',
-        'margen_porcentual': 'mean'
-    }).round(2)
+        'utilidad': 'sum'
+    })
+    semanal['margen_porcentual'] = margen_medio(df, 'dia_semana_es')
+    semanal = semanal.round(2)
     
     # Ordenar días correctamente
     semanal = semanal.reindex([dia for dia in ORDEN_DIAS if dia in semanal.index])
@@ -1,6 +1,9 @@
 import pandas as pd
 
 def limpiar_datos(df):
+    # Import acá: utils/__init__ importa bigquery_queries, que importa este módulo
+    from utils.esquemas import normalizar_texto, completar_nulos
+
     columnas_clave = ['cantidad_total', 'precio_total', 'costo_total', 'utilidad']
     
     # Eliminar filas con NaNs en columnas clave
@@ -13,10 +16,14 @@ def limpiar_datos(df):
     # Filtrar valores negativos o 0 donde no corresponden
     df = df[(df['cantidad_total'] > 0) & (df['precio_total'] >= 0) & (df['costo_total'] >= 0)]
     
-    # Limpieza de strings
-    df['sucursal'] = df['sucursal'].astype(str).str.strip().str.upper()
-    df['familia'] = df['familia'].astype(str).str.strip().str.upper()
-    df['subfamilia'] = df['subfamilia'].astype(str).str.strip().str.upper()
-    df['descripcion'] = df['descripcion'].fillna("SIN DESCRIPCIÓN")
+    # Limpieza de strings (sobre las categorías si ya vienen como category)
+    df['sucursal'] = normalizar_texto(df['sucursal'])
+    df['familia'] = normalizar_texto(df['familia'])
+    df['subfamilia'] = normalizar_texto(df['subfamilia'])
+    df['descripcion'] = completar_nulos(df['descripcion'], "SIN DESCRIPCIÓN")
+    
+    # Categorías de filas descartadas por los filtros de arriba
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].cat.remove_unused_categories()
     
     return df
\ No newline at end of file
@@ -2,6 +2,7 @@
 Módulo de utilidades para la aplicación
 """
 from .config import setup_credentials, PROVEEDOR_UNIFICADO, NOMBRES_UNIFICADOS
+from .bigquery_connection import get_bigquery_client
 from .bigquery_queries import query_bigquery_tickets, query_resultados_idarticulo
 from .data_processing import (
     load_proveedores_from_sheet, 
@@ -14,6 +15,7 @@ __all__ = [
     'setup_credentials',
     'PROVEEDOR_UNIFICADO',
     'NOMBRES_UNIFICADOS',
+    'get_bigquery_client',
     'query_bigquery_tickets',
     'query_resultados_idarticulo',
     'load_proveedores_from_sheet',
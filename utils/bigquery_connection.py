@@ -0,0 +1,128 @@
+"""
+Conexión compartida a BigQuery.
+Un único cliente por juego de credenciales, creado a demanda y reutilizado
+por todas las consultas del proceso (mismo pool HTTP con keep-alive).
+El cliente de la BigQuery Storage Read API (descarga de resultados en
+record batches de Arrow) es opcional: si google-cloud-bigquery-storage no
+está instalado se usa la paginación REST de siempre.
+Credenciales tomadas de:
+  - Local:  archivo JSON en credentials_path
+  - Cloud:  st.secrets["gcp_service_account"]
+"""
+import os
+import threading
+
+import streamlit as st
+from google.cloud import bigquery
+from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+# Tamaño del pool de conexiones HTTP por cliente (consultas concurrentes)
+POOL_CONEXIONES = 16
+
+_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+_clientes = {}
+_clientes_storage = {}
+_lock = threading.Lock()
+
+
+def _clave_credenciales(credentials_path):
+    """Identifica el juego de credenciales sin leerlas (archivo local o secrets)."""
+    if credentials_path and os.path.exists(credentials_path):
+        return f"file:{os.path.abspath(credentials_path)}"
+    return "secrets:gcp_service_account"
+
+
+def _cargar_credenciales(credentials_path):
+    if credentials_path and os.path.exists(credentials_path):
+        return service_account.Credentials.from_service_account_file(
+            credentials_path, scopes=_SCOPES
+        )
+    return service_account.Credentials.from_service_account_info(
+        dict(st.secrets["gcp_service_account"]), scopes=_SCOPES
+    )
+
+
+def _crear_sesion(credentials):
+    """Sesión HTTP autorizada con pool de conexiones persistentes."""
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=POOL_CONEXIONES, pool_maxsize=POOL_CONEXIONES)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_bigquery_client(credentials_path=None, project_id=None):
+    """
+    Obtener el cliente BigQuery compartido para estas credenciales.
+
+    El cliente se crea una sola vez por (credenciales, proyecto) y se reutiliza
+    entre reruns, sesiones y threads; google-cloud-bigquery es thread-safe.
+
+    Args:
+        credentials_path: Ruta al JSON de la cuenta de servicio (local)
+        project_id: Proyecto de facturación; si es None se usa el de las credenciales
+
+    Returns:
+        bigquery.Client
+    """
+    clave_credenciales = _clave_credenciales(credentials_path)
+    clave = (clave_credenciales, project_id)
+
+    client = _clientes.get(clave)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clientes.get(clave)
+        if client is None:
+            credentials = _cargar_credenciales(credentials_path)
+            client = bigquery.Client(
+                project=project_id or credentials.project_id,
+                credentials=credentials,
+                _http=_crear_sesion(credentials),
+            )
+            _clientes[clave] = client
+            print(f"🔌 Cliente BigQuery creado ({clave_credenciales}, proyecto={client.project})")
+    return client
+
+
+def get_bqstorage_client(credentials_path=None, project_id=None):
+    """
+    Cliente compartido de la BigQuery Storage Read API para estas credenciales.
+
+    Returns:
+        bigquery_storage.BigQueryReadClient o None si el paquete no está instalado
+    """
+    try:
+        from google.cloud import bigquery_storage
+    except ImportError:
+        return None
+
+    clave = (_clave_credenciales(credentials_path), project_id)
+    client = _clientes_storage.get(clave)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clientes_storage.get(clave)
+        if client is None:
+            client = bigquery_storage.BigQueryReadClient(
+                credentials=_cargar_credenciales(credentials_path)
+            )
+            _clientes_storage[clave] = client
+            print(f"🔌 Cliente BigQuery Storage creado ({clave[0]})")
+    return client
+
+
+def reset_bigquery_clients():
+    """Cerrar y descartar los clientes compartidos (p. ej. tras rotar credenciales)."""
+    with _lock:
+        for client in _clientes.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clientes.clear()
+        _clientes_storage.clear()
@@ -7,11 +7,19 @@ import numpy as np
 import os
 from google.cloud import bigquery
 from limpiar_datos import limpiar_datos
+from utils.query_engine import get_query_engine, normalizar_ids, hash_ids, arrow_a_pandas
+from utils.tickets_mirror import mirror_cubre, leer_tickets
+from utils.cache_rangos import obtener_cache_rangos
+from utils.version_datos import fecha_de_version, obtener_version_datos
+from utils.esquemas import aplicar_esquema, ESQUEMA_TICKETS
+from utils.presupuesto import obtener_presupuesto, PresupuestoIndexado
+from utils.config import PROVEEDOR_UNIFICADO
 # from time import time
 import time
-@st.cache_data(ttl=3600)
+# Sin TTL: la entrada vive hasta que cambia version_datos (carga nocturna)
+@st.cache_data(max_entries=64)
 def query_bigquery_tickets(credentials_path, project_id, bigquery_table, 
-                           ids, fecha_inicio, fecha_fin):
+                           ids, fecha_inicio, fecha_fin, version_datos=None):
     """
     Consultar tickets de BigQuery para un proveedor específico
     
@@ -19,9 +27,11 @@ def query_bigquery_tickets(credentials_path, project_id, bigquery_table,
         credentials_path: Ruta al archivo de credenciales
         project_id: ID del proyecto de GCP
         bigquery_table: Tabla de BigQuery
-        ids: Lista de IDs de artículos
+        ids: IDs de artículos (usar normalizar_ids para que el mismo conjunto
+            en otro orden reutilice el cache)
         fecha_inicio: Fecha de inicio del período
         fecha_fin: Fecha fin del período
+        version_datos: Token de utils.version_datos (solo para la clave de cache)
     
     Returns:
         DataFrame con los datos de tickets o None si no hay datos
@@ -30,19 +40,35 @@ def query_bigquery_tickets(credentials_path, project_id, bigquery_table,
         if len(ids) == 0:
             return None
         
-        id_str = ','.join(ids)
-        client = bigquery.Client.from_service_account_json(credentials_path)
+        ids = normalizar_ids(ids)
         
-        query = f"""
-        SELECT fecha_comprobante, idarticulo, descripcion, cantidad_total,
-               costo_total, precio_total, sucursal, familia, subfamilia
-        FROM `{project_id}.{bigquery_table}`
-        WHERE idarticulo IN ({id_str})
-        AND DATE(fecha_comprobante) BETWEEN '{fecha_inicio}' AND '{fecha_fin}'
-        ORDER BY fecha_comprobante DESC
-        """
+        columnas = ['fecha_comprobante', 'idarticulo', 'descripcion', 'cantidad_total',
+                    'costo_total', 'precio_total', 'sucursal', 'familia', 'subfamilia']
         
-        df = client.query(query).to_dataframe()
+        if mirror_cubre(fecha_inicio, fecha_fin):
+            # Espejo local en Parquet: sin ida y vuelta al warehouse
+            df = leer_tickets(fecha_inicio, fecha_fin, columnas=columnas, ids=ids)
+            df = df.sort_values('fecha_comprobante', ascending=False).reset_index(drop=True)
+        else:
+            engine = get_query_engine(credentials_path)
+            
+            def _fetch_rango(desde, hasta):
+                # IDs como parámetro de array: el SQL no crece con la cantidad de artículos
+                query = f"""
+                SELECT {', '.join(columnas)}
+                FROM `{project_id}.{bigquery_table}`
+                WHERE idarticulo IN UNNEST(@ids)
+                AND DATE(fecha_comprobante) BETWEEN @desde AND @hasta
+                """
+                return arrow_a_pandas(engine.query_arrow(query, {'ids': ids, 'desde': desde, 'hasta': hasta}))
+            
+            # Cache por día: al ampliar el período solo se consultan los días nuevos
+            clave = ('tickets', engine.nombre, project_id, bigquery_table, hash_ids(ids))
+            df = obtener_cache_rangos().obtener(
+                clave, fecha_inicio, fecha_fin, _fetch_rango, columna_fecha='fecha_comprobante',
+                hasta_cacheable=fecha_de_version(version_datos)
+            )
+            df = df.sort_values('fecha_comprobante', ascending=False).reset_index(drop=True)
         
         if len(df) == 0:
             return None
@@ -60,6 +86,10 @@ def query_bigquery_tickets(credentials_path, project_id, bigquery_table,
         df['mes_año'] = df['fecha_comprobante'].dt.to_period('M').astype(str)
         df['dia_semana'] = df['fecha_comprobante'].dt.day_name()
         
+        # Tipos compactos (category / int32) antes de limpiar: la normalización
+        # de textos se hace sobre las categorías
+        df = aplicar_esquema(df, ESQUEMA_TICKETS)
+        
         # Limpieza final
         df = limpiar_datos(df)
         return df
@@ -68,116 +98,150 @@ def query_bigquery_tickets(credentials_path, project_id, bigquery_table,
         st.error(f"Error consultando BigQuery: {e}")
         return None
 
-@st.cache_data(ttl=3600)
-def get_tickets_para_analisis_stock(credentials_path, project_id, bigquery_table, fecha_desde, fecha_hasta):
-    """
-    Obtiene tickets COMPLETOS con fecha_comprobante para análisis de stock
-    Solo se usa para tab4 (análisis de artículos rentables)
-    
-    Args:
-        credentials_path: Ruta a credenciales JSON
-        project_id: ID del proyecto
-        bigquery_table: Nombre de la tabla
-        fecha_desde: Fecha inicio (str o date)
-        fecha_hasta: Fecha fin (str o date)
-    
-    Returns:
-        DataFrame con tickets completos
+# Agregado (fecha × artículo × sucursal): mismas exclusiones que limpiar_datos,
+# aplicadas ANTES de agrupar para que los totales coincidan con el modo por línea
+COLUMNAS_GRUPO_TICKETS = ['idarticulo', 'descripcion', 'sucursal', 'familia', 'subfamilia']
+
+SQL_TICKETS_AGREGADOS = """
+SELECT
+    DATE(fecha_comprobante) AS fecha,
+    {grupo},
+    SUM(cantidad_total) AS cantidad_total,
+    SUM(costo_total) AS costo_total,
+    SUM(precio_total) AS precio_total,
+    SUM(precio_total - costo_total) AS utilidad,
+    SUM(CASE WHEN precio_total > 0
+             THEN (precio_total - costo_total) / precio_total * 100
+             ELSE 0 END) / COUNT(*) AS margen_porcentual,
+    COUNT(*) AS num_lineas,
+    FORMAT_DATE('%Y-%m', DATE(fecha_comprobante)) AS mes_anio,
+    FORMAT_DATE('%A', DATE(fecha_comprobante)) AS dia_semana
+FROM `{tabla}`
+WHERE idarticulo IN UNNEST(@ids)
+  AND DATE(fecha_comprobante) BETWEEN @desde AND @hasta
+  AND cantidad_total > 0 AND precio_total >= 0 AND costo_total >= 0
+GROUP BY fecha, {grupo}, mes_anio, dia_semana
+"""
+
+
+def _agregar_lineas(df):
+    """Mismo agregado que SQL_TICKETS_AGREGADOS, sobre líneas ya leídas (espejo local)."""
+    df = df[(df['cantidad_total'] > 0) & (df['precio_total'] >= 0) & (df['costo_total'] >= 0)].copy()
+    fecha = pd.to_datetime(df['fecha_comprobante'])
+    df['fecha'] = fecha.dt.date
+    df['utilidad'] = df['precio_total'] - df['costo_total']
+    df['margen_porcentual'] = np.where(df['precio_total'] > 0, df['utilidad'] / df['precio_total'] * 100, 0)
+    df['mes_anio'] = fecha.dt.strftime('%Y-%m')
+    df['dia_semana'] = fecha.dt.day_name()
+
+    agregado = df.groupby(['fecha'] + COLUMNAS_GRUPO_TICKETS + ['mes_anio', 'dia_semana'],
+                          observed=True, dropna=False, sort=False).agg(
+        cantidad_total=('cantidad_total', 'sum'),
+        costo_total=('costo_total', 'sum'),
+        precio_total=('precio_total', 'sum'),
+        utilidad=('utilidad', 'sum'),
+        margen_porcentual=('margen_porcentual', 'mean'),
+        num_lineas=('cantidad_total', 'size'),
+    )
+    return agregado.reset_index()
+
+
+@st.cache_data(max_entries=64)
+def query_bigquery_tickets_agregados(credentials_path, project_id, bigquery_table,
+                                     ids, fecha_inicio, fecha_fin, version_datos=None):
     """
-    import os
-    
-    print(f"\n{'='*80}")
-    print(f"📊 CARGANDO TICKETS COMPLETOS PARA ANÁLISIS DE STOCK")
-    print(f"{'='*80}")
-    print(f"   • Desde: {fecha_desde}")
-    print(f"   • Hasta: {fecha_hasta}")
+    Tickets del proveedor agregados por (fecha, idarticulo, sucursal) en el servidor
     
-    inicio = time.time()
+    Alternativa a query_bigquery_tickets (TICKETS_MODO='agregado'): las pestañas
+    agregan por día, mes, día de semana, sucursal, familia o artículo, así que no
+    necesitan cada línea. utilidad, margen_porcentual, mes_año y dia_semana se
+    calculan en SQL y viaja una fila por día × artículo × sucursal.
     
-    # Detectar ambiente
-    is_cloud = not os.path.exists(credentials_path) if credentials_path else True
+    Columnas extra:
+        num_lineas: líneas de ticket que resume la fila (para conteos de tickets)
+        margen_porcentual: PROMEDIO por línea del grupo (ponderar por num_lineas
+            para promedios como los del modo por línea, ver utils.data_processing.margen_medio)
     
-    if is_cloud:
-        from google.oauth2 import service_account
-        credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"]
-        )
-        client = bigquery.Client(credentials=credentials, project=project_id)
-    else:
-        client = bigquery.Client.from_service_account_json(credentials_path, project=project_id)
+    Args: los mismos que query_bigquery_tickets
     
-    query = f"""
-    SELECT 
-        fecha_comprobante,
-        idarticulo,
-        idartalfa,
-        descripcion,
-        cantidad_total,
-        precio_total,
-        costo_total,
-        familia,
-        subfamilia
-    FROM `{project_id}.{bigquery_table}`
-    WHERE DATE(fecha_comprobante) BETWEEN '{fecha_desde}' AND '{fecha_hasta}'
-    ORDER BY fecha_comprobante
+    Returns:
+        DataFrame agregado o None si no hay datos
     """
-    
-    df = client.query(query).to_dataframe()
-    
-    tiempo = time.time() - inicio
-    
-    print(f"   ✅ Tickets cargados: {len(df):,} registros")
-    print(f"   ⏱️  Tiempo: {tiempo:.2f}s")
-    print(f"{'='*80}\n")
-    
-    return df
+    try:
+        if len(ids) == 0:
+            return None
+        
+        ids = normalizar_ids(ids)
+        
+        if mirror_cubre(fecha_inicio, fecha_fin):
+            columnas = ['fecha_comprobante', 'cantidad_total', 'costo_total', 'precio_total'] + COLUMNAS_GRUPO_TICKETS
+            df = _agregar_lineas(leer_tickets(fecha_inicio, fecha_fin, columnas=columnas, ids=ids))
+        else:
+            engine = get_query_engine(credentials_path)
+            query = SQL_TICKETS_AGREGADOS.format(
+                grupo=', '.join(COLUMNAS_GRUPO_TICKETS), tabla=f"{project_id}.{bigquery_table}"
+            )
+            
+            def _fetch_rango(desde, hasta):
+                return arrow_a_pandas(engine.query_arrow(query, {'ids': ids, 'desde': desde, 'hasta': hasta}))
+            
+            clave = ('tickets_agregados', engine.nombre, project_id, bigquery_table, hash_ids(ids))
+            df = obtener_cache_rangos().obtener(
+                clave, fecha_inicio, fecha_fin, _fetch_rango, columna_fecha='fecha',
+                hasta_cacheable=fecha_de_version(version_datos)
+            )
+        
+        if len(df) == 0:
+            return None
+        
+        df = df.rename(columns={'mes_anio': 'mes_año'})
+        df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+        df = df.sort_values('fecha', ascending=False).reset_index(drop=True)
+        
+        df = aplicar_esquema(df, ESQUEMA_TICKETS)
+        df = limpiar_datos(df)
+        return df
+        
+    except Exception as e:
+        st.error(f"Error consultando BigQuery: {e}")
+        return None
 
 def query_resultados_idarticulo(credentials_path, project_id, 
                                 dataset='presupuesto', 
                                 table='result_final_alert_all',
                                 idproveedor=None,
-                                proveedor_unificado=None):
+                                proveedor_unificado=None,
+                                version_datos=None):
     """
     Consultar resultados de análisis por ID de proveedor
     
+    La tabla se descarga una vez por versión de datos (utils.presupuesto) y
+    cada proveedor es una porción en memoria: no hay consulta por proveedor.
+    
     Args:
         credentials_path: Ruta al archivo de credenciales
         project_id: ID del proyecto de GCP
         dataset: Dataset de BigQuery
         table: Tabla de BigQuery
-        idproveedor: ID del proveedor (puede ser unificado)
+        idproveedor: ID del proveedor (puede ser unificado o SALTA REFRESCOS)
         proveedor_unificado: Diccionario de mapeo de IDs unificados
+        version_datos: Token de utils.version_datos (None = se consulta)
     
     Returns:
         DataFrame con los resultados o DataFrame vacío
     """
     try:
-        client = bigquery.Client.from_service_account_json(credentials_path)
-        
-        # Manejar IDs unificados
-        if idproveedor and proveedor_unificado:
-            # Verificar si es un ID unificado
-            if idproveedor in [12000001, 12000002, 12000003, 12000004, 12000005]:
-                # Buscar los IDs originales
-                ids_originales = [k for k, v in proveedor_unificado.items() if v == idproveedor]
-                id_condition = f"idproveedor IN ({','.join(map(str, ids_originales))})"
-            else:
-                id_condition = f"idproveedor = {idproveedor}"
-            
-            query = f"""
-                SELECT *
-                FROM `{project_id}.{dataset}.{table}`
-                WHERE idarticulo IS NOT NULL
-                AND {id_condition}
-            """
-        else:
-            query = f"""
-                SELECT *
-                FROM `{project_id}.{dataset}.{table}`
-                WHERE idarticulo IS NOT NULL
-            """
+        if version_datos is None:
+            version_datos = obtener_version_datos(credentials_path, project_id)
+        presupuesto = obtener_presupuesto(credentials_path, project_id, version_datos,
+                                          dataset=dataset, table=table)
         
-        df = client.query(query).to_dataframe()
+        if idproveedor:
+            if proveedor_unificado and proveedor_unificado != PROVEEDOR_UNIFICADO:
+                presupuesto = PresupuestoIndexado(presupuesto.df, proveedor_unificado)
+            df = presupuesto.proveedor(idproveedor)
+        else:
+            df = presupuesto.completo()
         
         if df.empty and idproveedor:
             st.warning(f"⚠️ No se encontraron datos para el proveedor con ID: {idproveedor}")
@@ -186,4 +250,4 @@ def query_resultados_idarticulo(credentials_path, project_id,
         
     except Exception as e:
         st.error(f"❌ Error al consultar BigQuery: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
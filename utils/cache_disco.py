@@ -0,0 +1,335 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    CACHE DE RESULTADOS EN DISCO (compartido entre reinicios y workers)
+
+    st.cache_data vive en la memoria del proceso: cada deploy, caída o worker
+    nuevo arranca en frío. Este cache guarda los DataFrames en Parquet:
+
+        data/cache_disco/
+            _indice.json              clave → {nombre, bytes, creado, usado}
+            <clave>.parquet
+
+    clave = sha256(código normalizado de la función + parámetros + versión de datos)
+
+    - Sin versión de datos no se guarda nada (no habría forma de invalidarlo).
+    - Al superar CACHE_DISCO_MAX_MB se borran los resultados menos usados (LRU).
+    - Escrituras atómicas (.tmp + os.replace): un worker nunca lee un archivo
+      a medio escribir.
+    - Una sola consulta por clave entre workers: el primero que no encuentra
+      el resultado crea .<clave>.lock y consulta; los demás esperan su archivo
+      (st.cache_data ya coordina los hilos de un mismo proceso).
+    - El índice se lee-modifica-escribe bajo _indice.lock (O_EXCL), así dos
+      workers no se pisan las entradas.
+
+    Uso (debajo de @st.cache_data, que sigue siendo el primer nivel):
+
+        @st.cache_data(max_entries=4)
+        @cache_en_disco('get_familias_data')
+        def get_familias_data(credentials_path, project_id, bigquery_table, version_datos=None):
+            ...
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.config import get_cache_disco_dir, get_cache_disco_max_mb
+from utils.version_datos import SIN_VERSION
+
+ARCHIVO_INDICE = '_indice.json'
+
+# Parámetros que no cambian el resultado (solo cómo se accede al warehouse)
+PARAMETROS_EXCLUIDOS = ('credentials_path', 'version_datos')
+
+# Espera máxima al resultado de otro worker; un .lock más viejo se considera abandonado
+ESPERA_MAX_SEG = 600
+INTERVALO_ESPERA_SEG = 0.5
+
+# Lock del índice: se tiene milisegundos; más de esto es un worker caído
+LOCK_INDICE_ABANDONADO_SEG = 30
+INTERVALO_LOCK_SEG = 0.05
+
+
+def normalizar_codigo(texto):
+    """Colapsa espacios para que el formato no cambie la clave."""
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def clave_cache(nombre, codigo, parametros, version_datos):
+    """sha256 de nombre + código/SQL normalizado + parámetros + versión de datos."""
+    contenido = json.dumps(
+        {
+            'nombre': nombre,
+            'codigo': normalizar_codigo(codigo),
+            'parametros': parametros,
+            'version': version_datos,
+        },
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _quitar_lock(ruta_lock):
+    try:
+        os.remove(ruta_lock)
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def lock_archivo(ruta_lock, abandonado_seg=LOCK_INDICE_ABANDONADO_SEG, intervalo_seg=INTERVALO_LOCK_SEG):
+    """
+    Lock exclusivo entre procesos: crea `ruta_lock` con O_EXCL y lo borra al
+    salir. Un lock más viejo que `abandonado_seg` (worker caído) se toma igual.
+    """
+    while True:
+        try:
+            os.close(os.open(ruta_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                abandonado = time.time() - os.path.getmtime(ruta_lock) > abandonado_seg
+            except OSError:
+                continue   # se liberó entre medio
+            if abandonado:
+                _quitar_lock(ruta_lock)
+                continue
+            time.sleep(intervalo_seg)
+    try:
+        yield
+    finally:
+        _quitar_lock(ruta_lock)
+
+
+class CacheDisco:
+    """DataFrames en Parquet con índice JSON y tope LRU en bytes."""
+
+    def __init__(self, directorio, max_bytes):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.parquet")
+
+    @contextlib.contextmanager
+    def _indice_exclusivo(self):
+        """Índice leído bajo lock (hilos y workers); se guarda al salir del bloque."""
+        with self._lock, lock_archivo(os.path.join(self.directorio, '_indice.lock')):
+            indice = self._leer_indice()
+            yield indice
+            self._guardar_indice(indice)
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # ÍNDICE
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def _leer_indice(self):
+        """
+        Índice reconciliado con los archivos presentes: otro worker pudo
+        agregar o borrar resultados desde la última lectura.
+        """
+        ruta = os.path.join(self.directorio, ARCHIVO_INDICE)
+        indice = {}
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    indice = json.load(f)
+            except (OSError, ValueError):
+                indice = {}
+
+        presentes = {
+            nombre[:-len('.parquet')] for nombre in os.listdir(self.directorio)
+            if nombre.endswith('.parquet') and not nombre.startswith('.')
+        }
+        indice = {clave: datos for clave, datos in indice.items() if clave in presentes}
+        for clave in presentes - set(indice):
+            stat = os.stat(self._ruta(clave))
+            indice[clave] = {'nombre': '?', 'bytes': stat.st_size,
+                             'creado': stat.st_mtime, 'usado': stat.st_mtime}
+        return indice
+
+    def _guardar_indice(self, indice):
+        ruta = os.path.join(self.directorio, ARCHIVO_INDICE)
+        tmp = os.path.join(self.directorio, f".{ARCHIVO_INDICE}.{os.getpid()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, indent=2)
+        os.replace(tmp, ruta)
+
+    def _depurar(self, indice):
+        """Borra los resultados menos usados hasta quedar bajo max_bytes."""
+        total = sum(datos['bytes'] for datos in indice.values())
+        for clave, datos in sorted(indice.items(), key=lambda item: item[1]['usado']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._ruta(clave))
+            except OSError:
+                pass
+            total -= datos['bytes']
+            del indice[clave]
+            print(f"   🗑️  Cache disco: descartado {datos['nombre']} ({datos['bytes'] / 1e6:.1f} MB)")
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # LECTURA / ESCRITURA
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def leer(self, clave):
+        """DataFrame guardado o None si no está."""
+        ruta = self._ruta(clave)
+        try:
+            df = pq.read_table(ruta).to_pandas()
+        except (OSError, pa.ArrowException):
+            return None
+
+        with self._indice_exclusivo() as indice:
+            if clave in indice:
+                indice[clave]['usado'] = time.time()
+        return df
+
+    def guardar(self, clave, df, nombre=''):
+        """Guarda el DataFrame; si no se puede serializar se avisa y se sigue sin cache."""
+        ruta = self._ruta(clave)
+        tmp = os.path.join(self.directorio, f".{clave}.{os.getpid()}.tmp")
+        try:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(tabla, tmp, compression='zstd')
+            os.replace(tmp, ruta)
+        except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+            print(f"   ⚠️  Cache disco: no se pudo guardar {nombre}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+        with self._indice_exclusivo() as indice:
+            ahora = time.time()
+            indice[clave] = {'nombre': nombre, 'bytes': os.path.getsize(ruta),
+                             'creado': ahora, 'usado': ahora}
+            self._depurar(indice)
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # UNA SOLA CONSULTA POR CLAVE ENTRE WORKERS
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def calcular_una_vez(self, clave, calcular, nombre=''):
+        """
+        Resultado de `clave` calculándolo a lo sumo una vez entre workers.
+
+        Quien crea el archivo .lock ejecuta calcular() y guarda; el resto
+        espera a que aparezca el Parquet. Si el lock queda abandonado (más de
+        ESPERA_MAX_SEG) se toma de nuevo; si se agota la espera se calcula igual.
+        """
+        ruta_lock = os.path.join(self.directorio, f".{clave}.lock")
+        limite = time.time() + ESPERA_MAX_SEG
+        esperando_desde = None
+
+        while True:
+            try:
+                os.close(os.open(ruta_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                try:
+                    abandonado = time.time() - os.path.getmtime(ruta_lock) > ESPERA_MAX_SEG
+                except OSError:
+                    continue   # el otro worker terminó entre medio
+                if abandonado:
+                    _quitar_lock(ruta_lock)
+                    continue
+                if time.time() > limite:
+                    print(f"   ⚠️  Cache disco: se agotó la espera de {nombre}, consultando igual")
+                    return calcular()
+                if esperando_desde is None:
+                    esperando_desde = time.time()
+                    print(f"   ⏳ Cache disco: {nombre} lo está consultando otro worker, esperando...")
+                time.sleep(INTERVALO_ESPERA_SEG)
+                df = self.leer(clave)
+                if df is not None:
+                    print(f"   🛬 Cache disco: {nombre} recibido de otro worker "
+                          f"({time.time() - esperando_desde:.2f}s)")
+                    return df
+                continue
+
+            try:
+                # Pudo haberse guardado entre la primera lectura y el lock
+                df = self.leer(clave)
+                if df is not None:
+                    return df
+                df = calcular()
+                if isinstance(df, pd.DataFrame) and not df.empty:
+                    self.guardar(clave, df, nombre)
+                return df
+            finally:
+                _quitar_lock(ruta_lock)
+
+    def limpiar(self):
+        with self._indice_exclusivo() as indice:
+            for clave in list(indice):
+                try:
+                    os.remove(self._ruta(clave))
+                except OSError:
+                    pass
+                del indice[clave]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def obtener_cache_disco():
+    """Instancia del proceso para la carpeta configurada."""
+    directorio = get_cache_disco_dir()
+    with _caches_lock:
+        if directorio not in _caches:
+            _caches[directorio] = CacheDisco(directorio, get_cache_disco_max_mb() * 1024 * 1024)
+        return _caches[directorio]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DECORADOR
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def cache_en_disco(nombre):
+    """
+    Segundo nivel de cache para funciones que devuelven DataFrames.
+
+    La función debe aceptar `version_datos`; sin versión se ejecuta directo.
+    Se guardan solo resultados no vacíos (los errores devuelven None/vacío).
+    """
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+        codigo = inspect.getsource(funcion)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            version_datos = argumentos.arguments.get('version_datos')
+            if not version_datos or version_datos == SIN_VERSION:
+                return funcion(*args, **kwargs)
+
+            parametros = {
+                k: v for k, v in argumentos.arguments.items() if k not in PARAMETROS_EXCLUIDOS
+            }
+            clave = clave_cache(nombre, codigo, parametros, version_datos)
+            cache = obtener_cache_disco()
+
+            inicio = time.time()
+            df = cache.leer(clave)
+            if df is not None:
+                print(f"   💾 Cache disco: {nombre} ({len(df):,} filas) en {time.time() - inicio:.2f}s")
+                return df
+
+            return cache.calcular_una_vez(clave, lambda: funcion(*args, **kwargs), nombre)
+
+        return envoltura
+    return decorador
@@ -0,0 +1,144 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    CACHE INCREMENTAL POR RANGOS DE FECHAS
+
+    Guarda los resultados por DÍA. Ante un nuevo rango [desde, hasta] calcula
+    qué días faltan, trae SOLO esos sub-rangos contiguos y une el resultado.
+
+        Últimos 30 días  → trae 30 días
+        Últimos 60 días  → trae solo los 30 días anteriores que faltaban
+
+    Uso:
+        cache = obtener_cache_rangos()
+        df = cache.obtener(clave, desde, hasta, fetch_rango, columna_fecha='fecha')
+
+    fetch_rango(desde, hasta) debe devolver un DataFrame con `columna_fecha`
+    (datetime.date o datetime) para poder repartir las filas por día.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from utils.parquet_store import a_fecha
+from utils.vuelo_unico import obtener_vuelo_unico
+
+# Tope de filas en memoria (todas las claves); se descartan las claves menos usadas
+MAX_FILAS_CACHE = 5_000_000
+
+# Sin versión de datos conocida: días recientes que NO se guardan
+# (pueden estar incompletos hasta la carga nocturna)
+DIAS_FRESCOS = 2
+
+
+def _sub_rangos(dias):
+    """Agrupa una lista ordenada de días en rangos contiguos [(desde, hasta), ...]."""
+    rangos = []
+    for dia in dias:
+        if rangos and dia == rangos[-1][1] + timedelta(days=1):
+            rangos[-1][1] = dia
+        else:
+            rangos.append([dia, dia])
+    return [(d, h) for d, h in rangos]
+
+
+class CacheRangos:
+    """Segmentos diarios por clave de consulta, con tope LRU de filas."""
+
+    def __init__(self, max_filas=MAX_FILAS_CACHE, dias_frescos=DIAS_FRESCOS):
+        self.max_filas = max_filas
+        self.dias_frescos = dias_frescos
+        self._claves = OrderedDict()   # clave → {'dias': {fecha: DataFrame}, 'filas': int}
+        self._filas = 0
+        self._lock = threading.Lock()
+
+    def _dias_guardados(self, clave):
+        with self._lock:
+            entrada = self._claves.get(clave)
+            if entrada is None:
+                return {}
+            self._claves.move_to_end(clave)
+            return dict(entrada['dias'])
+
+    def _guardar(self, clave, segmentos):
+        with self._lock:
+            entrada = self._claves.setdefault(clave, {'dias': {}, 'filas': 0})
+            for dia, df in segmentos.items():
+                if dia not in entrada['dias']:
+                    entrada['dias'][dia] = df
+                    entrada['filas'] += len(df)
+                    self._filas += len(df)
+            self._claves.move_to_end(clave)
+
+            while self._filas > self.max_filas and len(self._claves) > 1:
+                _, descartada = self._claves.popitem(last=False)
+                self._filas -= descartada['filas']
+
+    def obtener(self, clave, fecha_desde, fecha_hasta, fetch_rango, columna_fecha='fecha',
+                hasta_cacheable=None):
+        """
+        Devuelve las filas de [fecha_desde, fecha_hasta] para `clave`, trayendo
+        con fetch_rango solo los días que no estaban en cache.
+
+        hasta_cacheable: último día completo en el warehouse (fecha de la versión
+        de datos); los días posteriores se consultan pero no se guardan.
+        """
+        desde, hasta = a_fecha(fecha_desde), a_fecha(fecha_hasta)
+        dias_pedidos = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+        guardados = self._dias_guardados(clave)
+        faltantes = [d for d in dias_pedidos if d not in guardados]
+        rangos = _sub_rangos(faltantes)
+
+        print(f"   🧩 Cache por rangos: {len(dias_pedidos) - len(faltantes)}/{len(dias_pedidos)} días en cache, "
+              f"{len(rangos)} sub-rango(s) a consultar")
+
+        limite_cacheable = a_fecha(hasta_cacheable) or date.today() - timedelta(days=self.dias_frescos)
+        partes, vacio = [], None
+
+        for rango_desde, rango_hasta in rangos:
+            inicio = time.time()
+            # Otra sesión pidiendo el mismo sub-rango en este momento: se espera su resultado
+            df = obtener_vuelo_unico().ejecutar(
+                ('cache_rangos', clave, rango_desde, rango_hasta), fetch_rango, rango_desde, rango_hasta
+            )
+            vacio = df.iloc[0:0]
+            print(f"      └─ {rango_desde} → {rango_hasta}: {len(df):,} filas ({time.time() - inicio:.2f}s)")
+
+            dias_df = pd.to_datetime(df[columna_fecha]).dt.date
+            por_dia = {dia: grupo for dia, grupo in df.groupby(dias_df.values, sort=False)}
+            partes.extend(por_dia.values())
+
+            # Los días sin filas también se guardan (vacíos) para no volver a pedirlos
+            segmentos = {}
+            dia = rango_desde
+            while dia <= rango_hasta:
+                if dia <= limite_cacheable:
+                    segmentos[dia] = por_dia.get(dia, vacio)
+                dia += timedelta(days=1)
+            self._guardar(clave, segmentos)
+
+        for dia in dias_pedidos:
+            if dia in guardados:
+                vacio = guardados[dia].iloc[0:0]
+                if len(guardados[dia]):
+                    partes.append(guardados[dia])
+
+        if not partes:
+            return vacio if vacio is not None else pd.DataFrame()
+        return pd.concat(partes, ignore_index=True)
+
+    def limpiar(self):
+        with self._lock:
+            self._claves.clear()
+            self._filas = 0
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_cache_rangos():
+    """Instancia compartida por todas las sesiones del proceso."""
+    return CacheRangos()
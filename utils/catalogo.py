@@ -0,0 +1,152 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    ÍNDICE DEL CATÁLOGO DE PROVEEDORES (una vez por versión del catálogo)
+
+    El catálogo (snapshot local de la Google Sheet, ya unificado) se recorría con máscaras
+    booleanas completas en cada rerun:
+        df_proveedores[df_proveedores['proveedor'] == proveedor]   (dashboard, sidebar)
+        df_proveedores.merge(df_familias, ...)                      (dashboard global)
+
+    IndiceCatalogo arma los mapas una sola vez y responde con búsquedas O(1):
+        proveedor (nombre o ID unificado) → np.ndarray de idarticulo
+        idarticulo → idproveedor (después de la unificación)
+        idarticulo → (familia, subfamilia)   por versión de datos
+        catálogo + familias (merge)          por versión de datos
+
+    El DataFrame del catálogo es compartido entre sesiones: no modificarlo en
+    el lugar (hacer .copy() antes, como ranking_proveedores_analisis).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import hashlib
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.catalogo_local import version_catalogo_local, leer_snapshot
+
+# Versiones de datos con familias en memoria (la actual y la anterior)
+MAX_VERSIONES_FAMILIAS = 2
+
+_SIN_ARTICULOS = np.array([], dtype=np.int64)
+
+
+def version_catalogo(df):
+    """Hash del contenido del catálogo (cambia si cambia cualquier fila)."""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()[:16]
+
+
+class IndiceCatalogo:
+    """Mapas proveedor ↔ artículo ↔ familia sobre el catálogo de proveedores."""
+
+    def __init__(self, df, version=None):
+        inicio = time.time()
+        self.df = df
+        self.version = version or version_catalogo(df)
+
+        validos = df.dropna(subset=['idarticulo'])
+        ids = validos['idarticulo'].astype('int64').to_numpy()
+
+        self.proveedores = sorted(df['proveedor'].dropna().unique())
+        self._articulos_por_nombre = {
+            nombre: np.unique(ids[posiciones])
+            for nombre, posiciones in validos.groupby('proveedor', sort=False).indices.items()
+        }
+        self._articulos_por_id = {
+            int(idproveedor): np.unique(ids[posiciones])
+            for idproveedor, posiciones in validos.groupby('idproveedor', sort=False).indices.items()
+        }
+
+        # Primer ID por nombre (mismo criterio que el sidebar: .iloc[0])
+        primeros = df.dropna(subset=['proveedor']).drop_duplicates('proveedor')
+        self._id_por_nombre = dict(zip(primeros['proveedor'], primeros['idproveedor'].astype(int)))
+        self._nombre_por_id = {v: k for k, v in reversed(list(self._id_por_nombre.items()))}
+
+        unicos = validos.drop_duplicates('idarticulo')
+        self._proveedor_por_articulo = dict(zip(
+            unicos['idarticulo'].astype('int64'), unicos['idproveedor'].astype(int)
+        ))
+
+        self._familias = {}        # versión de familias → {idarticulo: (familia, subfamilia)}
+        self._con_familias = {}    # versión de familias → catálogo + familia/subfamilia
+        self._lock = threading.Lock()
+
+        print(f"   📇 Índice de catálogo: {len(self.proveedores):,} proveedores, "
+              f"{len(self._proveedor_por_articulo):,} artículos ({time.time() - inicio:.2f}s)")
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # PROVEEDOR → ARTÍCULOS
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def articulos(self, proveedor):
+        """idarticulo (ordenados, sin repetir) del proveedor por nombre."""
+        return self._articulos_por_nombre.get(proveedor, _SIN_ARTICULOS)
+
+    def articulos_de_id(self, idproveedor):
+        """idarticulo (ordenados, sin repetir) del proveedor por ID (unificado)."""
+        return self._articulos_por_id.get(int(idproveedor), _SIN_ARTICULOS)
+
+    def id_proveedor(self, proveedor):
+        """ID (unificado) del proveedor o None."""
+        return self._id_por_nombre.get(proveedor)
+
+    def nombre_proveedor(self, idproveedor):
+        return self._nombre_por_id.get(int(idproveedor))
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # ARTÍCULO → PROVEEDOR / FAMILIA
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def proveedor_de_articulo(self, idarticulo):
+        """idproveedor (después de la unificación) o None."""
+        return self._proveedor_por_articulo.get(int(idarticulo))
+
+    def _guardar_por_version(self, memo, version_datos, valor):
+        memo[version_datos] = valor
+        while len(memo) > MAX_VERSIONES_FAMILIAS:
+            del memo[next(iter(memo))]
+
+    def con_familias(self, df_familias, version_datos):
+        """
+        Catálogo con familia/subfamilia (merge left por idarticulo), una vez por
+        versión de las familias (la de version_familias() del dashboard: el
+        watermark del maestro, no la versión de datos).
+        Devuelve el DataFrame compartido: filtrar, no modificar.
+        """
+        with self._lock:
+            if version_datos in self._con_familias:
+                return self._con_familias[version_datos]
+
+            familias = df_familias[['idarticulo', 'familia', 'subfamilia']]
+            df = self.df.merge(familias, on='idarticulo', how='left')
+            unicos = familias.dropna(subset=['idarticulo']).drop_duplicates('idarticulo')
+            mapa = dict(zip(
+                unicos['idarticulo'].astype('int64'),
+                zip(unicos['familia'], unicos['subfamilia']),
+            ))
+            self._guardar_por_version(self._con_familias, version_datos, df)
+            self._guardar_por_version(self._familias, version_datos, mapa)
+            return df
+
+    def familia_de_articulo(self, idarticulo, version_datos):
+        """(familia, subfamilia) o (None, None); requiere con_familias() de esa versión."""
+        return self._familias.get(version_datos, {}).get(int(idarticulo), (None, None))
+
+
+def obtener_catalogo(sheet_id, sheet_name):
+    """
+    Índice del catálogo de proveedores, compartido por todas las sesiones.
+
+    Lee el snapshot local (utils.catalogo_local): por rerun solo se lee el
+    estado JSON; el Parquet se carga y se indexa una vez por versión.
+    """
+    version = version_catalogo_local(sheet_id, sheet_name)
+    return _indice_de_version(version)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _indice_de_version(version):
+    return IndiceCatalogo(leer_snapshot(version), version=version)
@@ -0,0 +1,260 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    SNAPSHOT LOCAL DEL CATÁLOGO DE PROVEEDORES (Google Sheet → Parquet)
+
+    Antes la app descargaba la hoja completa como CSV cada hora y volvía a
+    parsearla y unificarla; si Google tardaba o fallaba, el arranque quedaba
+    bloqueado. Ahora:
+
+        data/catalogo/
+            _catalogo.json                 versión, hashes, ETag, último chequeo
+            crudo.parquet                  la hoja tal cual (para re-unificar sin red)
+            catalogo-<version>.parquet     catálogo YA unificado
+
+    - La unificación (PROVEEDOR_UNIFICADO, NOMBRES_UNIFICADOS) se calcula
+      una sola vez al escribir el snapshot.
+    - version = hash(contenido de la hoja + mapas de unificación): si cambia
+      el código de unificación se re-unifica desde crudo.parquet, sin red.
+    - El chequeo contra Google es condicional (If-None-Match / If-Modified-Since
+      y, si la hoja no los respeta, comparación del hash del CSV) y corre en
+      un hilo de fondo cada INTERVALO_REFRESCO_SEG: la app lee el snapshot
+      local y no espera a la red. Solo el primer arranque descarga en línea.
+    - Un solo refresco a la vez entre workers (.refrescando.lock, O_EXCL);
+      el que llega después relee el estado y no vuelve a descargar.
+
+    Uso como job:
+        python -m utils.catalogo_local
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import requests
+
+from utils.cache_disco import lock_archivo, ESPERA_MAX_SEG
+from utils.config import get_catalogo_dir, PROVEEDOR_UNIFICADO, NOMBRES_UNIFICADOS
+from utils.data_processing import unificar_proveedores
+
+ARCHIVO_ESTADO_CATALOGO = '_catalogo.json'
+ARCHIVO_CRUDO = 'crudo.parquet'
+ARCHIVO_LOCK = '.refrescando.lock'
+
+# Cada cuánto se vuelve a chequear la hoja (segundos)
+INTERVALO_REFRESCO_SEG = 3600
+TIMEOUT_DESCARGA_SEG = 30
+
+_refresco_lock = threading.Lock()
+
+
+def _directorio(directorio=None):
+    return directorio or get_catalogo_dir()
+
+
+def url_hoja(sheet_id, sheet_name):
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}"
+
+
+def hash_unificacion():
+    """Hash de los mapas de unificación (si cambian en el código, se re-unifica)."""
+    contenido = json.dumps(
+        [sorted(PROVEEDOR_UNIFICADO.items()), sorted(NOMBRES_UNIFICADOS.items())]
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+def ruta_snapshot(version, directorio=None):
+    return os.path.join(_directorio(directorio), f"catalogo-{version}.parquet")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ESTADO Y ARCHIVOS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def leer_estado_catalogo(directorio=None):
+    """Estado del snapshot o None si todavía no hay uno válido."""
+    ruta = os.path.join(_directorio(directorio), ARCHIVO_ESTADO_CATALOGO)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(ruta_snapshot(estado.get('version'), directorio)):
+        return None
+    return estado
+
+
+def _guardar_estado_catalogo(directorio, estado):
+    ruta = os.path.join(directorio, ARCHIVO_ESTADO_CATALOGO)
+    tmp = os.path.join(directorio, f".{ARCHIVO_ESTADO_CATALOGO}.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+    os.replace(tmp, ruta)
+
+
+def _escribir_parquet(df, ruta):
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False, compression='zstd')
+    os.replace(tmp, ruta)
+
+
+def leer_snapshot(version, directorio=None):
+    """Catálogo unificado de `version`."""
+    return pd.read_parquet(ruta_snapshot(version, directorio))
+
+
+def preparar_catalogo(df_crudo):
+    """Hoja cruda → catálogo unificado."""
+    return unificar_proveedores(df_crudo, PROVEEDOR_UNIFICADO, NOMBRES_UNIFICADOS).reset_index(drop=True)
+
+
+def _publicar(directorio, df_crudo, hash_csv, estado_red):
+    """Unifica y escribe catalogo-<version>.parquet (se borran las versiones viejas)."""
+    unificacion = hash_unificacion()
+    version = hashlib.sha256(f"{hash_csv}:{unificacion}".encode('utf-8')).hexdigest()[:16]
+    df = preparar_catalogo(df_crudo)
+    _escribir_parquet(df, ruta_snapshot(version, directorio))
+
+    ahora = time.time()
+    _guardar_estado_catalogo(directorio, {
+        'version': version,
+        'hash_csv': hash_csv,
+        'hash_unificacion': unificacion,
+        'filas': len(df),
+        'etag': estado_red.get('etag'),
+        'last_modified': estado_red.get('last_modified'),
+        'publicado': ahora,
+        'verificado': ahora,
+    })
+    # Se conserva también la versión anterior: otra sesión puede estar leyéndola
+    anteriores = sorted(
+        (r for r in glob.glob(os.path.join(directorio, 'catalogo-*.parquet'))
+         if r != ruta_snapshot(version, directorio)),
+        key=os.path.getmtime,
+    )
+    for ruta in anteriores[:-1]:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    print(f"   ✅ Catálogo publicado: versión {version} ({len(df):,} filas)")
+    return version
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REFRESCO
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def refrescar_catalogo(sheet_id, sheet_name, directorio=None):
+    """
+    Chequear la hoja (pedido condicional) y publicar un snapshot nuevo si cambió.
+
+    Returns:
+        str: versión vigente del catálogo
+    """
+    directorio = _directorio(directorio)
+    os.makedirs(directorio, exist_ok=True)
+    inicio = time.time()
+    print(f"\n📇 Chequeando catálogo de proveedores (Google Sheet)...")
+
+    estado = leer_estado_catalogo(directorio)
+    encabezados = {}
+    if estado:
+        if estado.get('etag'):
+            encabezados['If-None-Match'] = estado['etag']
+        if estado.get('last_modified'):
+            encabezados['If-Modified-Since'] = estado['last_modified']
+
+    respuesta = requests.get(url_hoja(sheet_id, sheet_name), headers=encabezados, timeout=TIMEOUT_DESCARGA_SEG)
+    estado_red = {'etag': respuesta.headers.get('ETag'), 'last_modified': respuesta.headers.get('Last-Modified')}
+
+    if estado and respuesta.status_code == 304:
+        estado['verificado'] = time.time()
+        _guardar_estado_catalogo(directorio, estado)
+        print(f"   ✅ Sin cambios (304) en {time.time() - inicio:.2f}s")
+        return estado['version']
+
+    respuesta.raise_for_status()
+    hash_csv = hashlib.sha256(respuesta.content).hexdigest()[:16]
+
+    if estado and hash_csv == estado['hash_csv'] and estado['hash_unificacion'] == hash_unificacion():
+        estado.update(estado_red, verificado=time.time())
+        _guardar_estado_catalogo(directorio, estado)
+        print(f"   ✅ Sin cambios (mismo contenido) en {time.time() - inicio:.2f}s")
+        return estado['version']
+
+    df_crudo = pd.read_csv(io.BytesIO(respuesta.content))
+    _escribir_parquet(df_crudo, os.path.join(directorio, ARCHIVO_CRUDO))
+    version = _publicar(directorio, df_crudo, hash_csv, estado_red)
+    print(f"   ⏱️  Tiempo: {time.time() - inicio:.2f}s")
+    return version
+
+
+def _lock_entre_workers(directorio):
+    return lock_archivo(os.path.join(directorio, ARCHIVO_LOCK), abandonado_seg=ESPERA_MAX_SEG, intervalo_seg=0.5)
+
+
+def _refrescar_en_segundo_plano(sheet_id, sheet_name, directorio):
+    """Un solo refresco a la vez por proceso y entre workers; los errores no llegan a la app."""
+    if not _refresco_lock.acquire(blocking=False):
+        return
+
+    def tarea():
+        try:
+            with _lock_entre_workers(directorio):
+                # Otro worker pudo haberlo chequeado mientras se esperaba el lock
+                estado = leer_estado_catalogo(directorio)
+                if estado is None or time.time() - estado.get('verificado', 0) > INTERVALO_REFRESCO_SEG:
+                    refrescar_catalogo(sheet_id, sheet_name, directorio)
+        except Exception as e:
+            print(f"   ⚠️  No se pudo refrescar el catálogo (se sigue con el snapshot): {e}")
+        finally:
+            _refresco_lock.release()
+
+    threading.Thread(target=tarea, name='refresco-catalogo', daemon=True).start()
+
+
+def version_catalogo_local(sheet_id, sheet_name, directorio=None):
+    """
+    Versión vigente del snapshot, sin esperar a la red salvo en el primer arranque.
+
+    - Sin snapshot: descarga en línea (única vez).
+    - Mapas de unificación cambiados: re-unifica desde crudo.parquet.
+    - Chequeo vencido: refresco condicional en segundo plano.
+    """
+    directorio = _directorio(directorio)
+    estado = leer_estado_catalogo(directorio)
+
+    if estado is None:
+        os.makedirs(directorio, exist_ok=True)
+        with _refresco_lock, _lock_entre_workers(directorio):
+            estado = leer_estado_catalogo(directorio)
+            if estado is None:
+                return refrescar_catalogo(sheet_id, sheet_name, directorio)
+
+    if estado['hash_unificacion'] != hash_unificacion():
+        with _refresco_lock, _lock_entre_workers(directorio):
+            estado = leer_estado_catalogo(directorio)
+            if estado['hash_unificacion'] != hash_unificacion():
+                print(f"   🔁 Cambiaron los mapas de unificación: re-unificando el catálogo local")
+                df_crudo = pd.read_parquet(os.path.join(directorio, ARCHIVO_CRUDO))
+                return _publicar(directorio, df_crudo, estado['hash_csv'], estado)
+            return estado['version']
+
+    if time.time() - estado.get('verificado', 0) > INTERVALO_REFRESCO_SEG:
+        _refrescar_en_segundo_plano(sheet_id, sheet_name, directorio)
+    return estado['version']
+
+
+if __name__ == "__main__":
+    from utils.config import setup_credentials
+
+    config = setup_credentials()
+    refrescar_catalogo(config['sheet_id'], config['sheet_name'])
@@ -8,7 +8,69 @@ from dotenv import load_dotenv
 
 def detect_environment():
     """Detectar si estamos en cloud o local"""
-    return "gcp_service_account" in st.secrets if hasattr(st, 'secrets') else False
+    try:
+        return "gcp_service_account" in st.secrets if hasattr(st, 'secrets') else False
+    except Exception:
+        # Sin secrets.toml (jobs por línea de comandos)
+        return False
+
+def _leer_opcion(nombre, default=None):
+    """Leer una opción de st.secrets (cloud) o de variables de entorno / .env (local)"""
+    try:
+        if hasattr(st, 'secrets') and nombre.lower() in st.secrets:
+            return st.secrets[nombre.lower()]
+    except Exception:
+        pass
+    load_dotenv()
+    return os.getenv(nombre.upper(), default)
+
+def get_query_engine_name():
+    """Motor de consultas: 'bigquery' (default), 'motherduck' o 'duckdb' (archivo local)"""
+    return str(_leer_opcion("QUERY_ENGINE", "bigquery")).strip().lower()
+
+def get_duckdb_path():
+    """Archivo DuckDB local usado por el motor 'duckdb'"""
+    return _leer_opcion("DUCKDB_PATH", "data/cucher.duckdb")
+
+def get_tickets_mirror_dir():
+    """Carpeta del espejo local de tickets en Parquet (ver utils.tickets_mirror)"""
+    return _leer_opcion("TICKETS_MIRROR_DIR", "data/tickets_mirror")
+
+def get_rollup_dir():
+    """Carpeta del rollup diario de ventas en Parquet (ver utils.rollup_ventas)"""
+    return _leer_opcion("ROLLUP_DIR", "data/rollup_diario")
+
+def get_indice_prefijos_dir():
+    """Carpeta de las matrices .npy del índice de sumas prefijas (ver utils.indice_prefijos)"""
+    return _leer_opcion("INDICE_PREFIJOS_DIR", "data/indice_prefijos")
+
+def get_indice_prefijos_dias():
+    """Ventana móvil del índice de prefijos en días (hacia atrás desde el watermark del rollup)"""
+    return int(_leer_opcion("INDICE_PREFIJOS_DIAS", 400))
+
+def get_maestro_articulos_dir():
+    """Carpeta del maestro de artículos en Parquet (ver utils.maestro_articulos)"""
+    return _leer_opcion("MAESTRO_ARTICULOS_DIR", "data/maestro_articulos")
+
+def get_pivote_trimestral_dir():
+    """Carpeta de los pivotes anuales artículo × trimestre (ver utils.pivote_trimestral)"""
+    return _leer_opcion("PIVOTE_TRIMESTRAL_DIR", "data/pivote_trimestral")
+
+def get_catalogo_dir():
+    """Carpeta del snapshot local del catálogo de proveedores (ver utils.catalogo_local)"""
+    return _leer_opcion("CATALOGO_DIR", "data/catalogo")
+
+def get_modo_tickets():
+    """Tickets del proveedor: 'agregado' (fecha × artículo × sucursal, default) o 'lineas' (una fila por línea)"""
+    return str(_leer_opcion("TICKETS_MODO", "agregado")).strip().lower()
+
+def get_cache_disco_dir():
+    """Carpeta del cache de resultados en disco (ver utils.cache_disco)"""
+    return _leer_opcion("CACHE_DISCO_DIR", "data/cache_disco")
+
+def get_cache_disco_max_mb():
+    """Tope del cache en disco en MB; al superarlo se borran los resultados menos usados"""
+    return int(_leer_opcion("CACHE_DISCO_MAX_MB", 1024))
 
 def setup_credentials():
     """
@@ -44,6 +106,7 @@ def setup_credentials():
         'sheet_name': sheet_name,
         'project_id': project_id,
         'bigquery_table': bigquery_table,
+        'query_engine': get_query_engine_name(),
         'is_cloud': IS_CLOUD
     }
 
@@ -28,6 +28,7 @@ def setup_credentials():
         'sheet_name': None,
         'project_id': 'my_db',
         'bigquery_table': 'tickets_all',
+        'query_engine': 'motherduck',
         'is_cloud': IS_CLOUD
     }
 
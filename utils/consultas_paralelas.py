@@ -0,0 +1,75 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    CONSULTAS EN PARALELO (dashboard global)
+
+    Las consultas del dashboard (presupuesto, familias, ventas del período,
+    ventas agregadas del año, stock) no dependen unas de otras. En vez de
+    esperarlas una detrás de otra se lanzan juntas al inicio del render y
+    cada sección espera solo la suya:
+
+        planificador = obtener_planificador()
+        futuro = planificador.lanzar('presupuesto', get_presupuesto_data, cp, pid, version_datos=v)
+        ...
+        df_presupuesto = planificador.esperar(futuro)
+
+    La carga en frío pasa de la SUMA de los tiempos a aproximadamente el MÁXIMO.
+
+    - Los hilos reciben el ScriptRunContext de la sesión: st.cache_data,
+      st.error, etc. funcionan igual que en el hilo principal.
+    - Las excepciones de la función se relanzan en esperar().
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Consultas simultáneas por proceso (compartidas por todas las sesiones)
+MAX_CONSULTAS_PARALELAS = 8
+
+
+class PlanificadorConsultas:
+    """Pool de hilos para consultas independientes que devuelve futures."""
+
+    def __init__(self, max_consultas=MAX_CONSULTAS_PARALELAS):
+        self._executor = ThreadPoolExecutor(max_workers=max_consultas, thread_name_prefix='consulta')
+
+    def lanzar(self, nombre, funcion, *args, **kwargs):
+        """
+        Ejecuta funcion(*args, **kwargs) en el pool.
+
+        Returns:
+            concurrent.futures.Future con el resultado (nombre en futuro.nombre)
+        """
+        ctx = get_script_run_ctx()
+        lanzada = time.time()
+
+        def tarea():
+            add_script_run_ctx(threading.current_thread(), ctx)
+            inicio = time.time()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                print(f"   ⚡ {nombre}: {time.time() - inicio:.2f}s "
+                      f"(en cola {inicio - lanzada:.2f}s)")
+
+        futuro = self._executor.submit(tarea)
+        futuro.nombre = nombre
+        return futuro
+
+    def esperar(self, futuro):
+        """Resultado del futuro (bloquea solo si todavía no terminó)."""
+        if not futuro.done():
+            inicio = time.time()
+            resultado = futuro.result()
+            print(f"   ⏳ Esperando {futuro.nombre}: {time.time() - inicio:.2f}s")
+            return resultado
+        return futuro.result()
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_planificador():
+    """Instancia compartida por todas las sesiones del proceso."""
+    return PlanificadorConsultas()
@@ -0,0 +1,167 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    CUBO DE RANKING (un solo merge y un solo agrupamiento para todas las vistas)
+
+    process_ranking_data, process_ranking_data_flias_subflias y
+    process_ranking_detallado_alimentos repetían cada uno la misma cadena
+        catálogo ⋈ familias ⋈ ventas ⋈ presupuesto
+    y después agrupaban a su nivel, con lambdas de Python para contar
+    'exceso_STK > 0' y 'STK_TOTAL == 0'. Ahora:
+
+        articulos   una fila por artículo del catálogo, con el merge hecho una
+                    vez, los fillna y las marcas vectorizadas:
+                        con_ventas   el artículo está en df_ventas
+                        con_exceso   exceso_STK > 0
+                        sin_stock    STK_TOTAL == 0
+        celdas      UN groupby sobre los artículos al nivel más fino
+                    (proveedor, idproveedor, familia, subfamilia, con_ventas);
+                    los niveles más gruesos se obtienen sumando celdas
+                    (todas las métricas son aditivas):
+                        por_proveedor()                   → process_ranking_data
+                        por_subfamilia()                  → ..._flias_subflias
+                        por_proveedor(solo_con_ventas)    → totales del detallado
+
+    El cubo se arma una vez por combinación de DataFrames de entrada y queda
+    compartido (cache_resource): las vistas lo leen, no lo modifican.
+
+    Dashboard global: el cubo del período (sin filtros de familia) se arma
+    una vez, con las entradas como ConjuntoDatos (la clave de cache es su
+    linaje); cada cambio en los multiselect de familia/subfamilia es
+    CuboRanking.filtrar() (máscaras sobre las celdas) y las vistas re-suman
+    solo las celdas que quedan:
+        cubo = obtener_cubo_ranking(proveedores, ventas, presupuesto, familias)
+        ranking_de_cubo(cubo.filtrar(familias, subfamilias))
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import time
+
+import streamlit as st
+
+from utils.linaje import datos_de, HASH_LINAJE
+
+SIN_FAMILIA = 'SIN FAMILIA'
+SIN_SUBFAMILIA = 'SIN SUBFAMILIA'
+
+COLUMNAS_PRESUPUESTO = ['idarticulo', 'PRESUPUESTO', 'exceso_STK', 'costo_exceso_STK', 'STK_TOTAL']
+COLUMNAS_RELLENO = [
+    'venta_total', 'costo_total', 'cantidad_vendida',
+    'PRESUPUESTO', 'exceso_STK', 'costo_exceso_STK', 'STK_TOTAL',
+]
+
+CLAVES_PROVEEDOR = ['proveedor', 'idproveedor']
+CLAVES_SUBFAMILIA = CLAVES_PROVEEDOR + ['familia', 'subfamilia']
+CLAVES_CELDA = CLAVES_SUBFAMILIA + ['con_ventas']
+
+# Métricas de las celdas, en el orden de las columnas del ranking original
+METRICAS = [
+    'venta_total', 'costo_total', 'cantidad_vendida', 'articulos',
+    'PRESUPUESTO', 'con_exceso', 'costo_exceso_STK', 'sin_stock',
+]
+
+
+def _articulos(df_proveedores, df_ventas, df_presupuesto, df_familias):
+    """Catálogo ⋈ familias ⋈ ventas ⋈ presupuesto, una fila por artículo (left)."""
+    columnas_familias = ['idarticulo'] + [c for c in ('familia', 'subfamilia') if c in df_familias.columns]
+
+    df = df_proveedores[['idarticulo', 'proveedor', 'idproveedor']].merge(
+        df_familias[columnas_familias],
+        on='idarticulo',
+        how='left'
+    ).reindex(columns=['idarticulo', 'proveedor', 'idproveedor', 'familia', 'subfamilia'])
+
+    df = df.merge(
+        df_ventas,
+        on='idarticulo',
+        how='left',
+        indicator='_origen'
+    ).merge(
+        df_presupuesto[COLUMNAS_PRESUPUESTO],
+        on='idarticulo',
+        how='left'
+    )
+
+    df['con_ventas'] = (df.pop('_origen') == 'both').to_numpy()
+    df[COLUMNAS_RELLENO] = df[COLUMNAS_RELLENO].fillna(0)
+    df['con_exceso'] = (df['exceso_STK'] > 0).astype('int64')
+    df['sin_stock'] = (df['STK_TOTAL'] == 0).astype('int64')
+    return df
+
+
+class CuboRanking:
+    """Artículos del ranking + celdas agregadas al nivel más fino."""
+
+    def __init__(self, articulos, celdas):
+        self.articulos = articulos
+        self.celdas = celdas
+
+    @classmethod
+    def desde_datos(cls, df_proveedores, df_ventas, df_presupuesto, df_familias):
+        """Merge + UN groupby al nivel de celda."""
+        articulos = _articulos(df_proveedores, df_ventas, df_presupuesto, df_familias)
+
+        claves = articulos.assign(
+            familia=articulos['familia'].fillna(SIN_FAMILIA),
+            subfamilia=articulos['subfamilia'].fillna(SIN_SUBFAMILIA),
+        )
+        celdas = claves.groupby(CLAVES_CELDA).agg(
+            venta_total=('venta_total', 'sum'),
+            costo_total=('costo_total', 'sum'),
+            cantidad_vendida=('cantidad_vendida', 'sum'),
+            articulos=('idarticulo', 'count'),
+            PRESUPUESTO=('PRESUPUESTO', 'sum'),
+            con_exceso=('con_exceso', 'sum'),
+            costo_exceso_STK=('costo_exceso_STK', 'sum'),
+            sin_stock=('sin_stock', 'sum'),
+        ).reset_index()
+        return cls(articulos, celdas)
+
+    def filtrar(self, familias, subfamilias=None):
+        """
+        Cubo reducido a las familias (y subfamilias, si la lista no está vacía)
+        elegidas: máscaras booleanas sobre artículos y celdas, sin volver a
+        mergear ni agrupar artículos. Los artículos sin familia/subfamilia
+        quedan afuera, igual que con isin() sobre el catálogo.
+        """
+        en_articulos = self.articulos['familia'].isin(familias)
+        en_celdas = self.celdas['familia'].isin(familias) & (self.celdas['familia'] != SIN_FAMILIA)
+        if subfamilias:
+            en_articulos &= self.articulos['subfamilia'].isin(subfamilias)
+            en_celdas &= self.celdas['subfamilia'].isin(subfamilias) & (self.celdas['subfamilia'] != SIN_SUBFAMILIA)
+        return CuboRanking(
+            self.articulos[en_articulos].reset_index(drop=True),
+            self.celdas[en_celdas].reset_index(drop=True),
+        )
+
+    def _nivel(self, claves, solo_con_ventas=False):
+        celdas = self.celdas[self.celdas['con_ventas']] if solo_con_ventas else self.celdas
+        return celdas.groupby(claves)[METRICAS].sum().reset_index()
+
+    def por_proveedor(self, solo_con_ventas=False):
+        """Totales por proveedor (solo artículos con ventas si se pide)."""
+        return self._nivel(CLAVES_PROVEEDOR, solo_con_ventas)
+
+    def por_subfamilia(self):
+        """Totales por proveedor × familia × subfamilia (sin familia → 'SIN FAMILIA')."""
+        return self._nivel(CLAVES_SUBFAMILIA)
+
+    def articulos_con_ventas(self):
+        """Artículos que aparecen en df_ventas (el merge inner del detallado)."""
+        return self.articulos[self.articulos['con_ventas']].reset_index(drop=True)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False, hash_funcs=HASH_LINAJE)
+def obtener_cubo_ranking(df_proveedores, df_ventas, df_presupuesto, df_familias):
+    """
+    Cubo de ranking de estos datos (compartido: leer, no modificar).
+
+    Los argumentos pueden ser ConjuntoDatos (utils.linaje): la entrada de
+    cache se busca por su clave de linaje, sin hashear los DataFrames.
+    """
+    print(f"\n🧊 ARMANDO CUBO DE RANKING")
+    inicio = time.time()
+    cubo = CuboRanking.desde_datos(
+        datos_de(df_proveedores), datos_de(df_ventas), datos_de(df_presupuesto), datos_de(df_familias)
+    )
+    print(f"   ✅ {len(cubo.articulos):,} artículos → {len(cubo.celdas):,} celdas "
+          f"en {time.time() - inicio:.2f}s")
+    return cubo
@@ -22,7 +22,22 @@ def load_proveedores_from_sheet(sheet_id, sheet_name,
     """
     url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}"
     df = pd.read_csv(url)
-    df = df.dropna(subset=['idproveedor'])
+    return unificar_proveedores(df, proveedor_unificado, nombres_unificados)
+
+
+def unificar_proveedores(df, proveedor_unificado, nombres_unificados):
+    """
+    Limpieza y unificación de IDs/nombres de proveedores del catálogo crudo
+    
+    Args:
+        df: DataFrame leído de la hoja (CSV)
+        proveedor_unificado: Diccionario de mapeo de IDs
+        nombres_unificados: Diccionario de nombres unificados
+    
+    Returns:
+        DataFrame con idproveedor unificado e idproveedor_original
+    """
+    df = df.dropna(subset=['idproveedor']).copy()
     df['idproveedor'] = df['idproveedor'].astype(int)
     df['proveedor'] = df['proveedor'].astype(str).str.strip().str.upper()
     
@@ -34,12 +49,65 @@ def load_proveedores_from_sheet(sheet_id, sheet_name,
     return df
 
 
+def lineas_por_fila(df):
+    """
+    Líneas de ticket que representa cada fila: num_lineas si los tickets vienen
+    agregados (query_bigquery_tickets_agregados), 1 si vienen por línea
+    """
+    if 'num_lineas' in df.columns:
+        return df['num_lineas'].astype('int64')
+    return pd.Series(1, index=df.index, dtype='int64')
+
+
+def contar_lineas(df, por=None):
+    """
+    Cantidad de líneas de ticket (len(df) / groupby().size() del modo por línea)
+    
+    Args:
+        df: DataFrame de tickets (por línea o agregado)
+        por: Columna (o Serie) para agrupar; None = total
+    
+    Returns:
+        int o Series por grupo
+    """
+    lineas = lineas_por_fila(df)
+    if por is None:
+        return int(lineas.sum())
+    clave = df[por] if isinstance(por, str) else por
+    return lineas.groupby(clave, observed=True).sum()
+
+
+def margen_medio(df, por=None):
+    """
+    Promedio de margen_porcentual por línea de ticket (ponderado por num_lineas
+    si los datos vienen agregados: el resultado es el mismo que en el modo por línea)
+    
+    Args:
+        df: DataFrame de tickets (por línea o agregado)
+        por: Columna para agrupar; None = total
+    
+    Returns:
+        float o Series por grupo
+    """
+    if 'num_lineas' not in df.columns:
+        if por is None:
+            return df['margen_porcentual'].mean()
+        return df.groupby(por, observed=True)['margen_porcentual'].mean()
+    
+    lineas = lineas_por_fila(df)
+    ponderado = df['margen_porcentual'].astype('float64') * lineas
+    if por is None:
+        total = lineas.sum()
+        return ponderado.sum() / total if total > 0 else float('nan')
+    return ponderado.groupby(df[por], observed=True).sum() / lineas.groupby(df[por], observed=True).sum()
+
+
 def calculate_metrics(df):
     """
     Calcular métricas principales de ventas
     
     Args:
-        df: DataFrame con datos de tickets/ventas
+        df: DataFrame con datos de tickets/ventas (por línea o agregado)
     
     Returns:
         dict: Diccionario con métricas calculadas
@@ -56,14 +124,17 @@ def calculate_metrics(df):
     # Familias únicas
     num_familias = df['familia'].nunique() if 'familia' in df.columns else 0
     
+    # Líneas de ticket (en modo agregado cada fila resume num_lineas)
+    num_lineas = contar_lineas(df)
+    
     return {
         'total_ventas': df['precio_total'].sum(),
         'total_costos': df['costo_total'].sum(),
         'total_utilidad': df['utilidad'].sum(),
-        'margen_promedio': df['margen_porcentual'].mean(),
+        'margen_promedio': margen_medio(df),
         'total_cantidad': df['cantidad_total'].sum(),
-        'num_tickets': len(df),
-        'ticket_promedio': df['precio_total'].sum() / len(df) if len(df) > 0 else 0,
+        'num_tickets': num_lineas,
+        'ticket_promedio': df['precio_total'].sum() / num_lineas if num_lineas > 0 else 0,
         'productos_unicos': df['idarticulo'].nunique(),
         'dias_con_ventas': df['fecha'].nunique(),
         'sucursales': num_sucursales,
@@ -94,7 +165,7 @@ def generate_insights(df, metrics):
         insights.append(("warning", f"⚠️ Margen bajo: {metrics['margen_promedio']:.1f}% - Revisar estrategia de precios"))
     
     # Análisis de productos
-    top_producto = df.groupby('descripcion')['precio_total'].sum().nlargest(1)
+    top_producto = df.groupby('descripcion', observed=True)['precio_total'].sum().nlargest(1)
     if len(top_producto) > 0:
         producto_name = top_producto.index[0]
         producto_ventas = top_producto.iloc[0]
@@ -102,7 +173,7 @@ def generate_insights(df, metrics):
         insights.append(("info", f"🏆 Producto estrella: {producto_name[:50]}... ({participacion:.1f}% de ventas)"))
     
     # Análisis temporal
-    if len(df) > 7:
+    if contar_lineas(df) > 7:
         ventas_por_dia = df.groupby('fecha')['precio_total'].sum()
         tendencia_dias = 7
         if len(ventas_por_dia) >= tendencia_dias:
@@ -0,0 +1,108 @@
+"""
+Esquemas de tipos compactos para los DataFrames de la app.
+
+Se aplican UNA vez al ingresar los datos (después de la consulta):
+    - category para dimensiones de pocos valores distintos (sucursal, familia, ...)
+    - int32 para los IDs (todos < 2^31)
+    - float32 solo para ratios; los importes siguen en float64 porque los
+      totales en pesos superan la precisión de float32 (7 dígitos)
+
+Con columnas category los groupby deben usar observed=True (si no, pandas
+arma el producto de todas las categorías, también las que no aparecen).
+"""
+import numpy as np
+import pandas as pd
+
+# Tickets de un proveedor (st.session_state.analysis_data)
+ESQUEMA_TICKETS = {
+    'idarticulo': 'int32',
+    'idartalfa': 'int32',
+    'descripcion': 'category',
+    'sucursal': 'category',
+    'familia': 'category',
+    'subfamilia': 'category',
+    'mes_año': 'category',
+    'dia_semana': 'category',
+    'margen_porcentual': 'float32',
+    'num_lineas': 'int32',
+}
+
+# presupuesto.result_final_alert_all
+ESQUEMA_PRESUPUESTO = {
+    'idarticulo': 'int32',
+    'idarticuloalfa': 'int32',
+    'idproveedor': 'int32',
+}
+
+# Totales por artículo del período (get_ventas_data) y ventas agregadas del año
+ESQUEMA_VENTAS = {
+    'idarticulo': 'int32',
+    'idartalfa': 'int32',
+}
+
+# Stock actual por artículo
+ESQUEMA_STOCK = {
+    'idarticulo': 'int32',
+    'idartalfa': 'int32',
+}
+
+
+def _entero_compacto(serie, tipo):
+    """Baja a `tipo` solo si no hay nulos y todos los valores entran (si no, se deja igual)."""
+    if not pd.api.types.is_numeric_dtype(serie) or serie.isna().any():
+        return serie
+    limites = np.iinfo(tipo)
+    if len(serie) and (serie.min() < limites.min or serie.max() > limites.max):
+        return serie
+    return serie.astype(tipo)
+
+
+def aplicar_esquema(df, esquema):
+    """
+    Convierte las columnas presentes de `df` a los tipos de `esquema`.
+
+    Returns:
+        El mismo DataFrame (modificado en el lugar) para poder encadenar
+    """
+    if df is None:
+        return df
+    for columna, tipo in esquema.items():
+        if columna not in df.columns or df[columna].dtype == tipo:
+            continue
+        if tipo == 'category':
+            df[columna] = df[columna].astype('category')
+        elif tipo.startswith('int'):
+            df[columna] = _entero_compacto(df[columna], tipo)
+        else:
+            df[columna] = df[columna].astype(tipo)
+    return df
+
+
+def normalizar_texto(serie):
+    """
+    strip + upper como .astype(str).str.strip().str.upper(), pero sobre las
+    categorías si la columna es category (una vez por valor distinto, no por fila).
+    Los nulos quedan como 'NONE', igual que astype(str) sobre los None que
+    devuelve la consulta.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.astype(str).str.strip().str.upper()
+
+    # El código -1 (nulo) apunta al último nivel: 'NONE'
+    niveles = pd.Index(list(serie.cat.categories.astype(str).str.strip().str.upper()) + ['NONE'])
+    codigos_niveles, unicos = pd.factorize(niveles, sort=True)
+    codigos = codigos_niveles[serie.cat.codes.to_numpy()]
+    return pd.Series(
+        pd.Categorical.from_codes(codigos, categories=unicos),
+        index=serie.index, name=serie.name,
+    ).cat.remove_unused_categories()
+
+
+def completar_nulos(serie, valor):
+    """fillna que también funciona en columnas category (agrega la categoría si falta)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        if not serie.isna().any():
+            return serie
+        if valor not in serie.cat.categories:
+            serie = serie.cat.add_categories([valor])
+    return serie.fillna(valor)
@@ -0,0 +1,290 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    ÍNDICE DE SUMAS PREFIJAS (artículo × día) PARA TOTALES POR PERÍODO
+
+    Matriz densa [días + 1, artículos] por medida (cantidad, venta, costo) con
+    la suma acumulada a lo largo de los días:
+
+        total(desde, hasta) = P[hasta + 1] - P[desde]
+
+    Cada fila es un día contiguo en memoria: una consulta lee solo dos filas,
+    también cuando la matriz está abierta con memory-map.
+
+    → cualquier período del selector del dashboard es UNA resta vectorizada
+      sobre todos los artículos, sin volver a consultar el warehouse.
+
+    Lo arma y publica el job del rollup (python -m utils.rollup_ventas) sobre
+    una ventana móvil de días; la app solo abre la versión publicada con
+    memory-map (np.load(mmap_mode='r')) y, si no la hay o el período cae
+    fuera de la ventana, usa ventas_por_articulo() del rollup.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import json
+import os
+import shutil
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.config import get_indice_prefijos_dir, get_indice_prefijos_dias
+from utils.parquet_store import a_fecha
+from utils.rollup_ventas import estado_rollup, ventas_diarias
+
+MEDIDAS = {
+    'cantidad_vendida': 'cantidad_total',
+    'venta_total': 'precio_total',
+    'costo_total': 'costo_total',
+}
+
+# Tope de celdas (días × artículos) por matriz: 4 matrices × ~28 bytes/celda ≈ 560 MB
+MAX_CELDAS_INDICE = 20_000_000
+
+
+class IndicePrefijosVentas:
+    """
+    Sumas prefijas de ventas diarias por artículo.
+
+    Atributos:
+        articulos: np.ndarray con los idarticulo (filas de la matriz)
+        descripciones: np.ndarray de descripciones (MAX en todo el rango del índice)
+        fecha_inicio, fecha_fin: rango de días cubierto (inclusive)
+        prefijos: dict medida → matriz float64 [n_dias + 1, n_articulos]
+        lineas: matriz int32 [n_dias + 1, n_articulos] con el prefijo de líneas
+    """
+
+    def __init__(self, articulos, descripciones, fecha_inicio, fecha_fin, prefijos, lineas):
+        self.articulos = articulos
+        self.descripciones = descripciones
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.prefijos = prefijos
+        # Prefijo de líneas de ticket: un artículo "tiene ventas" en el período
+        # si aparece en alguna línea, aunque los importes sumen 0 (igual que el GROUP BY)
+        self.lineas = lineas
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # CONSTRUCCIÓN
+    # ───────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def desde_rollup(cls, fecha_inicio=None, fecha_fin=None, directorio=None,
+                     max_celdas=MAX_CELDAS_INDICE):
+        """
+        Arma el índice con los días [fecha_inicio, fecha_fin] del rollup diario.
+        Si días × artículos supera max_celdas, se recorta el inicio del rango
+        (se conservan los días más recientes).
+        """
+        inicio = time.time()
+        estado = estado_rollup(directorio)
+        if estado is None:
+            raise ValueError("El rollup diario todavía no fue generado")
+
+        fecha_inicio = max(a_fecha(fecha_inicio) or estado['fecha_min'], estado['fecha_min'])
+        fecha_fin = min(a_fecha(fecha_fin) or estado['fecha'], estado['fecha'])
+
+        df = ventas_diarias(
+            fecha_inicio, fecha_fin,
+            columnas=['fecha', 'idarticulo', 'descripcion', 'lineas'] + list(MEDIDAS.values()),
+            directorio=directorio,
+        )
+        df = df[df['idarticulo'].notna()]
+
+        n_articulos = df['idarticulo'].nunique()
+        max_dias = max(max_celdas // max(n_articulos, 1) - 1, 1)
+        if (fecha_fin - fecha_inicio).days + 1 > max_dias:
+            fecha_inicio = fecha_fin - timedelta(days=max_dias - 1)
+            df = df[pd.to_datetime(df['fecha']) >= pd.Timestamp(fecha_inicio)]
+            print(f"   ✂️  Índice de prefijos recortado a {max_dias:,} días "
+                  f"({n_articulos:,} artículos, tope {max_celdas:,} celdas)")
+
+        # Filas: días desde fecha_inicio (+1, la fila 0 es el cero); columnas: artículos
+        codigos, articulos = pd.factorize(df['idarticulo'], sort=True)
+        dias = (pd.to_datetime(df['fecha']) - pd.Timestamp(fecha_inicio)).dt.days.to_numpy()
+        n_articulos, n_dias = len(articulos), (fecha_fin - fecha_inicio).days + 1
+
+        prefijos = {}
+        for medida, columna in MEDIDAS.items():
+            matriz = np.zeros((n_dias + 1, n_articulos), dtype=np.float64)
+            # varias sucursales caen en la misma celda → acumular
+            np.add.at(matriz, (dias + 1, codigos), df[columna].to_numpy(dtype=np.float64, na_value=0.0))
+            np.cumsum(matriz, axis=0, out=matriz)
+            prefijos[medida] = matriz
+
+        lineas = np.zeros((n_dias + 1, n_articulos), dtype=np.int32)
+        np.add.at(lineas, (dias + 1, codigos), df['lineas'].to_numpy(dtype=np.int32))
+        np.cumsum(lineas, axis=0, out=lineas)
+
+        descripciones = (
+            df.groupby(codigos)['descripcion'].max()
+            .reindex(range(n_articulos)).to_numpy(dtype=object)
+        )
+
+        print(f"   🧾 Índice de prefijos: {n_articulos:,} artículos × {n_dias:,} días "
+              f"({fecha_inicio} → {fecha_fin}) en {time.time() - inicio:.2f}s")
+        return cls(np.asarray(articulos), descripciones, fecha_inicio, fecha_fin, prefijos, lineas)
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # PERSISTENCIA (.npy con memory-map)
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def guardar(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        np.save(os.path.join(directorio, 'articulos.npy'), self.articulos)
+        np.save(os.path.join(directorio, 'descripciones.npy'), self.descripciones, allow_pickle=True)
+        for medida, matriz in self.prefijos.items():
+            np.save(os.path.join(directorio, f'{medida}.npy'), matriz)
+        np.save(os.path.join(directorio, 'lineas.npy'), self.lineas)
+        with open(os.path.join(directorio, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'fecha_inicio': str(self.fecha_inicio), 'fecha_fin': str(self.fecha_fin)}, f)
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        """Abre un índice guardado; con mmap=True las matrices no se leen enteras a RAM."""
+        with open(os.path.join(directorio, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        modo = 'r' if mmap else None
+        prefijos = {
+            medida: np.load(os.path.join(directorio, f'{medida}.npy'), mmap_mode=modo)
+            for medida in MEDIDAS
+        }
+        return cls(
+            np.load(os.path.join(directorio, 'articulos.npy')),
+            np.load(os.path.join(directorio, 'descripciones.npy'), allow_pickle=True),
+            a_fecha(meta['fecha_inicio']),
+            a_fecha(meta['fecha_fin']),
+            prefijos,
+            np.load(os.path.join(directorio, 'lineas.npy'), mmap_mode=modo),
+        )
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # CONSULTAS
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def cubre(self, fecha_desde, fecha_hasta):
+        return self.fecha_inicio <= a_fecha(fecha_desde) and a_fecha(fecha_hasta) <= self.fecha_fin
+
+    def _columnas(self, fecha_desde, fecha_hasta):
+        desde = (a_fecha(fecha_desde) - self.fecha_inicio).days
+        hasta = (a_fecha(fecha_hasta) - self.fecha_inicio).days + 1
+        return desde, hasta
+
+    def totales_array(self, fecha_desde, fecha_hasta):
+        """dict medida → vector [n_articulos] con el total del período."""
+        desde, hasta = self._columnas(fecha_desde, fecha_hasta)
+        return {m: p[hasta] - p[desde] for m, p in self.prefijos.items()}
+
+    def totales(self, fecha_desde, fecha_hasta):
+        """
+        Totales del período por artículo, mismas columnas que get_ventas_data:
+            idarticulo, descripcion, venta_total, costo_total, cantidad_vendida
+        Solo incluye artículos con ventas en el período (como el GROUP BY).
+        """
+        desde, hasta = self._columnas(fecha_desde, fecha_hasta)
+        totales = {m: p[hasta] - p[desde] for m, p in self.prefijos.items()}
+        activos = (self.lineas[hasta] - self.lineas[desde]) > 0
+        df = pd.DataFrame({
+            'idarticulo': self.articulos,
+            'descripcion': self.descripciones,
+            'venta_total': totales['venta_total'],
+            'costo_total': totales['costo_total'],
+            'cantidad_vendida': totales['cantidad_vendida'],
+        })
+        return df[activos].reset_index(drop=True)
+
+    def comparar_periodos(self, fecha_desde, fecha_hasta):
+        """
+        Totales del período y del período inmediatamente anterior de igual
+        largo (si el índice lo cubre), con variación porcentual.
+        """
+        desde, hasta = a_fecha(fecha_desde), a_fecha(fecha_hasta)
+        largo = (hasta - desde).days + 1
+        previo_desde, previo_hasta = desde - timedelta(days=largo), desde - timedelta(days=1)
+
+        actual = self.totales_array(desde, hasta)
+        df = pd.DataFrame({'idarticulo': self.articulos, **actual})
+        if self.cubre(previo_desde, previo_hasta):
+            previo = self.totales_array(previo_desde, previo_hasta)
+            for medida, valores in previo.items():
+                df[f'{medida}_anterior'] = valores
+                df[f'var_{medida}_%'] = np.where(
+                    valores != 0, (actual[medida] - valores) / np.where(valores != 0, valores, 1) * 100, np.nan
+                )
+        return df
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ÍNDICE COMPARTIDO (uno por watermark del rollup)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def publicar_indice_prefijos(directorio_indice=None, dias=None, directorio=None):
+    """
+    Arma el índice de la versión actual del rollup sobre los últimos `dias`
+    días y lo publica en <directorio_indice>/<watermark>/ (lo llama el job
+    del rollup, nunca un request). Borra las versiones anteriores.
+
+    Returns:
+        str | None: carpeta publicada, o None si todavía no hay rollup
+    """
+    estado = estado_rollup(directorio)
+    if estado is None:
+        return None
+    directorio_indice = directorio_indice or get_indice_prefijos_dir()
+    dias = dias or get_indice_prefijos_dias()
+    os.makedirs(directorio_indice, exist_ok=True)
+
+    watermark = estado['fecha']
+    carpeta = os.path.join(directorio_indice, str(watermark))
+    if os.path.exists(os.path.join(carpeta, 'meta.json')):
+        print(f"   ✅ Índice de prefijos {watermark}: ya publicado")
+        return carpeta
+
+    indice = IndicePrefijosVentas.desde_rollup(
+        watermark - timedelta(days=dias - 1), watermark, directorio=directorio,
+    )
+    tmp = os.path.join(directorio_indice, f".{watermark}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    indice.guardar(tmp)
+    try:
+        os.replace(tmp, carpeta)
+    except OSError:
+        # Otra corrida del job publicó la misma versión primero: se usa la suya
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(os.path.join(carpeta, 'meta.json')):
+            raise
+        print(f"   🤝 Índice de prefijos {watermark}: ya lo publicó otra corrida")
+        return carpeta
+
+    # Versiones viejas ya no sirven (los workers que las tengan abiertas con
+    # memory-map siguen leyendo hasta que las sueltan)
+    for nombre in os.listdir(directorio_indice):
+        if nombre != str(watermark) and not nombre.startswith('.'):
+            shutil.rmtree(os.path.join(directorio_indice, nombre), ignore_errors=True)
+
+    print(f"   📤 Índice de prefijos publicado: {carpeta}")
+    return carpeta
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice_para_watermark(watermark, directorio_indice):
+    """
+    Índice publicado para la versión `watermark` del rollup, compartido por
+    todas las sesiones y abierto con memory-map (no se carga entero a RAM).
+    """
+    return IndicePrefijosVentas.cargar(os.path.join(directorio_indice, str(watermark)), mmap=True)
+
+
+def obtener_indice_prefijos():
+    """
+    Índice de prefijos al día con el rollup, o None si el job todavía no
+    publicó la versión del watermark actual (el request nunca lo arma).
+    """
+    estado = estado_rollup()
+    if estado is None:
+        return None
+    directorio_indice = get_indice_prefijos_dir()
+    if not os.path.exists(os.path.join(directorio_indice, str(estado['fecha']), 'meta.json')):
+        return None
+    return _indice_para_watermark(estado['fecha'], directorio_indice)
@@ -0,0 +1,92 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    CONJUNTOS DE DATOS CON LINAJE (claves de cache O(1))
+
+    Las funciones cacheadas que reciben DataFrames enteros
+    (process_ranking_data, process_resumen_proveedor_familia, el Excel del
+    ranking...) hacían que Streamlit hasheara cientos de miles de celdas en
+    cada llamada solo para decidir si había acierto. Un ConjuntoDatos lleva
+    el DataFrame y una CLAVE DE LINAJE que lo identifica:
+
+        origen      consulta + parámetros + versión de datos
+                        ConjuntoDatos.origen(df, 'ventas', tabla, desde, hasta,
+                                             version_datos=version_datos)
+        derivado    transformación + claves de las entradas + parámetros
+                        derivar(ventas, 'solo_familia', df, familia)
+                        combinar('ranking', df, proveedores, ventas, parametros=(...))
+
+    Con hash_funcs=HASH_LINAJE, st.cache_data / st.cache_resource hashean
+    solo el token de la clave. Las funciones aceptan indistintamente un
+    ConjuntoDatos o un DataFrame (datos_de()): con un DataFrame suelto el
+    cache se comporta como antes.
+
+    La clave tiene que describir TODO lo que determina el contenido: si un
+    DataFrame se arma con algo que no está en la clave, no envolverlo.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import hashlib
+
+
+class ConjuntoDatos:
+    """DataFrame + clave de linaje (el DataFrame es compartido: no modificarlo)."""
+
+    __slots__ = ('df', 'clave', 'token')
+
+    def __init__(self, df, clave):
+        self.df = df
+        self.clave = clave
+        self.token = hashlib.sha256(repr(clave).encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def origen(cls, df, consulta, *parametros, version_datos=None):
+        """Resultado de una consulta/carga identificada por sus parámetros y la versión."""
+        return cls(df, ('origen', consulta, _normalizar(parametros), str(version_datos)))
+
+    def derivar(self, transformacion, df, *parametros):
+        """`df` calculado a partir de este conjunto con `transformacion(parametros)`."""
+        return ConjuntoDatos(df, (transformacion, (self.clave,), _normalizar(parametros)))
+
+    def __len__(self):
+        return len(self.df)
+
+    def __repr__(self):
+        return f"ConjuntoDatos({self.clave[0]!r}, {len(self.df):,} filas, token={self.token})"
+
+
+def _normalizar(parametros):
+    """Listas/sets → tuplas (ordenadas si son sets) para que el repr sea estable."""
+    normalizados = []
+    for p in parametros:
+        if isinstance(p, (set, frozenset)):
+            p = tuple(sorted(p, key=str))
+        elif isinstance(p, list):
+            p = tuple(p)
+        normalizados.append(p)
+    return tuple(normalizados)
+
+
+def datos_de(conjunto):
+    """DataFrame de un ConjuntoDatos (o el mismo objeto si ya es un DataFrame)."""
+    return conjunto.df if isinstance(conjunto, ConjuntoDatos) else conjunto
+
+
+def derivar(origen, transformacion, df, *parametros):
+    """ConjuntoDatos derivado si `origen` tiene linaje; si no, el DataFrame suelto."""
+    if isinstance(origen, ConjuntoDatos):
+        return origen.derivar(transformacion, df, *parametros)
+    return df
+
+
+def combinar(transformacion, df, *entradas, parametros=()):
+    """
+    ConjuntoDatos calculado a partir de varias entradas; si alguna no tiene
+    linaje devuelve el DataFrame suelto (se hashea como siempre).
+    """
+    if not entradas or not all(isinstance(e, ConjuntoDatos) for e in entradas):
+        return df
+    claves = tuple(e.clave for e in entradas)
+    return ConjuntoDatos(df, (transformacion, claves, _normalizar(parametros)))
+
+
+# Para st.cache_data / st.cache_resource(hash_funcs=HASH_LINAJE)
+HASH_LINAJE = {ConjuntoDatos: lambda conjunto: conjunto.token}
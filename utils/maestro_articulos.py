@@ -0,0 +1,279 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    MAESTRO DE ARTÍCULOS (una fila por idarticulo)
+
+    data/maestro_articulos/
+        _watermark.json          último día de tickets incorporado
+        maestro.parquet
+
+    Columnas:
+        idarticulo, idartalfa, descripcion, familia, subfamilia,
+        fecha_ultima_venta                     → última línea de ticket con descripción
+        idproveedor, proveedor, uxb, costo_unit → presupuesto (foto del día)
+
+    Reemplaza las dos consultas más caras sobre el historial completo:
+        - SELECT DISTINCT idarticulo, familia, subfamilia (get_familias_data)
+        - ROW_NUMBER() OVER (PARTITION BY idarticulo ...) para descripciones (tab1)
+
+    - actualizar_maestro(): procesa SOLO los tickets posteriores al watermark
+      (espejo local si lo cubre, si no el motor) y vuelve a tomar los
+      atributos del presupuesto (utils.presupuesto). La primera vez recorre
+      todo el historial.
+    - obtener_maestro_articulos(): snapshot guardado, cacheado en memoria
+      por watermark para hacer los joins en pandas. Si está atrasado respecto
+      de la versión de datos se sirve igual y se actualiza en un hilo de
+      fondo; solo se espera cuando todavía no hay ningún snapshot.
+    - version_maestro_articulos(): watermark del snapshot servido, la versión
+      con la que se cachea lo derivado del maestro (familias).
+    - Una actualización a la vez entre workers (.actualizando.lock, O_EXCL).
+
+    Uso como job (después de python -m utils.tickets_mirror):
+        python -m utils.maestro_articulos
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+from utils.cache_disco import lock_archivo, ESPERA_MAX_SEG
+from utils.config import get_maestro_articulos_dir
+from utils.query_engine import get_query_engine
+from utils.parquet_store import leer_estado, guardar_estado
+from utils.presupuesto import obtener_presupuesto
+from utils.tickets_mirror import mirror_cubre, leer_tickets
+from utils.version_datos import obtener_ultima_fecha, fecha_de_version
+
+ARCHIVO_MAESTRO = 'maestro.parquet'
+
+COLUMNAS_TICKETS = ['idarticulo', 'idartalfa', 'descripcion', 'familia', 'subfamilia', 'fecha_ultima_venta']
+
+# Atributos que se toman del presupuesto (se reemplazan en cada actualización)
+COLUMNAS_PRESUPUESTO = ['idproveedor', 'proveedor', 'uxb', 'costo_unit']
+
+COLUMNAS_MAESTRO = COLUMNAS_TICKETS + COLUMNAS_PRESUPUESTO
+
+ARCHIVO_LOCK = '.actualizando.lock'
+
+_actualizacion_lock = threading.Lock()
+
+
+def _directorio(directorio=None):
+    return directorio or get_maestro_articulos_dir()
+
+
+def leer_maestro(directorio=None):
+    """Maestro guardado (DataFrame vacío con las columnas si todavía no existe)."""
+    ruta = os.path.join(_directorio(directorio), ARCHIVO_MAESTRO)
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=COLUMNAS_MAESTRO)
+    return pd.read_parquet(ruta)
+
+
+def _guardar_maestro(directorio, df):
+    ruta = os.path.join(directorio, ARCHIVO_MAESTRO)
+    tmp = os.path.join(directorio, f".{ARCHIVO_MAESTRO}.tmp")
+    df.to_parquet(tmp, index=False, compression='zstd')
+    os.replace(tmp, ruta)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ÚLTIMOS ATRIBUTOS POR ARTÍCULO
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _query_ultimos(project_id, bigquery_table, desde, hasta):
+    """Última línea con descripción por artículo en [desde, hasta] (desde=None → todo el historial)."""
+    filtro_desde = f"AND DATE(fecha_comprobante) >= '{desde}'" if desde else ""
+    return f"""
+    SELECT
+        idarticulo, idartalfa, descripcion, familia, subfamilia,
+        DATE(fecha_comprobante) AS fecha_ultima_venta
+    FROM (
+        SELECT idarticulo, idartalfa, descripcion, familia, subfamilia, fecha_comprobante,
+            ROW_NUMBER() OVER (PARTITION BY idarticulo ORDER BY fecha_comprobante DESC) as rn
+        FROM `{project_id}.{bigquery_table}`
+        WHERE DATE(fecha_comprobante) <= '{hasta}'
+        {filtro_desde}
+        AND idarticulo IS NOT NULL
+        AND descripcion IS NOT NULL
+        AND descripcion != ''
+    )
+    WHERE rn = 1
+    """
+
+
+def _ultimos_desde_tickets(df):
+    """Mismo resultado que _query_ultimos sobre tickets ya leídos del espejo."""
+    df = df[df['idarticulo'].notna() & df['descripcion'].notna() & (df['descripcion'] != '')]
+    df = df.sort_values('fecha_comprobante').drop_duplicates('idarticulo', keep='last')
+    df = df.assign(fecha_ultima_venta=pd.to_datetime(df['fecha_comprobante']).dt.date)
+    return df[COLUMNAS_TICKETS].reset_index(drop=True)
+
+
+def _atributos_presupuesto(credentials_path, project_id, version_datos):
+    """
+    Proveedor, uxb y costo por artículo (más descripción/familia para los que nunca vendieron).
+    Sale del presupuesto compartido de utils.presupuesto: no es otra descarga de la tabla.
+    """
+    df = obtener_presupuesto(credentials_path, project_id, version_datos).completo(
+        ['idarticulo', 'idarticuloalfa', 'descripcion', 'familia', 'subfamilia'] + COLUMNAS_PRESUPUESTO
+    )
+    df = df.dropna(subset=['idarticulo']).drop_duplicates('idarticulo', keep='first')
+    return df.rename(columns={'idarticuloalfa': 'idartalfa'})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ACTUALIZACIÓN INCREMENTAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def actualizar_maestro(credentials_path, project_id, bigquery_table, directorio=None, motor=None):
+    """
+    Incorporar al maestro los tickets posteriores al watermark y refrescar
+    los atributos del presupuesto.
+
+    Returns:
+        int: artículos nuevos o modificados por los tickets
+    """
+    directorio = _directorio(directorio)
+    os.makedirs(directorio, exist_ok=True)
+
+    # Otro worker puede estar actualizando: se espera y se retoma desde su watermark
+    with lock_archivo(os.path.join(directorio, ARCHIVO_LOCK), abandonado_seg=ESPERA_MAX_SEG, intervalo_seg=1):
+        print(f"\n{'='*80}")
+        print(f"📇 ACTUALIZANDO MAESTRO DE ARTÍCULOS")
+        print(f"{'='*80}")
+        inicio = time.time()
+
+        estado = leer_estado(directorio)
+        watermark = estado['fecha'] if estado else None
+        ultima_fecha = obtener_ultima_fecha(credentials_path, project_id, motor)
+        print(f"   • Watermark maestro: {watermark or 'sin datos (carga inicial)'}")
+        print(f"   • Última fecha en origen: {ultima_fecha}")
+
+        if ultima_fecha is None or (watermark is not None and ultima_fecha <= watermark):
+            print(f"   ✅ Maestro al día")
+            print(f"{'='*80}\n")
+            return 0
+
+        engine = get_query_engine(credentials_path, project_id, motor)
+        desde = watermark + timedelta(days=1) if watermark else None
+
+        if desde is not None and mirror_cubre(desde, ultima_fecha):
+            nuevos = _ultimos_desde_tickets(leer_tickets(
+                desde, ultima_fecha,
+                columnas=['fecha_comprobante', 'idarticulo', 'idartalfa', 'descripcion', 'familia', 'subfamilia'],
+            ))
+            fuente = 'espejo'
+        else:
+            nuevos = engine.query(_query_ultimos(project_id, bigquery_table, desde, ultima_fecha))
+            fuente = engine.nombre
+        nuevos['fecha_ultima_venta'] = pd.to_datetime(nuevos['fecha_ultima_venta']).dt.date
+        print(f"   📦 Tickets {desde or 'inicio'} → {ultima_fecha}: {len(nuevos):,} artículos ({fuente})")
+
+        # Upsert: el valor más reciente no nulo de cada columna gana
+        actual = leer_maestro(directorio)[COLUMNAS_TICKETS]
+        tickets = (
+            pd.concat([df for df in (actual, nuevos[COLUMNAS_TICKETS]) if not df.empty], ignore_index=True)
+            .sort_values('fecha_ultima_venta', kind='stable')
+            .groupby('idarticulo', sort=True).last()
+            .reset_index()
+        )
+
+        presupuesto = _atributos_presupuesto(credentials_path, project_id, str(ultima_fecha))
+        maestro = tickets.merge(presupuesto, on='idarticulo', how='outer', suffixes=('', '_presupuesto'))
+        for columna in ['idartalfa', 'descripcion', 'familia', 'subfamilia']:
+            alternativa = f'{columna}_presupuesto'
+            if alternativa in maestro.columns:
+                maestro[columna] = maestro[columna].fillna(maestro[alternativa])
+                maestro = maestro.drop(columns=alternativa)
+        for columna in COLUMNAS_PRESUPUESTO:
+            if columna not in maestro.columns:
+                maestro[columna] = None
+
+        maestro['idarticulo'] = maestro['idarticulo'].astype('int64')
+        maestro['idartalfa'] = pd.to_numeric(maestro['idartalfa'], errors='coerce').astype('Int64')
+        maestro = maestro[COLUMNAS_MAESTRO].sort_values('idarticulo').reset_index(drop=True)
+
+        _guardar_maestro(directorio, maestro)
+        fecha_min = estado['fecha_min'] if estado else (tickets['fecha_ultima_venta'].min() if len(tickets) else ultima_fecha)
+        guardar_estado(directorio, fecha_min, ultima_fecha, len(maestro))
+
+        print(f"   ✅ {len(maestro):,} artículos en el maestro ({len(nuevos):,} actualizados por tickets)")
+        print(f"   ⏱️  Tiempo: {time.time() - inicio:.2f}s")
+        print(f"{'='*80}\n")
+        return len(nuevos)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ACCESO DESDE LA APP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _maestro_de_watermark(watermark, directorio):
+    """Snapshot del maestro con ese watermark (la clave cambia al publicarse uno nuevo)."""
+    return leer_maestro(directorio)
+
+
+def _actualizar_en_segundo_plano(credentials_path, project_id, bigquery_table, directorio):
+    """Una sola actualización de fondo por proceso; los errores no llegan a la app."""
+    if not _actualizacion_lock.acquire(blocking=False):
+        return
+
+    def tarea():
+        try:
+            actualizar_maestro(credentials_path, project_id, bigquery_table, directorio)
+        except Exception as e:
+            print(f"   ⚠️  No se pudo actualizar el maestro (se sigue con el snapshot): {e}")
+        finally:
+            _actualizacion_lock.release()
+
+    threading.Thread(target=tarea, name='actualizacion-maestro', daemon=True).start()
+
+
+def version_maestro_articulos(credentials_path, project_id, bigquery_table, version_datos=None):
+    """
+    Watermark ('YYYY-MM-DD') del snapshot que sirve obtener_maestro_articulos,
+    o None si no hay ninguno. Dispara la actualización igual que ella.
+
+    - Sin snapshot: carga inicial en línea (única vez).
+    - Snapshot atrasado respecto de `version_datos`: se actualiza en segundo
+      plano y se devuelve el watermark del que hay.
+
+    Lo que se cachea a partir del maestro debe usar este valor como versión
+    y no `version_datos`: si no, el snapshot viejo quedaría guardado bajo la
+    versión nueva hasta la próxima carga.
+    """
+    directorio = _directorio()
+    estado = leer_estado(directorio)
+    hasta_version = fecha_de_version(version_datos)
+
+    if estado is None:
+        with _actualizacion_lock:
+            actualizar_maestro(credentials_path, project_id, bigquery_table, directorio)
+        estado = leer_estado(directorio)
+    elif hasta_version is not None and estado['fecha'] < hasta_version:
+        _actualizar_en_segundo_plano(credentials_path, project_id, bigquery_table, directorio)
+
+    return str(estado['fecha']) if estado else None
+
+
+def obtener_maestro_articulos(credentials_path, project_id, bigquery_table, version_datos=None):
+    """
+    Maestro de artículos sin esperar a la actualización, salvo la primera vez
+    (ver version_maestro_articulos); el próximo rerun toma el snapshot nuevo.
+
+    Returns:
+        DataFrame con COLUMNAS_MAESTRO, una fila por idarticulo
+    """
+    watermark = version_maestro_articulos(credentials_path, project_id, bigquery_table, version_datos)
+    return _maestro_de_watermark(watermark, _directorio())
+
+
+if __name__ == "__main__":
+    from utils.config import setup_credentials
+
+    config = setup_credentials()
+    actualizar_maestro(config['credentials_path'], config['project_id'], config['bigquery_table'])
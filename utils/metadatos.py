@@ -0,0 +1,97 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    METADATOS DE FRESCURA DE LOS DATOS
+
+    El sidebar y el recuadro "Actualizado al" del dashboard global solo
+    necesitan la última fecha cargada. Antes la sacaban de un SELECT * sobre
+    result_final_alert_all en cada rerun; ahora:
+
+        obtener_metadatos()    → una consulta de UNA fila por versión de datos
+                                 + watermarks de los almacenes locales
+        obtener_fecha_datos()  → 'ultima_fecha' de los metadatos; la versión
+                                 está memoizada (utils.version_datos), así que
+                                 un rerun no consulta nada
+
+    {
+        'ultima_fecha': date,
+        'presupuesto': {'ultima_fecha', 'filas', 'proveedores'},
+        'locales': {'tickets_espejo' | 'rollup' | 'maestro': {'fecha', 'filas'}},
+        'version_proveedores': str,   # cambia con la carga o con la lista de proveedores
+    }
+═══════════════════════════════════════════════════════════════════════════════
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from utils.config import get_tickets_mirror_dir, get_rollup_dir, get_maestro_articulos_dir
+from utils.parquet_store import leer_estado
+from utils.query_engine import get_query_engine
+from utils.version_datos import obtener_version_datos, fecha_de_version
+
+
+def _estados_locales():
+    """Último día y filas de cada almacén local (solo los que existen)."""
+    locales = {}
+    for nombre, directorio in [
+        ('tickets_espejo', get_tickets_mirror_dir()),
+        ('rollup', get_rollup_dir()),
+        ('maestro', get_maestro_articulos_dir()),
+    ]:
+        estado = leer_estado(directorio)
+        if estado:
+            locales[nombre] = {'fecha': estado['fecha'], 'filas': estado['filas']}
+    return locales
+
+
+def _resumen_presupuesto(credentials_path, project_id):
+    """Una fila: última fecha, filas y proveedores distintos del presupuesto."""
+    engine = get_query_engine(credentials_path, project_id)
+    df = engine.query(f"""
+        SELECT
+            MAX(ultima_fecha) AS ultima_fecha,
+            COUNT(*) AS filas,
+            COUNT(DISTINCT idproveedor) AS proveedores
+        FROM `{project_id}.presupuesto.result_final_alert_all`
+    """)
+    fila = df.iloc[0]
+    return {
+        'ultima_fecha': pd.Timestamp(fila['ultima_fecha']).date() if pd.notna(fila['ultima_fecha']) else None,
+        'filas': int(fila['filas']),
+        'proveedores': int(fila['proveedores']),
+    }
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def obtener_metadatos(credentials_path, project_id, version_datos=None):
+    """
+    Metadatos de frescura (CACHEADO hasta que cambie version_datos).
+
+    Returns:
+        dict (ver encabezado del módulo); 'presupuesto' es None si la consulta falla
+    """
+    try:
+        presupuesto = _resumen_presupuesto(credentials_path, project_id)
+    except Exception as e:
+        print(f"⚠️  No se pudieron obtener metadatos del presupuesto: {e}")
+        presupuesto = None
+
+    ultima_fecha = (presupuesto or {}).get('ultima_fecha') or fecha_de_version(version_datos)
+    version_proveedores = (
+        f"{ultima_fecha}:{presupuesto['proveedores']}" if presupuesto else str(version_datos)
+    )
+
+    return {
+        'ultima_fecha': ultima_fecha,
+        'presupuesto': presupuesto,
+        'locales': _estados_locales(),
+        'version_proveedores': version_proveedores,
+    }
+
+
+def obtener_fecha_datos(credentials_path, project_id):
+    """Última fecha con datos cargados (ayer si no se puede determinar)."""
+    version_datos = obtener_version_datos(credentials_path, project_id)
+    fecha = obtener_metadatos(credentials_path, project_id, version_datos=version_datos)['ultima_fecha']
+    return fecha or datetime.now().date() - timedelta(days=1)
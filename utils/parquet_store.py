@@ -0,0 +1,137 @@
+"""
+Utilidades comunes para los almacenes locales en Parquet
+(espejo de tickets, rollup diario, ...).
+
+Layout Hive por año/mes con un archivo de estado (watermark) en la raíz:
+
+    <directorio>/
+        _watermark.json
+        anio=2025/mes=1/part-20250101_20250131.parquet
+
+Los archivos que empiezan con '.' o '_' los ignora el lector de pyarrow,
+así que las escrituras a medio terminar (.tmp) y el estado no se leen como datos.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PARTICIONES = ds.partitioning(
+    pa.schema([('anio', pa.int32()), ('mes', pa.int32())]), flavor='hive'
+)
+
+ARCHIVO_ESTADO = '_watermark.json'
+
+
+def a_fecha(valor):
+    """Normaliza str / Timestamp / date / datetime a datetime.date (None → None)."""
+    if valor is None:
+        return None
+    return pd.Timestamp(valor).date()
+
+
+def meses(desde, hasta):
+    """Rangos [inicio, fin] por mes calendario entre dos fechas."""
+    inicio = desde
+    while inicio <= hasta:
+        siguiente = (pd.Timestamp(inicio) + pd.offsets.MonthBegin(1)).date()
+        fin = min(siguiente - timedelta(days=1), hasta)
+        yield inicio, fin
+        inicio = fin + timedelta(days=1)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ESTADO (watermark)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def leer_estado(directorio):
+    """
+    Estado del almacén: {'fecha_min', 'fecha': último día completo, 'filas', ...}
+    o None si todavía no se cargó.
+    """
+    ruta = os.path.join(directorio, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        estado = json.load(f)
+    estado['fecha_min'] = a_fecha(estado['fecha_min'])
+    estado['fecha'] = a_fecha(estado['fecha'])
+    return estado
+
+
+def guardar_estado(directorio, fecha_min, fecha, filas):
+    ruta = os.path.join(directorio, ARCHIVO_ESTADO)
+    tmp = os.path.join(directorio, f".{ARCHIVO_ESTADO}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({
+            'fecha_min': str(fecha_min),
+            'fecha': str(fecha),
+            'filas': int(filas),
+            'actualizado': datetime.now().isoformat(timespec='seconds'),
+        }, f, indent=2)
+    os.replace(tmp, ruta)
+
+
+def cubre(directorio, fecha_desde, fecha_hasta=None):
+    """True si el almacén tiene todos los días de [fecha_desde, fecha_hasta]."""
+    estado = leer_estado(directorio)
+    if estado is None:
+        return False
+    fecha_hasta = a_fecha(fecha_hasta) or estado['fecha']
+    return estado['fecha_min'] <= a_fecha(fecha_desde) and fecha_hasta <= estado['fecha']
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ESCRITURA / LECTURA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def escribir_particion(directorio, tabla, desde, hasta):
+    """Escribe una pyarrow.Table con los días [desde, hasta] (mismo mes)."""
+    carpeta = os.path.join(directorio, f"anio={desde.year}", f"mes={desde.month}")
+    os.makedirs(carpeta, exist_ok=True)
+    nombre = f"part-{desde:%Y%m%d}_{hasta:%Y%m%d}.parquet"
+    tmp = os.path.join(carpeta, f".{nombre}.tmp")
+    pq.write_table(tabla, tmp, compression='zstd')
+    os.replace(tmp, os.path.join(carpeta, nombre))
+
+
+def filtro_particiones(desde, hasta):
+    """Expresión sobre anio/mes que descarta carpetas fuera del rango."""
+    anio, mes = ds.field('anio'), ds.field('mes')
+    if desde.year == hasta.year:
+        return (anio == desde.year) & (mes >= desde.month) & (mes <= hasta.month)
+    return (
+        ((anio == desde.year) & (mes >= desde.month))
+        | ((anio > desde.year) & (anio < hasta.year))
+        | ((anio == hasta.year) & (mes <= hasta.month))
+    )
+
+
+def leer_rango(directorio, campo_fecha, tipo_fecha, desde, hasta,
+               columnas, ids=None, columna_id='idarticulo'):
+    """
+    Leer [desde, hasta] con poda de particiones, filtro empujado al scan de
+    Parquet y proyección de columnas.
+
+    Returns:
+        pyarrow.Table
+    """
+    dataset = ds.dataset(directorio, format='parquet', partitioning=PARTICIONES)
+
+    fecha = ds.field(campo_fecha)
+    if pa.types.is_timestamp(tipo_fecha):
+        limite_inf = pa.scalar(pd.Timestamp(desde), type=tipo_fecha)
+        limite_sup = pa.scalar(pd.Timestamp(hasta) + pd.Timedelta(days=1), type=tipo_fecha)
+    else:
+        limite_inf = pa.scalar(desde, type=tipo_fecha)
+        limite_sup = pa.scalar(hasta + timedelta(days=1), type=tipo_fecha)
+
+    filtro = filtro_particiones(desde, hasta) & (fecha >= limite_inf) & (fecha < limite_sup)
+    if ids is not None:
+        filtro = filtro & ds.field(columna_id).isin(pa.array([int(i) for i in ids], type=pa.int64()))
+
+    return dataset.to_table(columns=list(columnas), filter=filtro)
@@ -0,0 +1,343 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    PIVOTE ANUAL ARTÍCULO × TRIMESTRE MATERIALIZADO (un archivo por año)
+
+    data/pivote_trimestral/anio=YYYY/
+        trimestres.parquet   una fila por (idarticulo, idartalfa, trimestre);
+                             el watermark (último día incorporado, 31/12 →
+                             año cerrado) va en los metadatos del mismo archivo
+
+    get_ventas_agregadas_stock recorría el año completo de tickets con 12
+    SUM(CASE WHEN EXTRACT(QUARTER FROM PARSE_DATE(...))) cada vez que se abría
+    la pestaña de stock o se cambiaba de año. Ahora:
+
+    - Año cerrado: se calcula una vez y queda congelado (no se vuelve a leer
+      el warehouse nunca más).
+    - Año en curso: los trimestres cerrados quedan como están y el trimestre
+      abierto se RECALCULA desde su primer día (no se suman deltas): repetir
+      una actualización, o retomarla después de una caída, da el mismo archivo.
+    - Datos + watermark se escriben juntos (un .tmp + os.replace): no hay
+      estado intermedio en el que uno se haya guardado y el otro no.
+    - Una actualización a la vez entre workers (.actualizando.lock, O_EXCL).
+    - Fuente del trimestre abierto: rollup diario si lo cubre; si no, una
+      consulta GROUP BY artículo × trimestre (PARSE_DATE una vez por fila).
+
+    En el archivo se guardan los acumulados por trimestre; el pivote anual,
+    las métricas derivadas (margen, utilidad, días activo, velocidad) y la
+    normalización de familia/subfamilia se calculan al leer, con las mismas
+    columnas y orden que la consulta original.
+
+    Uso como job (después de python -m utils.rollup_ventas):
+        python -m utils.pivote_trimestral [año ...]
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.cache_disco import lock_archivo, ESPERA_MAX_SEG
+from utils.config import get_pivote_trimestral_dir
+from utils.parquet_store import a_fecha
+from utils.query_engine import get_query_engine
+from utils.rollup_ventas import rollup_cubre, ventas_por_trimestre
+from utils.version_datos import obtener_ultima_fecha, fecha_de_version
+
+ARCHIVO_TRIMESTRES = 'trimestres.parquet'
+ARCHIVO_LOCK = '.actualizando.lock'
+CLAVE_METADATOS = b'pivote_trimestral'
+# Formato anterior (pivote acumulado + _watermark.json aparte): se reemplaza
+ARCHIVOS_ANTERIORES = ['pivote.parquet', '_watermark.json']
+
+CLAVES_PIVOTE = ['idarticulo', 'idartalfa']
+TEXTOS_PIVOTE = ['descripcion', 'familia', 'subfamilia']
+MEDIDAS_PIVOTE = ['cantidad_total', 'precio_total', 'costo_total']
+NOMBRES_TRIMESTRE = {'cantidad_total': 'cantidad', 'precio_total': 'venta', 'costo_total': 'costo'}
+COLUMNAS_TRIMESTRES = [f"{NOMBRES_TRIMESTRE[m]}_q{q}" for q in [1, 2, 3, 4] for m in MEDIDAS_PIVOTE]
+COLUMNAS_ANUALES = [f"{m}_anual" for m in MEDIDAS_PIVOTE]
+COLUMNAS_FECHAS = ['fecha_primera_venta', 'fecha_ultima_venta', 'dias_con_ventas']
+
+COLUMNAS_PIVOTE = CLAVES_PIVOTE + TEXTOS_PIVOTE + COLUMNAS_ANUALES + COLUMNAS_TRIMESTRES + COLUMNAS_FECHAS
+# Filas guardadas: artículo × trimestre
+COLUMNAS_ARCHIVO = CLAVES_PIVOTE + ['trimestre'] + TEXTOS_PIVOTE + MEDIDAS_PIVOTE + COLUMNAS_FECHAS
+
+# Hilos del mismo proceso (entre workers coordina el .lock)
+_lock_pivote = threading.Lock()
+
+
+def _directorio_año(año, directorio=None):
+    return os.path.join(directorio or get_pivote_trimestral_dir(), f"anio={int(año)}")
+
+
+def _trimestre(fecha):
+    return (fecha.month - 1) // 3 + 1
+
+
+def _inicio_trimestre(año, trimestre):
+    return date(int(año), 3 * (trimestre - 1) + 1, 1)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ARCHIVO (datos + watermark juntos)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def leer_estado_pivote(directorio_año):
+    """
+    Watermark guardado en los metadatos del archivo: {'fecha', 'articulos'}
+    o None si todavía no hay pivote (o es del formato anterior).
+    """
+    ruta = os.path.join(directorio_año, ARCHIVO_TRIMESTRES)
+    try:
+        metadatos = pq.read_schema(ruta).metadata or {}
+    except (OSError, pa.ArrowException):
+        return None
+    if CLAVE_METADATOS not in metadatos:
+        return None
+    estado = json.loads(metadatos[CLAVE_METADATOS])
+    estado['fecha'] = a_fecha(estado['fecha'])
+    return estado
+
+
+def leer_trimestres(año, directorio=None):
+    """Filas artículo × trimestre guardadas (vacío con las columnas si no hay pivote)."""
+    directorio_año = _directorio_año(año, directorio)
+    if leer_estado_pivote(directorio_año) is None:
+        return pd.DataFrame(columns=COLUMNAS_ARCHIVO)
+    return pd.read_parquet(os.path.join(directorio_año, ARCHIVO_TRIMESTRES))
+
+
+def leer_pivote(año, directorio=None):
+    """Acumulados del año, una fila por artículo (vacío con las columnas si no existe)."""
+    return pivotar_trimestres(leer_trimestres(año, directorio))
+
+
+def _guardar_trimestres(directorio_año, df, fecha, articulos):
+    """Filas + watermark en UN archivo, reemplazado atómicamente."""
+    tabla = pa.Table.from_pandas(df[COLUMNAS_ARCHIVO], preserve_index=False)
+    estado = json.dumps({
+        'fecha': str(fecha),
+        'articulos': int(articulos),
+        'actualizado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+    tabla = tabla.replace_schema_metadata({**(tabla.schema.metadata or {}), CLAVE_METADATOS: estado})
+
+    ruta = os.path.join(directorio_año, ARCHIVO_TRIMESTRES)
+    tmp = os.path.join(directorio_año, f".{ARCHIVO_TRIMESTRES}.{os.getpid()}.tmp")
+    pq.write_table(tabla, tmp, compression='zstd')
+    os.replace(tmp, ruta)
+
+    for nombre in ARCHIVOS_ANTERIORES:
+        try:
+            os.remove(os.path.join(directorio_año, nombre))
+        except OSError:
+            pass
+
+
+def año_cerrado(año, directorio=None):
+    """True si el pivote del año ya incorporó el 31 de diciembre."""
+    estado = leer_estado_pivote(_directorio_año(año, directorio))
+    return estado is not None and estado['fecha'] >= date(int(año), 12, 31)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# AGREGADO DE UN RANGO DE DÍAS
+# ═══════════════════════════════════════════════════════════════════════════════
+def _query_trimestres(project_id, bigquery_table, desde, hasta):
+    """Artículo × trimestre en [desde, hasta] (una fila por combinación, no 12 CASE)."""
+    return f"""
+    SELECT
+        idarticulo,
+        idartalfa,
+        EXTRACT(QUARTER FROM fecha) AS trimestre,
+        MAX(descripcion) AS descripcion,
+        MAX(familia) AS familia,
+        MAX(subfamilia) AS subfamilia,
+        SUM(cantidad_total) AS cantidad_total,
+        SUM(precio_total) AS precio_total,
+        SUM(costo_total) AS costo_total,
+        MIN(fecha) AS fecha_primera_venta,
+        MAX(fecha) AS fecha_ultima_venta,
+        COUNT(DISTINCT fecha) AS dias_con_ventas
+    FROM (
+        SELECT
+            PARSE_DATE('%Y-%m-%d', fecha_comprobante) AS fecha,
+            idarticulo, idartalfa, descripcion, familia, subfamilia,
+            cantidad_total, precio_total, costo_total
+        FROM `{project_id}.{bigquery_table}`
+    )
+    WHERE fecha BETWEEN '{desde}' AND '{hasta}'
+    GROUP BY 1, 2, 3
+    """
+
+
+def pivotar_trimestres(df):
+    """
+    Filas artículo × trimestre → una fila por artículo con los acumulados
+    (anual, por trimestre, primera/última venta y días con ventas).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_PIVOTE)
+
+    df = df.copy()
+    df['trimestre'] = df['trimestre'].astype(int)
+    grupos = df.groupby(CLAVES_PIVOTE, dropna=False)
+    base = grupos.agg(
+        descripcion=('descripcion', 'max'),
+        familia=('familia', 'max'),
+        subfamilia=('subfamilia', 'max'),
+        cantidad_total_anual=('cantidad_total', 'sum'),
+        precio_total_anual=('precio_total', 'sum'),
+        costo_total_anual=('costo_total', 'sum'),
+        fecha_primera_venta=('fecha_primera_venta', 'min'),
+        fecha_ultima_venta=('fecha_ultima_venta', 'max'),
+        # Los trimestres no se superponen: los días distintos se suman
+        dias_con_ventas=('dias_con_ventas', 'sum'),
+    )
+
+    trimestres = df.pivot_table(
+        index=CLAVES_PIVOTE, columns='trimestre', values=MEDIDAS_PIVOTE,
+        aggfunc='sum', fill_value=0, dropna=False,
+    ).reindex(columns=pd.MultiIndex.from_product([MEDIDAS_PIVOTE, [1, 2, 3, 4]]), fill_value=0)
+    trimestres.columns = [f"{NOMBRES_TRIMESTRE[m]}_q{q}" for m, q in trimestres.columns]
+
+    return base.join(trimestres).reset_index()[COLUMNAS_PIVOTE]
+
+
+def _trimestres_de_rango(engine, project_id, bigquery_table, desde, hasta):
+    """Filas artículo × trimestre de [desde, hasta] y la fuente usada."""
+    if rollup_cubre(desde, hasta):
+        df, fuente = ventas_por_trimestre(desde, hasta), 'rollup'
+    else:
+        df, fuente = engine.query(_query_trimestres(project_id, bigquery_table, desde, hasta)), engine.nombre
+        for columna in ['fecha_primera_venta', 'fecha_ultima_venta']:
+            df[columna] = pd.to_datetime(df[columna]).dt.date
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_ARCHIVO), fuente
+    df = df.assign(trimestre=df['trimestre'].astype('int64'))
+    return df[COLUMNAS_ARCHIVO], fuente
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ACTUALIZACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def actualizar_pivote(credentials_path, project_id, bigquery_table, año,
+                      hasta=None, directorio=None, motor=None):
+    """
+    Llevar el pivote de `año` hasta `hasta` (None → última fecha cargada).
+    Un año cerrado no se vuelve a calcular; del año en curso se recalcula
+    el trimestre abierto completo (idempotente).
+
+    Returns:
+        int: artículos del pivote
+    """
+    año = int(año)
+    directorio_año = _directorio_año(año, directorio)
+    os.makedirs(directorio_año, exist_ok=True)
+
+    with _lock_pivote, lock_archivo(os.path.join(directorio_año, ARCHIVO_LOCK),
+                                    abandonado_seg=ESPERA_MAX_SEG, intervalo_seg=1):
+        # Releído bajo el lock: otro worker pudo haberlo actualizado mientras se esperaba
+        estado = leer_estado_pivote(directorio_año)
+        articulos = estado['articulos'] if estado else 0
+        if estado is not None and estado['fecha'] >= date(año, 12, 31):
+            return articulos
+
+        if hasta is None:
+            hasta = obtener_ultima_fecha(credentials_path, project_id, motor)
+        if hasta is None:
+            return articulos
+        hasta = min(hasta, date(año, 12, 31))
+        siguiente = estado['fecha'] + timedelta(days=1) if estado else date(año, 1, 1)
+        if hasta < siguiente:
+            return articulos
+
+        # Trimestres cerrados: se conservan; el abierto se rehace desde su inicio
+        trimestre_abierto = _trimestre(siguiente)
+        desde = _inicio_trimestre(año, trimestre_abierto)
+
+        print(f"\n{'='*80}")
+        print(f"🧊 PIVOTE TRIMESTRAL {año}: Q{trimestre_abierto} {desde} → {hasta}")
+        print(f"{'='*80}")
+        inicio = time.time()
+
+        guardados = leer_trimestres(año, directorio)
+        cerrados = guardados[guardados['trimestre'] < trimestre_abierto]
+
+        engine = get_query_engine(credentials_path, project_id, motor)
+        nuevos, fuente = _trimestres_de_rango(engine, project_id, bigquery_table, desde, hasta)
+
+        filas = pd.concat([df for df in (cerrados, nuevos) if not df.empty] or [nuevos], ignore_index=True)
+        articulos = len(filas[CLAVES_PIVOTE].drop_duplicates())
+        _guardar_trimestres(directorio_año, filas, hasta, articulos)
+
+        cerrado = hasta >= date(año, 12, 31)
+        print(f"   📦 {len(nuevos):,} filas artículo × trimestre recalculadas ({fuente})")
+        print(f"   ✅ {articulos:,} artículos en el pivote{' (año cerrado)' if cerrado else ''}")
+        print(f"   ⏱️  Tiempo: {time.time() - inicio:.2f}s")
+        print(f"{'='*80}\n")
+        return articulos
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LECTURA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def metricas_anuales(pivote, normalizar=True):
+    """
+    Acumulados → columnas de get_ventas_agregadas_stock (mismo orden),
+    ordenado por utilidad_anual. normalizar=True: familia/subfamilia UPPER + TRIM.
+    """
+    resultado = pivote[COLUMNAS_PIVOTE].copy()
+    if normalizar:
+        for columna in ['familia', 'subfamilia']:
+            resultado[columna] = resultado[columna].str.strip().str.upper()
+
+    resultado['dias_activo'] = (
+        pd.to_datetime(resultado['fecha_ultima_venta']) - pd.to_datetime(resultado['fecha_primera_venta'])
+    ).dt.days + 1
+    precio = resultado['precio_total_anual']
+    resultado['margen_anual'] = np.where(
+        precio != 0, (precio - resultado['costo_total_anual']) / precio.where(precio != 0), np.nan
+    )
+    resultado['utilidad_anual'] = precio - resultado['costo_total_anual']
+    resultado['velocidad_venta_diaria'] = resultado['cantidad_total_anual'] / resultado['dias_activo']
+
+    return resultado.sort_values('utilidad_anual', ascending=False).reset_index(drop=True)
+
+
+def obtener_ventas_año(credentials_path, project_id, bigquery_table, año,
+                       version_datos=None, directorio=None, normalizar=True):
+    """
+    Ventas del año por artículo y trimestre desde el pivote materializado
+    (se actualiza antes si está atrasado respecto de `version_datos`).
+
+    Returns:
+        DataFrame con las columnas de get_ventas_agregadas_stock
+    """
+    año = int(año)
+    estado = leer_estado_pivote(_directorio_año(año, directorio))
+    hasta_version = fecha_de_version(version_datos)
+    cerrado = estado is not None and estado['fecha'] >= date(año, 12, 31)
+
+    if not cerrado and (estado is None or hasta_version is None or estado['fecha'] < hasta_version):
+        actualizar_pivote(credentials_path, project_id, bigquery_table, año,
+                          hasta=hasta_version, directorio=directorio)
+
+    return metricas_anuales(leer_pivote(año, directorio), normalizar=normalizar)
+
+
+if __name__ == "__main__":
+    from utils.config import setup_credentials
+
+    config = setup_credentials()
+    años = [int(a) for a in sys.argv[1:]] or [date.today().year - 1, date.today().year]
+    for año in años:
+        actualizar_pivote(config['credentials_path'], config['project_id'], config['bigquery_table'], año)
@@ -0,0 +1,127 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    PRESUPUESTO EN MEMORIA CON ÍNDICE POR PROVEEDOR
+
+    presupuesto.result_final_alert_all se descarga UNA vez por versión de
+    datos (con tipos compactos y cache en disco) y queda compartido por todas
+    las sesiones. Abrir un proveedor ya no consulta el warehouse: se toma su
+    porción con un índice idproveedor → posiciones de fila.
+
+        presupuesto = obtener_presupuesto(credentials_path, project_id, version_datos)
+        presupuesto.proveedor(12000001, columnas=['idarticulo', 'PRESUPUESTO'])
+        presupuesto.articulos(ID_LIST_SALTA, tipo_id='idarticuloalfa')
+        presupuesto.completo()
+        presupuesto.compartido()      # la tabla misma, sin copiar (solo lectura)
+
+    Proveedores unificados/virtuales:
+        - PROVEEDOR_UNIFICADO: el ID unificado (12000001...) junta los IDs originales
+        - SALTA_REFRESCOS_ID (12000006): artículos de ID_LIST_SALTA por idarticuloalfa
+
+    Las porciones son copias: el DataFrame compartido no se modifica.
+    compartido() lo devuelve sin copiar para quien solo lo lee (dashboard global).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import time
+
+import numpy as np
+import streamlit as st
+
+from utils.cache_disco import cache_en_disco
+from utils.config import PROVEEDOR_UNIFICADO, SALTA_REFRESCOS_ID, ID_LIST_SALTA
+from utils.esquemas import aplicar_esquema, ESQUEMA_PRESUPUESTO
+from utils.query_engine import get_query_engine, normalizar_ids
+
+DATASET_PRESUPUESTO = 'presupuesto'
+TABLA_PRESUPUESTO = 'result_final_alert_all'
+
+
+@cache_en_disco('presupuesto_completo')
+def _cargar_presupuesto(credentials_path, project_id, dataset, table, version_datos=None):
+    """Tabla completa (una consulta por versión de datos)."""
+    engine = get_query_engine(credentials_path)
+    df = engine.query(f"""
+        SELECT *
+        FROM `{project_id}.{dataset}.{table}`
+        WHERE idarticulo IS NOT NULL
+    """)
+    return aplicar_esquema(df, ESQUEMA_PRESUPUESTO)
+
+
+class PresupuestoIndexado:
+    """Tabla de presupuesto + índice de filas por idproveedor."""
+
+    def __init__(self, df, proveedor_unificado=None):
+        self.df = df.reset_index(drop=True)
+        self._unificados = {}
+        for original, unificado in (proveedor_unificado or PROVEEDOR_UNIFICADO).items():
+            self._unificados.setdefault(unificado, []).append(original)
+
+        self._por_proveedor = {}
+        if 'idproveedor' in self.df.columns:
+            for idproveedor, posiciones in self.df.groupby('idproveedor', sort=False).indices.items():
+                self._por_proveedor[int(idproveedor)] = posiciones
+
+    def __len__(self):
+        return len(self.df)
+
+    def ids_originales(self, idproveedor):
+        """IDs de proveedor que forman `idproveedor` (el mismo si no está unificado)."""
+        return self._unificados.get(int(idproveedor), [int(idproveedor)])
+
+    def _porcion(self, posiciones, columnas):
+        columnas = [c for c in columnas if c in self.df.columns] if columnas else list(self.df.columns)
+        return self.df.iloc[np.sort(posiciones)][columnas].reset_index(drop=True)
+
+    def proveedor(self, idproveedor, columnas=None):
+        """Filas de un proveedor (unificado, virtual o simple)."""
+        if int(idproveedor) == SALTA_REFRESCOS_ID:
+            return self.articulos(ID_LIST_SALTA, tipo_id='idarticuloalfa', columnas=columnas)
+
+        vacio = np.array([], dtype=np.int64)
+        posiciones = np.concatenate(
+            [self._por_proveedor.get(i, vacio) for i in self.ids_originales(idproveedor)] or [vacio]
+        )
+        return self._porcion(posiciones, columnas)
+
+    def articulos(self, ids, tipo_id='idarticulo', columnas=None):
+        """Filas cuyo `tipo_id` ('idarticulo' o 'idarticuloalfa') está en `ids`."""
+        if tipo_id not in self.df.columns:
+            return self._porcion(np.array([], dtype=np.int64), columnas)
+        mascara = self.df[tipo_id].isin(normalizar_ids(ids))
+        return self._porcion(np.flatnonzero(mascara.to_numpy()), columnas)
+
+    def completo(self, columnas=None):
+        """Copia de la tabla (solo `columnas` si se indican)."""
+        return self._porcion(np.arange(len(self.df)), columnas)
+
+    def compartido(self):
+        """La tabla compartida, sin copiar (solo lectura)."""
+        return self.df
+
+
+def obtener_presupuesto(credentials_path, project_id, version_datos=None,
+                        dataset=DATASET_PRESUPUESTO, table=TABLA_PRESUPUESTO):
+    """
+    Presupuesto indexado de la versión de datos (compartido, no se copia por sesión).
+
+    Returns:
+        PresupuestoIndexado (si la consulta falla la excepción se propaga y no se cachea)
+    """
+    # Siempre los mismos argumentos posicionales: una sola entrada de cache por versión
+    return _presupuesto_indexado(credentials_path, project_id, version_datos, dataset, table)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _presupuesto_indexado(credentials_path, project_id, version_datos, dataset, table):
+    print(f"\n{'='*80}")
+    print(f"📋 CARGANDO PRESUPUESTO COMPLETO ({version_datos})")
+    print(f"{'='*80}")
+    inicio = time.time()
+
+    df = _cargar_presupuesto(credentials_path, project_id, dataset, table, version_datos=version_datos)
+    presupuesto = PresupuestoIndexado(df)
+
+    print(f"   ✅ {len(presupuesto):,} filas, {len(presupuesto._por_proveedor):,} proveedores indexados")
+    print(f"   ⏱️  Tiempo: {time.time() - inicio:.2f}s")
+    print(f"{'='*80}\n")
+    return presupuesto
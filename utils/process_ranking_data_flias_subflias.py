@@ -53,6 +53,13 @@
                           'Ranking-proveedor-subfamilia'.
                         - Nuevo 'Ranking' = posición del proveedor por su
                           Venta Total acumulada, repetida en todas sus filas.
+ v1.3  (2026-10-17) - El merge catálogo ⋈ familias ⋈ ventas ⋈ presupuesto y
+                      el agrupamiento salen del cubo de ranking compartido
+                      (utils.cubo_ranking); las cuentas de exceso / sin
+                      stock ya no usan lambdas.
+ v1.4  (2026-10-17) - ranking_flias_subflias_de_cubo(): la misma vista sobre
+                      un cubo ya filtrado (filtros de familia del dashboard
+                      global sin volver a mergear).
 ═══════════════════════════════════════════════════════════════════════════════
 '''
 
@@ -61,103 +68,37 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
+from utils.cubo_ranking import obtener_cubo_ranking
+from utils.linaje import HASH_LINAJE
 
-@st.cache_data(ttl=300, show_spinner=False)
+
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=HASH_LINAJE)
 def process_ranking_data_flias_subflias(df_proveedores, df_ventas, df_presupuesto, df_familias):
     """
     Procesa y genera el ranking de proveedores desglosado por
     familia/subfamilia (CACHEADO).
+
+    Acepta DataFrames o ConjuntoDatos (cache por linaje, utils.linaje).
     """
     print(f"\n🔧 PROCESANDO RANKING FLIAS/SUBFLIAS (sin caché)")
-    inicio = time.time()
 
-    # === VERIFICAR QUE df_familias TENGA LAS COLUMNAS ===
-    print(f"   🔍 Verificando df_familias...")
-    print(f"      Columnas en df_familias: {list(df_familias.columns)}")
-    print(f"      Registros en df_familias: {len(df_familias):,}")
-
-    # === LIMPIAR COLUMNAS DUPLICADAS EN df_proveedores ===
-    columnas_a_eliminar = []
-    if 'familia' in df_proveedores.columns:
-        columnas_a_eliminar.append('familia')
-    if 'subfamilia' in df_proveedores.columns:
-        columnas_a_eliminar.append('subfamilia')
-
-    if columnas_a_eliminar:
-        print(f"   🧹 Eliminando columnas duplicadas de df_proveedores: {columnas_a_eliminar}")
-        df_proveedores = df_proveedores.drop(columns=columnas_a_eliminar)
-
-    # === AGREGAR FAMILIA/SUBFAMILIA desde df_familias ===
-    print(f"   🔗 Agregando familia/subfamilia...")
-
-    columnas_merge = ['idarticulo']
-    if 'familia' in df_familias.columns:
-        columnas_merge.append('familia')
-    if 'subfamilia' in df_familias.columns:
-        columnas_merge.append('subfamilia')
-
-    print(f"      Columnas a mergear: {columnas_merge}")
-
-    df_proveedores_completo = df_proveedores.merge(
-        df_familias[columnas_merge],
-        on='idarticulo',
-        how='left'
-    )
+    # === CUBO DE RANKING (merge y agrupamiento compartidos con process_ranking_data) ===
+    cubo = obtener_cubo_ranking(df_proveedores, df_ventas, df_presupuesto, df_familias)
+    return ranking_flias_subflias_de_cubo(cubo)
 
-    print(f"   ✅ Artículos con info: {len(df_proveedores_completo):,}")
-    print(f"      Columnas después del merge: {list(df_proveedores_completo.columns)}")
-
-    # === ASEGURAR familia/subfamilia (necesarias para el desglose) ===
-    if 'familia' in df_proveedores_completo.columns:
-        df_proveedores_completo['familia'] = df_proveedores_completo['familia'].fillna('SIN FAMILIA')
-    else:
-        df_proveedores_completo['familia'] = 'SIN FAMILIA'
-        print(f"   ⚠️  Columna 'familia' no encontrada -> se asigna 'SIN FAMILIA'")
-
-    if 'subfamilia' in df_proveedores_completo.columns:
-        df_proveedores_completo['subfamilia'] = df_proveedores_completo['subfamilia'].fillna('SIN SUBFAMILIA')
-    else:
-        df_proveedores_completo['subfamilia'] = 'SIN SUBFAMILIA'
-        print(f"   ⚠️  Columna 'subfamilia' no encontrada -> se asigna 'SIN SUBFAMILIA'")
-
-    print(f"   🏷️  Familias: {df_proveedores_completo['familia'].nunique()}")
-    print(f"   📂 Subfamilias: {df_proveedores_completo['subfamilia'].nunique()}")
-
-    # === MERGE PRINCIPAL ===
-    columnas_para_merge = ['idarticulo', 'proveedor', 'idproveedor', 'familia', 'subfamilia']
-
-    df_merge = df_proveedores_completo[columnas_para_merge].merge(
-        df_ventas,
-        on='idarticulo',
-        how='left'
-    ).merge(
-        df_presupuesto[['idarticulo', 'PRESUPUESTO', 'exceso_STK', 'costo_exceso_STK', 'STK_TOTAL']],
-        on='idarticulo',
-        how='left'
-    )
 
-    # === FILLNA (idéntico a process_ranking_data) ===
-    df_merge['venta_total'] = df_merge['venta_total'].fillna(0)
-    df_merge['costo_total'] = df_merge['costo_total'].fillna(0)
-    df_merge['cantidad_vendida'] = df_merge['cantidad_vendida'].fillna(0)
-    df_merge['PRESUPUESTO'] = df_merge['PRESUPUESTO'].fillna(0)
-    df_merge['exceso_STK'] = df_merge['exceso_STK'].fillna(0)
-    df_merge['costo_exceso_STK'] = df_merge['costo_exceso_STK'].fillna(0)
-    df_merge['STK_TOTAL'] = df_merge['STK_TOTAL'].fillna(0)
-
-    # === AGREGACIÓN POR proveedor + idproveedor + familia + subfamilia ===
-    ranking = df_merge.groupby(
-        ['proveedor', 'idproveedor', 'familia', 'subfamilia']
-    ).agg({
-        'venta_total': 'sum',
-        'costo_total': 'sum',
-        'cantidad_vendida': 'sum',
-        'idarticulo': 'count',
-        'PRESUPUESTO': 'sum',
-        'exceso_STK': lambda x: (x > 0).sum(),
-        'costo_exceso_STK': 'sum',
-        'STK_TOTAL': lambda x: (x == 0).sum()
-    }).reset_index()
+def ranking_flias_subflias_de_cubo(cubo):
+    """
+    Ranking desglosado por familia/subfamilia a partir de un cubo (completo o
+    ya filtrado): suma las celdas y recalcula participaciones y rankings.
+    Familia/subfamilia faltantes -> 'SIN FAMILIA' / 'SIN SUBFAMILIA'.
+    """
+    inicio = time.time()
+
+    ranking = cubo.por_subfamilia()
+
+    print(f"   🏷️  Familias: {ranking['familia'].nunique()}")
+    print(f"   📂 Subfamilias: {ranking['subfamilia'].nunique()}")
 
     # ✅ RENOMBRAR COLUMNAS (compatible con global_dashboard.py + Familia/Subfamilia)
     ranking.columns = [
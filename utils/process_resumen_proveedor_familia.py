@@ -36,6 +36,10 @@
  v1.0  (2026-05-19) - Versión inicial. Agregación por Proveedor + Familia
                       con columna 'Subfamilias' en formato texto Top 5,
                       % sobre familia, nombres truncados a 18 chars con '…'.
+ v1.1  (2026-10-17) - El texto 'Subfamilias' se arma vectorizado (cumcount +
+                      join por grupo) en lugar de un apply por familia.
+ v1.2  (2026-10-17) - Acepta un ConjuntoDatos (utils.linaje): la clave de
+                      cache es su linaje, no el contenido del DataFrame.
 ═══════════════════════════════════════════════════════════════════════════════
 '''
 
@@ -44,6 +48,8 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
+from utils.linaje import datos_de, HASH_LINAJE
+
 
 # ─── Configuración del resumen de subfamilias ────────────────────────────────
 TOP_N_SUBFAMILIAS = 5
@@ -58,43 +64,44 @@ def _truncar(nombre, n=MAX_CHARS_SUBFAMILIA):
     return s[:n].rstrip() + '…'
 
 
-def _resumen_subfamilias(grupo):
+def _resumen_subfamilias(df):
     """
-    Para un sub-df de [Proveedor + Familia], devuelve un string del tipo:
+    Texto Top N de subfamilias por [Proveedor + Familia], sin apply por grupo:
         'Aditivos para lav…: 47.0%, Jabón en polvo: 33.0%, ..., …+3 más (2.1%)'
-    con porcentajes SOBRE LA FAMILIA.
+    con porcentajes SOBRE LA FAMILIA (familias sin venta -> "").
+
+    Returns:
+        DataFrame [Proveedor, Familia, Subfamilias]
     """
-    total_familia = grupo['Venta Total'].sum()
-    if total_familia <= 0:
-        return ""
-
-    sub = (
-        grupo[['Subfamilia', 'Venta Total']]
-        .sort_values('Venta Total', ascending=False)
-        .copy()
-    )
-    sub['_pct'] = (sub['Venta Total'] / total_familia * 100).round(1)
-
-    top = sub.head(TOP_N_SUBFAMILIAS)
-    resto = sub.iloc[TOP_N_SUBFAMILIAS:]
-
-    items = [
-        f"{_truncar(row['Subfamilia'])}: {row['_pct']:.1f}%"
-        for _, row in top.iterrows()
-    ]
+    claves = ['Proveedor', 'Familia']
+    sub = df[claves + ['Subfamilia', 'Venta Total']]
+    total_familia = sub.groupby(claves, sort=False)['Venta Total'].transform('sum')
+    sub = sub.assign(_pct=(sub['Venta Total'] / total_familia * 100).round(1))
+    sub = sub[total_familia > 0].sort_values('Venta Total', ascending=False, kind='stable')
+
+    posicion = sub.groupby(claves, sort=False).cumcount()
+    top = sub[posicion < TOP_N_SUBFAMILIAS]
+    resto = sub[posicion >= TOP_N_SUBFAMILIAS]
+
+    items = top['Subfamilia'].map(_truncar) + ': ' + top['_pct'].map('{:.1f}%'.format)
+    textos = items.groupby([top['Proveedor'], top['Familia']], sort=False).agg(', '.join)
 
     if len(resto) > 0:
-        pct_resto = resto['_pct'].sum()
-        items.append(f"…+{len(resto)} más ({pct_resto:.1f}%)")
+        agregado = resto.groupby(claves, sort=False)['_pct'].agg(['size', 'sum'])
+        cola = ('…+' + agregado['size'].astype(str) + ' más ('
+                + agregado['sum'].map('{:.1f}'.format) + '%)')
+        con_cola = textos.index.isin(cola.index)
+        textos[con_cola] = textos[con_cola] + ', ' + cola.reindex(textos.index[con_cola])
 
-    return ", ".join(items)
+    return textos.rename('Subfamilias').reset_index()
 
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=HASH_LINAJE)
 def process_resumen_proveedor_familia(ranking_detalle):
     """
     Construye el resumen [Proveedor + Familia] a partir del ranking detallado
-    (salida de process_ranking_data_flias_subflias).
+    (salida de process_ranking_data_flias_subflias), como DataFrame o como
+    ConjuntoDatos (el cache se indexa por su linaje, utils.linaje).
     """
     print(f"\n🔧 PROCESANDO RESUMEN PROVEEDOR x FAMILIA (sin caché)")
     inicio = time.time()
@@ -103,7 +110,7 @@ def process_resumen_proveedor_familia(ranking_detalle):
         print(f"   ⚠️  Ranking vacío. No se genera resumen.")
         return pd.DataFrame()
 
-    df = ranking_detalle.copy()
+    df = datos_de(ranking_detalle).copy()
 
     # === AGREGACIÓN POR PROVEEDOR + FAMILIA ===
     resumen = df.groupby(
@@ -141,12 +148,9 @@ def process_resumen_proveedor_familia(ranking_detalle):
 
     # === COLUMNA 'Subfamilias' (texto Top 5, % sobre familia) ===
     print(f"   🧩 Generando texto Top {TOP_N_SUBFAMILIAS} de subfamilias por grupo...")
-    subfamilias_txt = (
-        df.groupby(['Proveedor', 'Familia'], sort=False)
-        .apply(_resumen_subfamilias, include_groups=False)
-        .reset_index(name='Subfamilias')
-    )
+    subfamilias_txt = _resumen_subfamilias(df)
     resumen = resumen.merge(subfamilias_txt, on=['Proveedor', 'Familia'], how='left')
+    resumen['Subfamilias'] = resumen['Subfamilias'].fillna("")
 
     # === RENOMBRAR % Part. Ventas x Proveedor a versión corta para tabla ===
     resumen = resumen.rename(columns={
@@ -0,0 +1,158 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    MOTOR DE PRONÓSTICO DE DEMANDA POR BLOQUES DE 7 DÍAS (vectorizado)
+
+    La pestaña de predicción calculaba la demanda con un loop de Python por
+    artículo (groupby('idartalfa')) y lo repetía 5 veces (1, 2, 3, 4 y 4.3
+    semanas) aunque solo cambia un multiplicador; el reparto por región era
+    otro loop por artículo con sub-filtros por región. Ahora:
+
+        1. Las ventas por bloque se pasan UNA vez a una matriz
+               artículo × posición
+           donde la columna j es el j-ésimo bloque CON ventas del artículo,
+           contando desde el más reciente (NaN si no hay). Es la misma
+           posición que tomaba grupo.sort_values('bloque_7dias').head(k).
+        2. Demanda base, ajuste por tendencia y reparto regional salen de
+           operaciones sobre esa matriz.
+        3. Todos los horizontes se emiten juntos (base × multiplicador).
+
+    Reglas (idénticas a calcular_demanda_potencial_bloques):
+        base       = promedio de los primeros min(4, n) bloques con ventas
+        tendencia  = si n >= 3: reciente = promedio de los 3 primeros,
+                     histórico = promedio del resto (o la base si n == 3);
+                     cambio > +15% → base × 1.10, cambio < -15% → base × 0.95
+        regiones   = promedio de los primeros 4 bloques de chaco / corrientes;
+                     la proporción reparte la demanda de 4 semanas
+                     (50 / 50 si el artículo no vendió en ninguna de las dos)
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import numpy as np
+import pandas as pd
+
+# (columna de salida, multiplicador en bloques de 7 días)
+HORIZONTES = [
+    ('demanda_potencial_proxima_semana', 1),
+    ('demanda_potencial_proximas_2_semanas', 2),
+    ('demanda_potencial_proximas_3_semanas', 3),
+    ('demanda_potencial_proximas_4_semanas', 4),
+    ('demanda_potencial_30_dias', 4.3),
+]
+# Horizonte que se reparte entre regiones
+HORIZONTE_REGIONES = 'demanda_potencial_proximas_4_semanas'
+
+BLOQUES_BASE = 4
+BLOQUES_RECIENTES = 3
+UMBRAL_TENDENCIA = 0.15
+AJUSTE_ALZA = 1.10
+AJUSTE_BAJA = 0.95
+
+REGIONES_REPARTO = ['chaco', 'corrientes']
+
+COLUMNAS_REGIONES = ['chaco_cantidad', 'corr_cantidad', 'cor_%', 'chaco_perc']
+
+
+def matriz_bloques(df, claves, columna_valor):
+    """
+    Matriz compacta (claves) × posición del bloque con ventas.
+
+    Returns:
+        (DataFrame de claves ordenadas, np.ndarray float64 con NaN)
+    """
+    df = df.sort_values(claves + ['bloque_7dias'], kind='stable')
+    grupos = df.groupby(claves, sort=False)
+    fila = grupos.ngroup().to_numpy()
+    posicion = grupos.cumcount().to_numpy()
+
+    indice = df.loc[:, claves].drop_duplicates().reset_index(drop=True)
+    ancho = int(posicion.max()) + 1 if len(posicion) else 0
+    matriz = np.full((len(indice), ancho), np.nan)
+    matriz[fila, posicion] = df[columna_valor].to_numpy(dtype='float64')
+    return indice, matriz
+
+
+def _promedio(matriz, hasta=None, desde=0):
+    """Promedio por fila de las columnas [desde, hasta) ignorando NaN (NaN si no hay valores)."""
+    porcion = matriz[:, desde:hasta]
+    cantidad = np.sum(~np.isnan(porcion), axis=1)
+    suma = np.nansum(porcion, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(cantidad > 0, suma / np.maximum(cantidad, 1), np.nan)
+
+
+def demanda_base(matriz):
+    """Demanda de UN bloque por fila, con el ajuste por tendencia."""
+    n = np.sum(~np.isnan(matriz), axis=1)
+    base = _promedio(matriz, BLOQUES_BASE)
+
+    reciente = _promedio(matriz, BLOQUES_RECIENTES)
+    historico = np.where(n > BLOQUES_RECIENTES, _promedio(matriz, desde=BLOQUES_RECIENTES), base)
+
+    evaluar = (n >= BLOQUES_RECIENTES) & (historico > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cambio = np.where(evaluar, (reciente - historico) / np.where(evaluar, historico, 1), 0.0)
+
+    return np.select(
+        [evaluar & (cambio > UMBRAL_TENDENCIA), evaluar & (cambio < -UMBRAL_TENDENCIA)],
+        [base * AJUSTE_ALZA, base * AJUSTE_BAJA],
+        default=base,
+    )
+
+
+def proporciones_regionales(ventas_por_region, ids):
+    """
+    Proporción chaco / corrientes por artículo de `ids` (0.5 / 0.5 sin ventas
+    en ninguna de las dos).
+
+    Returns:
+        (chaco_perc, cor_perc) como np.ndarray alineados con `ids`
+    """
+    reparto = ventas_por_region[ventas_por_region['region'].isin(REGIONES_REPARTO)]
+    indice, matriz = matriz_bloques(reparto, ['idartalfa', 'region'], 'cantidad_bloque_region')
+    indice['promedio'] = _promedio(matriz, BLOQUES_BASE) if len(indice) else []
+
+    promedios = (
+        indice.pivot(index='idartalfa', columns='region', values='promedio')
+        .reindex(index=ids, columns=REGIONES_REPARTO)
+        .fillna(0)
+    )
+    chaco = promedios['chaco'].to_numpy()
+    corrientes = promedios['corrientes'].to_numpy()
+    total = chaco + corrientes
+
+    con_ventas = total > 0
+    divisor = np.where(con_ventas, total, 1)
+    chaco_perc = np.where(con_ventas, chaco / divisor, 0.5)
+    cor_perc = np.where(con_ventas, corrientes / divisor, 0.5)
+    return chaco_perc, cor_perc
+
+
+def pronosticar_demanda(ventas_totales, ventas_por_region=None, horizontes=HORIZONTES):
+    """
+    Demanda potencial de todos los horizontes (y reparto regional) en una pasada.
+
+    Args:
+        ventas_totales: [idartalfa, bloque_7dias, cantidad_bloque]
+        ventas_por_region: [idartalfa, bloque_7dias, region, cantidad_bloque_region]
+            (None = sin columnas de región)
+        horizontes: [(columna, multiplicador)]
+
+    Returns:
+        DataFrame: idartalfa, una columna por horizonte y, con regiones,
+        chaco_cantidad, corr_cantidad, cor_%, chaco_perc
+    """
+    indice, matriz = matriz_bloques(ventas_totales, ['idartalfa'], 'cantidad_bloque')
+    base = demanda_base(matriz)
+
+    resultado = pd.DataFrame({'idartalfa': indice['idartalfa']})
+    for columna, multiplicador in horizontes:
+        resultado[columna] = base * multiplicador
+
+    if ventas_por_region is not None:
+        chaco_perc, cor_perc = proporciones_regionales(ventas_por_region, resultado['idartalfa'])
+        demanda_reparto = resultado[HORIZONTE_REGIONES].to_numpy()
+        resultado['chaco_cantidad'] = demanda_reparto * chaco_perc
+        resultado['corr_cantidad'] = demanda_reparto * cor_perc
+        resultado['cor_%'] = cor_perc * 100
+        resultado['chaco_perc'] = chaco_perc
+
+    return resultado
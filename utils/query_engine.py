@@ -0,0 +1,357 @@
+"""
+Motor de consultas intercambiable: BigQuery o DuckDB/MotherDuck.
+
+Las consultas se escriben en SQL de BigQuery (como siempre) y el motor DuckDB
+las traduce con traducir_sql_duckdb() antes de ejecutarlas.
+
+Parámetros: query(sql, parametros={'ids': [...]}) con el SQL escrito como en
+BigQuery (`WHERE idarticulo IN UNNEST(@ids)`). BigQuery los envía como
+parámetros tipados y DuckDB los liga como $ids: el texto de la consulta no
+crece con la cantidad de IDs y es siempre el mismo para el cache del servidor.
+
+Para resultados grandes, query_arrow() devuelve una pyarrow.Table (Storage
+Read API en BigQuery, fetch_arrow_table en DuckDB) y arrow_a_pandas() arma el
+DataFrame sin pasar por objetos Python fila a fila.
+
+Selección del motor (ver utils.config.get_query_engine_name):
+  - "bigquery"   → BigQuery con el cliente compartido (default)
+  - "motherduck" → MotherDuck (token en .env / st.secrets)
+  - "duckdb"     → archivo DuckDB local (DUCKDB_PATH), sin red
+"""
+import hashlib
+import re
+import threading
+from datetime import date, datetime
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+from google.cloud import bigquery
+
+from utils.bigquery_connection import get_bigquery_client, get_bqstorage_client
+from utils.config import get_query_engine_name, get_duckdb_path
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TRADUCCIÓN DE DIALECTO BigQuery → DuckDB
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _separar_argumentos(texto):
+    """Divide los argumentos de una llamada respetando paréntesis y comillas."""
+    args, actual, nivel, comilla = [], [], 0, None
+    for c in texto:
+        if comilla:
+            actual.append(c)
+            if c == comilla:
+                comilla = None
+            continue
+        if c in ("'", '"'):
+            comilla = c
+        elif c == '(':
+            nivel += 1
+        elif c == ')':
+            nivel -= 1
+        elif c == ',' and nivel == 0:
+            args.append(''.join(actual).strip())
+            actual = []
+            continue
+        actual.append(c)
+    args.append(''.join(actual).strip())
+    return args
+
+
+def _reescribir_funcion(sql, nombre, reescribir):
+    """
+    Reemplaza cada llamada NOMBRE(...) por reescribir(args).
+    Recorre de atrás hacia adelante para que las llamadas anidadas se
+    traduzcan antes que la llamada que las contiene.
+    """
+    patron = re.compile(rf'(?<![\w.]){nombre}\s*\(', re.IGNORECASE)
+    posiciones = [m for m in patron.finditer(sql)]
+    for m in reversed(posiciones):
+        inicio_args = m.end()
+        nivel, i = 1, inicio_args
+        while i < len(sql) and nivel:
+            if sql[i] == '(':
+                nivel += 1
+            elif sql[i] == ')':
+                nivel -= 1
+            i += 1
+        args = _separar_argumentos(sql[inicio_args:i - 1])
+        sql = sql[:m.start()] + reescribir(args) + sql[i:]
+    return sql
+
+
+def _identificador_duckdb(match):
+    """`proyecto.dataset.tabla` → "dataset"."tabla" (el proyecto es la base actual)."""
+    partes = match.group(1).split('.')
+    if len(partes) == 3:
+        partes = partes[1:]
+    return '.'.join(f'"{p}"' for p in partes)
+
+
+def _parse_date(args):
+    formato, valor = args[0], args[1]
+    if formato.strip("'\"") == '%Y-%m-%d':
+        return f"CAST({valor} AS DATE)"
+    return f"CAST(strptime({valor}, {formato}) AS DATE)"
+
+
+def traducir_sql_duckdb(sql):
+    """
+    Traduce una consulta escrita en SQL de BigQuery al dialecto de DuckDB.
+
+    Cubre lo que usan los fetchers de la app:
+      - `proyecto.dataset.tabla`      → "dataset"."tabla"
+      - PARSE_DATE('%Y-%m-%d', x)     → CAST(x AS DATE)
+      - DATE(x)                       → CAST(x AS DATE)
+      - DATE_DIFF(a, b, DAY)          → date_diff('day', b, a)
+      - SAFE_DIVIDE(a, b)             → (a) / NULLIF(b, 0)
+      - FORMAT_DATE(fmt, x)           → strftime(x, fmt)
+      - EXTRACT(QUARTER|YEAR FROM x)  → sin cambios (DuckDB lo soporta)
+    """
+    sql = re.sub(r'`([^`]+)`', _identificador_duckdb, sql)
+    sql = _reescribir_funcion(sql, 'PARSE_DATE', _parse_date)
+    sql = _reescribir_funcion(sql, 'DATE', lambda a: f"CAST({a[0]} AS DATE)")
+    sql = _reescribir_funcion(
+        sql, 'DATE_DIFF',
+        lambda a: f"date_diff('{a[2].strip().lower()}', {a[1]}, {a[0]})"
+    )
+    sql = _reescribir_funcion(sql, 'SAFE_DIVIDE', lambda a: f"(({a[0]}) / NULLIF({a[1]}, 0))")
+    sql = _reescribir_funcion(sql, 'FORMAT_DATE', lambda a: f"strftime({a[1]}, {a[0]})")
+    return sql
+
+
+def traducir_parametros_duckdb(sql):
+    """
+    Parámetros de BigQuery → DuckDB:
+      - x IN UNNEST(@ids)  → x IN (SELECT unnest($ids))   (semi-join, no lista literal)
+      - @nombre            → $nombre
+    """
+    sql = re.sub(r'IN\s+UNNEST\s*\(\s*@(\w+)\s*\)', r'IN (SELECT unnest($\1))', sql, flags=re.IGNORECASE)
+    return re.sub(r'@(\w+)', r'$\1', sql)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LISTAS DE IDs
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def normalizar_ids(ids):
+    """IDs como tupla ordenada y sin repetidos de int: misma clave de cache para el mismo conjunto."""
+    return tuple(sorted({int(i) for i in ids}))
+
+
+def hash_ids(ids):
+    """Hash corto del conjunto de IDs (para claves de cache propias)."""
+    return hashlib.sha1(','.join(map(str, normalizar_ids(ids))).encode()).hexdigest()
+
+
+_TIPOS_BIGQUERY = (
+    (bool, 'BOOL'),
+    (int, 'INT64'),
+    (float, 'FLOAT64'),
+    (datetime, 'TIMESTAMP'),
+    (date, 'DATE'),
+    (str, 'STRING'),
+)
+
+
+def _tipo_bigquery(valor):
+    for tipo, nombre in _TIPOS_BIGQUERY:
+        if isinstance(valor, tipo):
+            return nombre
+    # numpy int64 / float64
+    if hasattr(valor, 'item'):
+        return _tipo_bigquery(valor.item())
+    raise TypeError(f"Tipo de parámetro no soportado: {type(valor).__name__}")
+
+
+def parametros_bigquery(parametros):
+    """dict nombre → valor o lista → lista de QueryParameter tipados."""
+    resultado = []
+    for nombre, valor in parametros.items():
+        if isinstance(valor, (list, tuple, set)):
+            valores = [v.item() if hasattr(v, 'item') else v for v in valor]
+            tipo = _tipo_bigquery(valores[0]) if valores else 'INT64'
+            resultado.append(bigquery.ArrayQueryParameter(nombre, tipo, valores))
+        else:
+            valor = valor.item() if hasattr(valor, 'item') else valor
+            resultado.append(bigquery.ScalarQueryParameter(nombre, _tipo_bigquery(valor), valor))
+    return resultado
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ARROW → PANDAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def arrow_a_pandas(tabla, categorias=(), strings_arrow=False):
+    """
+    pyarrow.Table → DataFrame.
+
+    Numéricos y timestamps se convierten sin copia fila a fila; las columnas de
+    `categorias` se codifican como diccionario en Arrow y llegan como category;
+    con strings_arrow=True el resto de los textos queda como string[pyarrow]
+    (si no, object como devolvía to_dataframe()).
+    """
+    for nombre in categorias:
+        if nombre in tabla.column_names:
+            i = tabla.column_names.index(nombre)
+            columna = tabla.column(i)
+            if not pa.types.is_dictionary(columna.type):
+                tabla = tabla.set_column(i, nombre, columna.dictionary_encode())
+
+    mapeo = None
+    if strings_arrow:
+        tipos = {pa.string(): pd.StringDtype('pyarrow'), pa.large_string(): pd.StringDtype('pyarrow')}
+        mapeo = tipos.get
+    return tabla.to_pandas(types_mapper=mapeo, split_blocks=True, self_destruct=True)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MOTORES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class QueryEngine:
+    """
+    Interfaz común: query(sql, parametros=None) → DataFrame.
+    El SQL llega en dialecto BigQuery; parametros es un dict nombre → valor o lista.
+    """
+
+    nombre = None
+
+    def query(self, sql, parametros=None):
+        raise NotImplementedError
+
+    def query_arrow(self, sql, parametros=None):
+        """Mismo resultado como pyarrow.Table (para descargas grandes)."""
+        raise NotImplementedError
+
+
+class BigQueryEngine(QueryEngine):
+    nombre = 'bigquery'
+
+    def __init__(self, credentials_path=None, project_id=None):
+        self.credentials_path = credentials_path
+        self.project_id = project_id
+
+    @property
+    def client(self):
+        return get_bigquery_client(self.credentials_path, self.project_id)
+
+    @property
+    def bqstorage_client(self):
+        return get_bqstorage_client(self.credentials_path, self.project_id)
+
+    def _ejecutar(self, sql, parametros):
+        job_config = None
+        if parametros:
+            job_config = bigquery.QueryJobConfig(query_parameters=parametros_bigquery(parametros))
+        return self.client.query(sql, job_config=job_config).result()
+
+    # Con el cliente Storage las filas llegan en record batches de Arrow por gRPC
+    # (la librería sigue usando REST si el resultado entra en la primera página)
+
+    def query(self, sql, parametros=None):
+        return self._ejecutar(sql, parametros).to_dataframe(bqstorage_client=self.bqstorage_client)
+
+    def query_arrow(self, sql, parametros=None):
+        return self._ejecutar(sql, parametros).to_arrow(bqstorage_client=self.bqstorage_client)
+
+
+class DuckDBEngine(QueryEngine):
+    """
+    DuckDB local (archivo) o MotherDuck (database=None).
+    Cada consulta usa su propio cursor: la conexión base se comparte entre
+    threads pero DuckDB no permite ejecutar en paralelo sobre el mismo cursor.
+    """
+
+    nombre = 'duckdb'
+
+    def __init__(self, database=None):
+        self.database = database
+        self._con = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        if self._con is None:
+            with self._lock:
+                if self._con is None:
+                    if self.database:
+                        self._con = duckdb.connect(self.database, read_only=True)
+                    else:
+                        from utils.motherduck_connection import get_connection
+                        self._con = get_connection()
+        return self._con
+
+    def _preparar(self, sql, parametros):
+        sql = traducir_sql_duckdb(sql)
+        if parametros:
+            sql = traducir_parametros_duckdb(sql)
+            parametros = {
+                nombre: list(valor) if isinstance(valor, (tuple, set)) else valor
+                for nombre, valor in parametros.items()
+            }
+        return sql, parametros or None
+
+    def query(self, sql, parametros=None):
+        sql, parametros = self._preparar(sql, parametros)
+        cursor = self._conexion().cursor()
+        try:
+            return cursor.execute(sql, parametros).df()
+        finally:
+            cursor.close()
+
+    def query_arrow(self, sql, parametros=None):
+        sql, parametros = self._preparar(sql, parametros)
+        cursor = self._conexion().cursor()
+        try:
+            resultado = cursor.execute(sql, parametros)
+            # to_arrow_table() en DuckDB >= 1.4; fetch_arrow_table() en versiones anteriores
+            leer = getattr(resultado, 'to_arrow_table', None) or resultado.fetch_arrow_table
+            return leer()
+        finally:
+            cursor.close()
+
+
+_motores = {}
+_motores_lock = threading.Lock()
+
+
+def get_query_engine(credentials_path=None, project_id=None, motor=None):
+    """
+    Obtener el motor de consultas configurado (instancia compartida).
+
+    Args:
+        credentials_path: Credenciales BigQuery (ignorado por DuckDB)
+        project_id: Proyecto BigQuery (ignorado por DuckDB)
+        motor: Forzar 'bigquery', 'duckdb' o 'motherduck'; None = según config
+
+    Returns:
+        QueryEngine
+    """
+    motor = (motor or get_query_engine_name()).lower()
+
+    if motor == 'bigquery':
+        clave = (motor, credentials_path, project_id)
+    elif motor == 'duckdb':
+        clave = (motor, get_duckdb_path())
+    elif motor == 'motherduck':
+        clave = (motor,)
+    else:
+        raise ValueError(f"Motor de consultas desconocido: {motor}")
+
+    engine = _motores.get(clave)
+    if engine is None:
+        with _motores_lock:
+            engine = _motores.get(clave)
+            if engine is None:
+                if motor == 'bigquery':
+                    engine = BigQueryEngine(credentials_path, project_id)
+                elif motor == 'duckdb':
+                    engine = DuckDBEngine(get_duckdb_path())
+                else:
+                    engine = DuckDBEngine(None)
+                _motores[clave] = engine
+                print(f"⚙️  Motor de consultas: {motor}")
+    return engine
+
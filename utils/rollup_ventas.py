@@ -0,0 +1,259 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    ROLLUP DIARIO DE VENTAS (fecha × idarticulo × sucursal)
+
+    data/rollup_diario/anio=YYYY/mes=M/part-*.parquet  (+ _watermark.json)
+
+    Una fila por (fecha, idarticulo, idartalfa, sucursal) con:
+        cantidad_total, precio_total, costo_total  → SUM
+        lineas                                     → COUNT(*) de líneas de ticket
+        descripcion, familia, subfamilia           → MAX (como en las queries)
+
+    - refrescar_rollup(): agrega SOLO los días posteriores al watermark.
+      Fuente: espejo local de tickets si lo cubre, si no GROUP BY en el motor.
+    - ventas_por_articulo():   reemplazo de get_ventas_data (período libre)
+    - ventas_diarias():        filas diarias para bloques de 7 días
+    - ventas_por_trimestre():  artículo × trimestre para utils.pivote_trimestral
+
+    Uso como job (después de python -m utils.tickets_mirror):
+        python -m utils.rollup_ventas
+    Al terminar publica también el índice de sumas prefijas (utils.indice_prefijos).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import os
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.config import get_rollup_dir
+from utils.query_engine import get_query_engine
+from utils.parquet_store import (
+    a_fecha, meses, leer_estado, guardar_estado, cubre,
+    escribir_particion, leer_rango,
+)
+from utils.tickets_mirror import FECHA_INICIAL_DEFAULT, mirror_cubre, leer_tickets
+from utils.version_datos import obtener_ultima_fecha
+
+CLAVES_ROLLUP = ['fecha', 'idarticulo', 'idartalfa', 'sucursal']
+MEDIDAS_ROLLUP = ['cantidad_total', 'precio_total', 'costo_total']
+
+ESQUEMA_ROLLUP = pa.schema([
+    ('fecha', pa.date32()),
+    ('idarticulo', pa.int64()),
+    ('idartalfa', pa.int64()),
+    ('sucursal', pa.string()),
+    ('cantidad_total', pa.float64()),
+    ('precio_total', pa.float64()),
+    ('costo_total', pa.float64()),
+    ('lineas', pa.int64()),
+    ('descripcion', pa.string()),
+    ('familia', pa.string()),
+    ('subfamilia', pa.string()),
+])
+
+
+def _directorio(directorio=None):
+    return directorio or get_rollup_dir()
+
+
+def rollup_cubre(fecha_desde, fecha_hasta=None, directorio=None):
+    """True si el rollup tiene todos los días de [fecha_desde, fecha_hasta]."""
+    return cubre(_directorio(directorio), fecha_desde, fecha_hasta)
+
+
+def estado_rollup(directorio=None):
+    return leer_estado(_directorio(directorio))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REFRESCO INCREMENTAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _agregar_tickets(df):
+    """Tickets crudos → filas del rollup (mismo resultado que el GROUP BY SQL)."""
+    df = df.copy()
+    df['fecha'] = pd.to_datetime(df['fecha_comprobante']).dt.date
+    return (
+        df.groupby(CLAVES_ROLLUP, dropna=False, sort=False)
+        .agg(
+            cantidad_total=('cantidad_total', 'sum'),
+            precio_total=('precio_total', 'sum'),
+            costo_total=('costo_total', 'sum'),
+            lineas=('cantidad_total', 'size'),
+            descripcion=('descripcion', 'max'),
+            familia=('familia', 'max'),
+            subfamilia=('subfamilia', 'max'),
+        )
+        .reset_index()
+    )
+
+
+def _query_rollup(project_id, bigquery_table, desde, hasta):
+    return f"""
+    SELECT
+        DATE(fecha_comprobante) AS fecha,
+        idarticulo,
+        idartalfa,
+        sucursal,
+        SUM(cantidad_total) AS cantidad_total,
+        SUM(precio_total) AS precio_total,
+        SUM(costo_total) AS costo_total,
+        COUNT(*) AS lineas,
+        MAX(descripcion) AS descripcion,
+        MAX(familia) AS familia,
+        MAX(subfamilia) AS subfamilia
+    FROM `{project_id}.{bigquery_table}`
+    WHERE DATE(fecha_comprobante) BETWEEN '{desde}' AND '{hasta}'
+    GROUP BY 1, 2, 3, 4
+    """
+
+
+def _tabla_rollup(df):
+    df = df.copy()
+    df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+    return pa.Table.from_pandas(df[ESQUEMA_ROLLUP.names], schema=ESQUEMA_ROLLUP, preserve_index=False)
+
+
+def refrescar_rollup(credentials_path, project_id, bigquery_table,
+                     fecha_inicial=FECHA_INICIAL_DEFAULT, directorio=None, motor=None):
+    """
+    Agregar al rollup los días posteriores a su watermark, mes a mes.
+
+    Returns:
+        int: filas nuevas del rollup
+    """
+    directorio = _directorio(directorio)
+    os.makedirs(directorio, exist_ok=True)
+
+    print(f"\n{'='*80}")
+    print(f"🧮 REFRESCANDO ROLLUP DIARIO DE VENTAS")
+    print(f"{'='*80}")
+    inicio = time.time()
+
+    estado = leer_estado(directorio)
+    if estado:
+        fecha_min, watermark, filas = estado['fecha_min'], estado['fecha'], estado['filas']
+    else:
+        fecha_min = a_fecha(fecha_inicial)
+        watermark, filas = fecha_min - timedelta(days=1), 0
+
+    ultima_fecha = obtener_ultima_fecha(credentials_path, project_id, motor)
+    print(f"   • Watermark rollup: {watermark}")
+    print(f"   • Última fecha en origen: {ultima_fecha}")
+
+    if ultima_fecha is None or ultima_fecha <= watermark:
+        print(f"   ✅ Rollup al día")
+        print(f"{'='*80}\n")
+        return 0
+
+    engine = get_query_engine(credentials_path, project_id, motor)
+    nuevas = 0
+
+    for desde, hasta in meses(watermark + timedelta(days=1), ultima_fecha):
+        if mirror_cubre(desde, hasta):
+            df = _agregar_tickets(leer_tickets(desde, hasta))
+            fuente = 'espejo'
+        else:
+            df = engine.query(_query_rollup(project_id, bigquery_table, desde, hasta))
+            fuente = engine.nombre
+        if not df.empty:
+            escribir_particion(directorio, _tabla_rollup(df), desde, hasta)
+        nuevas += len(df)
+        filas += len(df)
+        guardar_estado(directorio, fecha_min, hasta, filas)
+        print(f"   📦 {desde} → {hasta}: {len(df):,} filas ({fuente})")
+
+    print(f"   ✅ {nuevas:,} filas nuevas ({filas:,} en total)")
+    print(f"   ⏱️  Tiempo: {time.time() - inicio:.2f}s")
+    print(f"{'='*80}\n")
+    return nuevas
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# API DE CONSULTA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def ventas_diarias(fecha_desde, fecha_hasta=None, columnas=None, ids=None,
+                   columna_id='idarticulo', directorio=None):
+    """
+    Filas del rollup en [fecha_desde, fecha_hasta] (hasta=None → watermark).
+
+    Returns:
+        DataFrame con 'fecha' como datetime.date y las columnas pedidas
+    """
+    directorio = _directorio(directorio)
+    estado = leer_estado(directorio)
+    desde = a_fecha(fecha_desde)
+    hasta = a_fecha(fecha_hasta) or (estado['fecha'] if estado else date.today())
+    columnas = list(columnas or ESQUEMA_ROLLUP.names)
+
+    tabla = leer_rango(directorio, 'fecha', pa.date32(), desde, hasta,
+                       columnas, ids=ids, columna_id=columna_id)
+    return tabla.to_pandas()
+
+
+def ventas_por_articulo(fecha_desde, fecha_hasta, por_sucursal=False, directorio=None):
+    """
+    Totales del período por artículo (y opcionalmente sucursal).
+    Mismas columnas que get_ventas_data:
+        idarticulo, descripcion, venta_total, costo_total, cantidad_vendida
+    """
+    claves = ['idarticulo', 'sucursal'] if por_sucursal else ['idarticulo']
+    df = ventas_diarias(
+        fecha_desde, fecha_hasta,
+        columnas=claves + ['descripcion'] + MEDIDAS_ROLLUP,
+        directorio=directorio,
+    )
+    return (
+        df.groupby(claves, dropna=False, sort=False)
+        .agg(
+            descripcion=('descripcion', 'max'),
+            venta_total=('precio_total', 'sum'),
+            costo_total=('costo_total', 'sum'),
+            cantidad_vendida=('cantidad_total', 'sum'),
+        )
+        .reset_index()
+    )
+
+
+def ventas_por_trimestre(fecha_desde, fecha_hasta, directorio=None):
+    """
+    Artículo × trimestre en [fecha_desde, fecha_hasta] (fuente del pivote anual,
+    ver utils.pivote_trimestral): sumas, textos MAX, primera/última venta y días
+    con ventas.
+    """
+    df = ventas_diarias(
+        fecha_desde, fecha_hasta,
+        columnas=['fecha', 'idarticulo', 'idartalfa', 'descripcion',
+                  'familia', 'subfamilia'] + MEDIDAS_ROLLUP,
+        directorio=directorio,
+    )
+    df['trimestre'] = pd.to_datetime(df['fecha']).dt.quarter
+    return (
+        df.groupby(['idarticulo', 'idartalfa', 'trimestre'], dropna=False)
+        .agg(
+            descripcion=('descripcion', 'max'),
+            familia=('familia', 'max'),
+            subfamilia=('subfamilia', 'max'),
+            cantidad_total=('cantidad_total', 'sum'),
+            precio_total=('precio_total', 'sum'),
+            costo_total=('costo_total', 'sum'),
+            fecha_primera_venta=('fecha', 'min'),
+            fecha_ultima_venta=('fecha', 'max'),
+            dias_con_ventas=('fecha', 'nunique'),
+        )
+        .reset_index()
+    )
+
+
+if __name__ == "__main__":
+    from utils.config import setup_credentials
+
+    config = setup_credentials()
+    refrescar_rollup(config['credentials_path'], config['project_id'], config['bigquery_table'])
+
+    # Import acá: utils.indice_prefijos importa este módulo
+    from utils.indice_prefijos import publicar_indice_prefijos
+    publicar_indice_prefijos()
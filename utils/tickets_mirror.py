@@ -0,0 +1,174 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    ESPEJO LOCAL DE tickets_all EN PARQUET (particionado Hive año/mes)
+
+    data/tickets_mirror/
+        _watermark.json
+        anio=2025/mes=1/part-20250101_20250131.parquet
+        anio=2025/mes=2/...
+
+    - sincronizar_tickets(): agrega SOLO los días posteriores al watermark
+      (fecha_comprobante) y hasta la ultima_fecha del presupuesto, mes a mes.
+    - leer_tickets(): lectura con poda de particiones (año/mes), filtro de
+      fechas/IDs empujado al scan de Parquet y proyección de columnas.
+
+    Uso como job:
+        python -m utils.tickets_mirror
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import os
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.config import get_tickets_mirror_dir
+from utils.query_engine import get_query_engine
+from utils.version_datos import obtener_ultima_fecha
+from utils.parquet_store import (
+    a_fecha, meses, leer_estado, guardar_estado, cubre,
+    escribir_particion, leer_rango,
+)
+
+COLUMNAS_TICKETS = [
+    'fecha_comprobante', 'idarticulo', 'idartalfa', 'descripcion',
+    'cantidad_total', 'costo_total', 'precio_total',
+    'sucursal', 'familia', 'subfamilia',
+]
+
+ESQUEMA_TICKETS = pa.schema([
+    ('fecha_comprobante', pa.timestamp('us')),
+    ('idarticulo', pa.int64()),
+    ('idartalfa', pa.int64()),
+    ('descripcion', pa.string()),
+    ('cantidad_total', pa.float64()),
+    ('costo_total', pa.float64()),
+    ('precio_total', pa.float64()),
+    ('sucursal', pa.string()),
+    ('familia', pa.string()),
+    ('subfamilia', pa.string()),
+])
+
+# Primer día que se espeja cuando el directorio está vacío
+FECHA_INICIAL_DEFAULT = '2024-01-01'
+
+
+def _directorio(directorio=None):
+    return directorio or get_tickets_mirror_dir()
+
+
+def leer_watermark(directorio=None):
+    """Estado del espejo ({'fecha_min', 'fecha', 'filas', ...}) o None si no se sincronizó."""
+    return leer_estado(_directorio(directorio))
+
+
+def mirror_cubre(fecha_desde, fecha_hasta=None, directorio=None):
+    """True si el espejo local tiene todos los días de [fecha_desde, fecha_hasta]."""
+    return cubre(_directorio(directorio), fecha_desde, fecha_hasta)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SINCRONIZACIÓN INCREMENTAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _tabla_tickets(df):
+    df = df.copy()
+    df['fecha_comprobante'] = pd.to_datetime(df['fecha_comprobante'])
+    return pa.Table.from_pandas(df[COLUMNAS_TICKETS], schema=ESQUEMA_TICKETS, preserve_index=False)
+
+
+def sincronizar_tickets(credentials_path, project_id, bigquery_table,
+                        fecha_inicial=FECHA_INICIAL_DEFAULT, directorio=None, motor=None):
+    """
+    Agregar al espejo local los tickets posteriores al watermark.
+
+    Trae mes a mes los días (watermark, ultima_fecha] y avanza el watermark
+    después de escribir cada mes, así un corte a mitad de camino no deja
+    huecos ni duplicados.
+
+    Returns:
+        int: filas nuevas agregadas
+    """
+    directorio = _directorio(directorio)
+    os.makedirs(directorio, exist_ok=True)
+
+    print(f"\n{'='*80}")
+    print(f"🪞 SINCRONIZANDO ESPEJO LOCAL DE TICKETS")
+    print(f"{'='*80}")
+    inicio = time.time()
+
+    estado = leer_estado(directorio)
+    if estado:
+        fecha_min, watermark, filas = estado['fecha_min'], estado['fecha'], estado['filas']
+    else:
+        fecha_min = a_fecha(fecha_inicial)
+        watermark, filas = fecha_min - timedelta(days=1), 0
+
+    ultima_fecha = obtener_ultima_fecha(credentials_path, project_id, motor)
+    print(f"   • Watermark local: {watermark}")
+    print(f"   • Última fecha en origen: {ultima_fecha}")
+
+    if ultima_fecha is None or ultima_fecha <= watermark:
+        print(f"   ✅ Espejo al día")
+        print(f"{'='*80}\n")
+        return 0
+
+    engine = get_query_engine(credentials_path, project_id, motor)
+    nuevas = 0
+
+    for desde, hasta in meses(watermark + timedelta(days=1), ultima_fecha):
+        query = f"""
+        SELECT {', '.join(COLUMNAS_TICKETS)}
+        FROM `{project_id}.{bigquery_table}`
+        WHERE DATE(fecha_comprobante) BETWEEN '{desde}' AND '{hasta}'
+        """
+        df = engine.query(query)
+        if not df.empty:
+            escribir_particion(directorio, _tabla_tickets(df), desde, hasta)
+        nuevas += len(df)
+        filas += len(df)
+        guardar_estado(directorio, fecha_min, hasta, filas)
+        print(f"   📦 {desde} → {hasta}: {len(df):,} filas")
+
+    print(f"   ✅ {nuevas:,} filas nuevas ({filas:,} en total)")
+    print(f"   ⏱️  Tiempo: {time.time() - inicio:.2f}s")
+    print(f"{'='*80}\n")
+    return nuevas
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LECTURA (poda de particiones + proyección de columnas)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def leer_tickets(fecha_desde, fecha_hasta=None, columnas=None, ids=None,
+                 columna_id='idarticulo', directorio=None, como_arrow=False):
+    """
+    Leer tickets del espejo local.
+
+    Args:
+        fecha_desde, fecha_hasta: Rango de días (inclusive); hasta=None → watermark
+        columnas: Columnas a leer (None = todas las de COLUMNAS_TICKETS)
+        ids: Filtrar por estos IDs en columna_id (None = todos)
+        columna_id: 'idarticulo' o 'idartalfa'
+        como_arrow: True → devolver la pyarrow.Table (ver utils.query_engine.arrow_a_pandas)
+
+    Returns:
+        DataFrame (o pyarrow.Table) con las columnas pedidas
+    """
+    directorio = _directorio(directorio)
+    estado = leer_estado(directorio)
+    desde = a_fecha(fecha_desde)
+    hasta = a_fecha(fecha_hasta) or (estado['fecha'] if estado else date.today())
+    columnas = list(columnas or COLUMNAS_TICKETS)
+
+    tabla = leer_rango(directorio, 'fecha_comprobante', ESQUEMA_TICKETS.field('fecha_comprobante').type,
+                       desde, hasta, columnas, ids=ids, columna_id=columna_id)
+    return tabla if como_arrow else tabla.to_pandas()
+
+
+if __name__ == "__main__":
+    from utils.config import setup_credentials
+
+    config = setup_credentials()
+    sincronizar_tickets(config['credentials_path'], config['project_id'], config['bigquery_table'])
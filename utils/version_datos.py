@@ -0,0 +1,73 @@
+"""
+Versión de los datos del warehouse para las claves de cache.
+
+La versión es la ultima_fecha cargada en presupuesto (la misma que muestra el
+sidebar): cambia solo cuando entra la carga nocturna. Se consulta como mucho
+una vez cada INTERVALO_CHEQUEO_SEG por proceso y se pasa como argumento
+`version_datos` a las funciones con @st.cache_data, así las entradas viven
+hasta que los datos cambian en lugar de vencer por TTL fijo.
+"""
+import threading
+import time
+
+import pandas as pd
+
+from utils.query_engine import get_query_engine
+
+# Cada cuánto se vuelve a consultar la ultima_fecha (segundos)
+INTERVALO_CHEQUEO_SEG = 300
+
+SIN_VERSION = 'sin-version'
+
+_versiones = {}   # (credentials_path, project_id) → (momento_chequeo, token)
+_lock = threading.Lock()
+
+
+def obtener_ultima_fecha(credentials_path, project_id, motor=None):
+    """ultima_fecha cargada en presupuesto (datetime.date o None)."""
+    engine = get_query_engine(credentials_path, project_id, motor)
+    df = engine.query(f"""
+        SELECT MAX(ultima_fecha) AS ultima_fecha
+        FROM `{project_id}.presupuesto.result_final_alert_all`
+    """)
+    if df.empty or pd.isna(df['ultima_fecha'].iloc[0]):
+        return None
+    return pd.Timestamp(df['ultima_fecha'].iloc[0]).date()
+
+
+def obtener_version_datos(credentials_path, project_id):
+    """
+    Token de versión de los datos ('YYYY-MM-DD' de la ultima_fecha).
+
+    Returns:
+        str: token para incluir en las claves de cache
+    """
+    clave = (credentials_path, project_id)
+    entrada = _versiones.get(clave)
+    if entrada is not None and time.time() - entrada[0] < INTERVALO_CHEQUEO_SEG:
+        return entrada[1]
+
+    with _lock:
+        entrada = _versiones.get(clave)
+        if entrada is not None and time.time() - entrada[0] < INTERVALO_CHEQUEO_SEG:
+            return entrada[1]
+
+        anterior = entrada[1] if entrada else None
+        try:
+            ultima_fecha = obtener_ultima_fecha(credentials_path, project_id)
+            token = str(ultima_fecha) if ultima_fecha else SIN_VERSION
+        except Exception as e:
+            print(f"⚠️  No se pudo verificar la versión de datos: {e}")
+            token = anterior or SIN_VERSION
+
+        if token != anterior:
+            print(f"🔖 Versión de datos: {anterior} → {token}")
+        _versiones[clave] = (time.time(), token)
+        return token
+
+
+def fecha_de_version(version_datos):
+    """Último día completo según el token (datetime.date) o None si no hay versión."""
+    if not version_datos or version_datos == SIN_VERSION:
+        return None
+    return pd.Timestamp(version_datos).date()
@@ -0,0 +1,120 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════
+    UNA SOLA CONSULTA EN VUELO POR CLAVE (single-flight)
+
+    Cuando varias sesiones piden lo mismo al mismo tiempo (todos los
+    compradores abren el dashboard después de la carga de la mañana), la
+    primera ejecuta la consulta y las demás esperan ese resultado en vez de
+    lanzar consultas duplicadas al warehouse.
+
+    - st.cache_data ya hace esto para una misma clave de cache dentro del
+      proceso; esta capa cubre lo que queda fuera:
+        · consultas sin st.cache_data (stock actual)
+        · sub-rangos de CacheRangos (sesiones con períodos distintos que
+          piden los mismos días faltantes)
+    - Entre procesos/workers la coordinación la hace el cache en disco
+      (utils.cache_disco, archivo .lock por clave).
+
+    Uso:
+        @vuelo_unico('cargar_stock_actual')
+        def cargar_stock_actual(credentials_path, project_id): ...
+
+        obtener_vuelo_unico().ejecutar(clave, funcion, *args, **kwargs)
+═══════════════════════════════════════════════════════════════════════════════
+"""
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+
+# Parámetros que no cambian el resultado (solo cómo se accede al warehouse)
+PARAMETROS_EXCLUIDOS = ('credentials_path',)
+
+
+class _Vuelo:
+    """Consulta en curso: los que llegan después esperan el evento."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class VueloUnico:
+    """Registro de consultas en curso por clave."""
+
+    def __init__(self):
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self.coalescidas = 0
+
+    def ejecutar(self, clave, funcion, *args, **kwargs):
+        """
+        funcion(*args, **kwargs), salvo que ya haya una llamada en curso con la
+        misma clave: en ese caso espera y devuelve su resultado (o su excepción).
+
+        clave: tupla hasheable cuyo primer elemento es el nombre de la consulta
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            inicio = time.time()
+            vuelo.evento.wait()
+            print(f"   🛬 Consulta compartida ({clave[0]}): esperó {time.time() - inicio:.2f}s")
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = funcion(*args, **kwargs)
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.evento.set()
+
+    def en_curso(self):
+        with self._lock:
+            return len(self._vuelos)
+
+
+_vuelo_unico = VueloUnico()
+
+
+def obtener_vuelo_unico():
+    """Instancia del proceso (compartida por todas las sesiones)."""
+    return _vuelo_unico
+
+
+def vuelo_unico(nombre):
+    """
+    Decorador: llamadas simultáneas con los mismos parámetros (sin contar
+    credentials_path) comparten una sola ejecución.
+    """
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            parametros = {
+                k: v for k, v in argumentos.arguments.items() if k not in PARAMETROS_EXCLUIDOS
+            }
+            contenido = json.dumps(parametros, sort_keys=True, default=str)
+            clave = (nombre, hashlib.sha256(contenido.encode('utf-8')).hexdigest())
+            return _vuelo_unico.ejecutar(clave, funcion, *args, **kwargs)
+
+        return envoltura
+    return decorador